@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+#
+#  Copyright 2013 Grigoriy Kramarenko <root@rosix.ru>
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+#  MA 02110-1301, USA.
+#
+#
+
+### Микро-тест разбора ответов 10H, 11H и 62H ###
+#
+# Сравнивает прежний разбор (нарезка буфера, int2/int4/int6.unpack,
+# string2bits и немедленное создание дат) с shtrihmfr.decoders: только
+# разбор и разбор с чтением всех полей ответа. Ускорение считается по
+# второму - так ответ использует вызывающий код.
+#
+#     python benchmarks/decoders.py [количество повторений]
+
+from __future__ import print_function, unicode_literals
+import datetime
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from shtrihmfr.decoders import decode_x10, decode_x11, decode_x62
+from shtrihmfr.protocol import KKT_FLAGS, FP_FLAGS
+from shtrihmfr.utils import (int2, int4, int6, int8, integer2money,
+                             string2bits)
+
+
+X10_DATA = bytearray(b'\x1e\x03\x00\x02\x00\x05\x9a\x8c\x00\x00\x00'
+                     b'\x00\x00\x00')
+X11_DATA = bytearray(b'\x1eA2\xd0\x07\x1c\x05\x0c\x01\x10\x00\x03\x00'
+                     b'\x02\x00\x00A2d\x00\x1c\x05\x0c\x0f\x06\x13\x0c'
+                     b'\x1e\x00G\x15\xcd[\x07\x01\x00\x33\x08\x01\x0f'
+                     b'\x00\x10\xa5\xd4\xe8\x00')
+X62_DATA = bytearray(b'\x1e\x10\x27\x00\x00\x00\x00\x00\x00'
+                     + b'\xff' * 18)
+
+
+def legacy_x10(data, error=0):
+    kkt_flags = string2bits(data[2:0:-1])
+    kkt_flags = [ KKT_FLAGS[i] for i, x in enumerate(kkt_flags) if x ]
+    operations = int2.unpack(bytearray((data[10], data[5])))
+    return {
+        'error':           error,
+        'operator':        data[0],
+        'kkt_flags':       kkt_flags,
+        'kkt_mode':        data[3],
+        'kkt_submode':     data[4],
+        'voltage_battery': data[6],
+        'voltage_power':   data[7],
+        'fp_error':        data[8],
+        'eklz_error':      data[9],
+        'operations':      operations,
+        'reserve':         bytes(data[11:]),
+    }
+
+
+def legacy_x11(data, error=0):
+    day, month, year = data[5], data[6], data[7]
+    if year > 90:
+        kkt_date = datetime.date(1900+year, month, day)
+    else:
+        kkt_date = datetime.date(2000+year, month, day)
+    kkt_flags = string2bits(data[12:10:-1])
+    kkt_flags = [ KKT_FLAGS[i] for i, x in enumerate(kkt_flags) if x ]
+    day, month, year = data[20], data[21], data[22]
+    if year > 90:
+        fp_date = datetime.date(1900+year, month, day)
+    else:
+        fp_date = datetime.date(2000+year, month, day)
+    date = datetime.date(2000+data[25], data[24], data[23])
+    time = datetime.time(data[26], data[27], data[28])
+    fp_flags = string2bits(data[29:30])
+    fp_flags = [ FP_FLAGS[i][x] for i, x in enumerate(fp_flags) ]
+    return {
+        'error':       error,
+        'operator':    data[0],
+        'kkt_version': '%s.%s' % (chr(data[1]), chr(data[2])),
+        'kkt_build':   int2.unpack(data[3:5]),
+        'kkt_date':    kkt_date,
+        'hall':        data[8],
+        'document':    int2.unpack(data[9:11]),
+        'kkt_flags':   kkt_flags,
+        'kkt_mode':    data[13],
+        'kkt_submode': data[14],
+        'kkt_port':    data[15],
+        'fp_version':  '%s.%s' % (chr(data[16]), chr(data[17])),
+        'fp_build':    int2.unpack(data[18:20]),
+        'fp_date':     fp_date,
+        'date':        date,
+        'time':        time,
+        'fp_flags':    fp_flags,
+        'serial_number': int4.unpack(data[30:34]),
+        'last_closed_session': int2.unpack(data[34:36]),
+        'fp_free_records':     int2.unpack(data[36:38]),
+        'registration_count':  data[38],
+        'registration_left':   data[39],
+        'inn':          int6.unpack(data[40:46])
+    }
+
+
+def legacy_x62(data):
+    result = {
+        'operator': data[0],
+        'sale': integer2money(int8.unpack(data[1:9])),
+        'purchase': integer2money(int6.unpack(data[9:15])),
+        'refuse_sale': integer2money(int6.unpack(data[15:21])),
+        'refuse_purchase': integer2money(int6.unpack(data[21:])),
+    }
+    for key in ('purchase', 'refuse_sale', 'refuse_purchase'):
+        if result[key] == 2814749767106.55:
+            result[key] = 0
+    return result
+
+
+# Поля, разбор которых исправлен по сравнению с прежним
+FIXED = ('operations', 'kkt_flags', 'fp_flags')
+
+CASES = (
+    ('10H', legacy_x10, decode_x10, X10_DATA),
+    ('11H', legacy_x11, decode_x11, X11_DATA),
+    ('62H', legacy_x62, decode_x62, X62_DATA),
+)
+
+
+def bench(func, data, number):
+    return min(timeit.repeat(lambda: func(data), number=number, repeat=5))
+
+
+def read_legacy(legacy):
+    """ Прежний разбор с чтением всех полей """
+    def read(data):
+        for value in legacy(data).values():
+            pass
+    return read
+
+
+def read_decoded(decode):
+    """ Новый разбор с чтением всех полей """
+    def read(data):
+        result = decode(data)
+        for name in result._fields:
+            getattr(result, name)
+    return read
+
+
+def main(number=20000):
+    print('%-4s %12s %12s %12s %12s %8s' % ('', 'прежний', 'новый',
+          'прежний+поля', 'новый+поля', 'ускор.'))
+    for name, legacy, decode, data in CASES:
+        # Прежний и новый разбор должны давать одинаковый результат
+        # (кроме исправленных порядка байт количества операций в 10H и
+        # порядка битов флагов).
+        expected = legacy(data)
+        result = decode(data).to_dict()
+        for key in FIXED:
+            expected.pop(key, None)
+            result.pop(key, None)
+        assert result == expected, (result, expected)
+
+        old = bench(legacy, data, number)
+        new = bench(decode, data, number)
+        old_full = bench(read_legacy(legacy), data, number)
+        new_full = bench(read_decoded(decode), data, number)
+        print('%-4s %10.2fмкс %10.2fмкс %10.2fмкс %10.2fмкс %7.1fx' % (
+            name, old / number * 1e6, new / number * 1e6,
+            old_full / number * 1e6, new_full / number * 1e6,
+            old_full / new_full))
+
+
+if __name__ == '__main__':
+    main(*[int(x) for x in sys.argv[1:2]])
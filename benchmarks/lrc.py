@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+#
+#  Copyright 2013 Grigoriy Kramarenko <root@rosix.ru>
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+#  MA 02110-1301, USA.
+#
+#
+
+### Микро-тест подсчёта LRC ###
+#
+# Сравнивает прежний побайтовый подсчёт (ord/chr по строке, склеенной
+# из длины, команды, кода ошибки и данных) с utils.lrc на сообщениях
+# максимальной длины (255 байт после байта длины) и коротком ответе.
+# Для приёма частями LRC считается по кускам буфера через memoryview.
+#
+#     python benchmarks/lrc.py [количество повторений]
+
+from __future__ import print_function, unicode_literals
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from shtrihmfr.utils import PY2, lrc
+
+if PY2:
+    chr = unichr
+
+
+def legacy_control_summ(string):
+    result = 0
+    for s in string:
+        result = result ^ ord(s)
+    return chr(result)
+
+
+def legacy_read(length, command, error, data):
+    # Прежний read(): строка собиралась заново только для подсчёта LRC
+    string = chr(length) + command + error + data
+    return legacy_control_summ(string)
+
+
+def chunked(frame, size):
+    # Приём порциями по size байт, как в KKT.read_frame
+    view = memoryview(frame)
+    summ = 0
+    for offset in range(0, len(frame), size):
+        summ = lrc(view[offset:offset+size], summ)
+    return summ
+
+
+def make_frame(length):
+    frame = bytearray(os.urandom(length + 1))
+    frame[0] = length
+    return frame
+
+
+def bench(func, number):
+    return min(timeit.repeat(func, number=number, repeat=5))
+
+
+def main(number=20000):
+    print('%-12s %12s %12s %12s %8s' % ('', 'прежний', 'целиком',
+                                         'по 64 байта', 'ускор.'))
+    for name, length in (('255 байт', 255), ('12 байт', 12)):
+        frame = make_frame(length)
+        text = frame.decode('latin-1')
+        command, error, data = text[1], text[2], text[3:]
+
+        expected = ord(legacy_read(length, command, error, data))
+        assert lrc(frame) == expected
+        assert chunked(frame, 64) == expected
+
+        old = bench(lambda: legacy_read(length, command, error, data), number)
+        new = bench(lambda: lrc(frame), number)
+        parts = bench(lambda: chunked(frame, 64), number)
+        print('%-12s %10.2fмкс %10.2fмкс %10.2fмкс %7.1fx' % (
+            name, old / number * 1e6, new / number * 1e6,
+            parts / number * 1e6, old / new))
+
+
+if __name__ == '__main__':
+    main(*[int(x) for x in sys.argv[1:2]])
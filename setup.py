@@ -12,7 +12,7 @@ setup(
     license='GNU General Public License v3 or later (GPLv3+)',
     platforms='any',
     zip_safe=False,
-    packages=find_packages(),
+    packages=find_packages(exclude=['tests', 'tests.*']),
     include_package_data = True,
     install_requires=['pyserial'],
     classifiers=[
@@ -0,0 +1,417 @@
+# -*- coding: utf-8 -*-
+#
+#  Copyright 2013 Grigoriy Kramarenko <root@rosix.ru>
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+#  MA 02110-1301, USA.
+#
+#
+
+### Асинхронный клиент ККТ (asyncio, Python 3.5+) ###
+#
+# Один цикл событий может обслуживать любое количество ККТ:
+#
+#     async def main():
+#         async with AsyncKKT(port='tcp://10.0.0.5:7778') as kkt:
+#             state = await kkt.x10()
+#
+# Обмен идёт через потоки asyncio: TCP - средствами стандартной
+# библиотеки, последовательный порт - через pyserial-asyncio. Команды
+# выполняются в цикле событий, без потоков исполнителя.
+
+import asyncio
+import re
+import socket
+import threading
+
+from .conf import *
+from .kkt import KKT, KktError, ConnectionError, ENQ, STX, ACK, NAK
+from .protocol import (BUG_ACTIONS, DEFAULT_BUG_ACTION, RECOVERABLE_ACTIONS,
+                       ACTION_CONTINUE)
+from .registers import (MONEY_REGISTER_SIZE, OPERATION_REGISTER_SIZE,
+                        money_registers, operation_registers)
+from .transport import serial_device
+from .utils import lrc
+
+try:
+    import serial_asyncio
+except ImportError:
+    serial_asyncio = None
+
+
+__all__ = ('AsyncKKT',)
+
+
+class _Bridge(KKT):
+    """ Выполняет синхронную функцию KKT в потоке исполнителя (см.
+        AsyncKKT.call).
+
+        Вызовы ask() передаются асинхронному клиенту в его цикл событий,
+        поток ждёт ответа. Шаблоны сообщений хранятся у клиента
+        отдельно для каждого потока исполнителя: их заполняют только
+        функции этого потока, по очереди.
+    """
+
+    def __init__(self, client, loop):
+        self.__dict__.update(client.__dict__)
+        self.password = client.password
+        self.admin_password = client.admin_password
+        self._templates = client._bridge_templates.setdefault(
+            threading.current_thread().ident, {})
+        self._client = client
+        self._loop = loop
+
+    def ask(self, *args, **kwargs):
+        future = asyncio.run_coroutine_threadsafe(
+            self._client.ask(*args, **kwargs), self._loop)
+        return future.result()
+
+
+class AsyncKKT(object):
+    """ Асинхронный клиент ККТ.
+
+        Параметры (port, password, admin_password, bod, timeout,
+        money_type, retry_policy, auto_recover) совпадают с KKT. Все
+        реализованные команды KKT доступны под теми же именами как
+        сопрограммы. Команды одному устройству выполняются строго по
+        очереди, разным - параллельно.
+
+        Команды не занимают потоков: параметры проверяются и
+        упаковываются теми же методами KKT, а обмен и разбор ответа
+        выполняются в цикле событий (см. _execute).
+    """
+    port           = KKT.port
+    password       = KKT.password
+    admin_password = KKT.admin_password
+    bod            = KKT.bod
+    timeout        = KKT.timeout
+    writeTimeout   = KKT.writeTimeout
+    durations      = KKT.durations
+    money_type     = KKT.money_type
+    retry_policy   = KKT.retry_policy
+    auto_recover   = KKT.auto_recover
+    recoveries     = 0
+    # Исполнитель синхронных функций (см. call), None - исполнитель
+    # цикла событий по умолчанию
+    executor       = None
+
+    _reader = None
+    _writer = None
+    # Создаётся в цикле событий при первом обмене (см. _get_lock)
+    _lock   = None
+
+    def __init__(self, **kwargs):
+        # Разбор паролей и прочих параметров такой же, как у KKT
+        KKT.__init__(self, **kwargs)
+        self._templates = {}
+        self._bridge_templates = {}
+
+    # Проверка и упаковка параметров, шаблоны и разбор ответов - общие
+    # с KKT
+    get_duration  = KKT.get_duration
+    money2integer = KKT.money2integer
+    integer2money = KKT.integer2money
+    pack_params   = KKT.pack_params
+    template      = KKT.template
+    _prepare      = KKT._prepare
+    _result       = KKT._result
+    _date         = staticmethod(KKT._date)
+    _x5summa      = KKT._x5summa
+    _x8count      = KKT._x8count
+    _x8summa      = KKT._x8summa
+
+    def preempt(self):
+        """ Срочные команды в цикле событий ждут блокировки устройства,
+            вытеснять нечего (см. BaseKKT.preempt).
+        """
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.disconnect()
+
+    @property
+    def is_connected(self):
+        """ Возвращает состояние соединения """
+        return self._writer is not None
+
+    def _get_lock(self):
+        """ Блокировка обмена с устройством. Создаётся в работающем
+            цикле событий: на Python < 3.10 asyncio.Lock привязывается
+            к циклу при создании.
+        """
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        return self._lock
+
+    async def connect(self):
+        """ Устанавливает соединение """
+        try:
+            if self.port.startswith(('tcp://', 'socket://')):
+                host, _, port = self.port.split('://', 1)[1].partition(':')
+                port = int(port.strip('/') or DEFAULT_TCP_PORT)
+                reader, writer = await asyncio.wait_for(
+                    asyncio.open_connection(host, port), self.writeTimeout)
+                sock = writer.get_extra_info('socket')
+                if sock is not None:
+                    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            else:
+                if serial_asyncio is None:
+                    raise ConnectionError('Для работы с последовательным портом '
+                                          'требуется пакет pyserial-asyncio')
+                reader, writer = await serial_asyncio.open_serial_connection(
+                    url=serial_device(self.port), baudrate=self.bod)
+        except (OSError, asyncio.TimeoutError):
+            raise ConnectionError('Невозможно соединиться с ККМ (порт=%s)' % self.port)
+        self._reader, self._writer = reader, writer
+        return True
+
+    async def disconnect(self):
+        """ Закрывает соединение """
+        writer, self._reader, self._writer = self._writer, None, None
+        if writer is not None:
+            writer.close()
+        return True
+
+    async def _read(self, size, timeout):
+        """ Считывает ровно size байт не дольше timeout секунд """
+        try:
+            return await asyncio.wait_for(self._reader.readexactly(size), timeout)
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError):
+            raise ConnectionError('Нет связи с устройством')
+
+    async def _read_answer(self, timeout, retry=None):
+        """ Дожидается STX и считывает ответ ККТ.
+
+            Ответ с неверной контрольной суммой отклоняется (NAK) и
+            запрашивается снова (ENQ), пока не кончится запас retry -
+            как в BaseKKT.read.
+        """
+        if retry is None:
+            retry = self.retry_policy.start()
+        while True:
+            if await self._read(1, timeout) != STX:
+                raise ConnectionError('Нет связи с устройством')
+            length = (await self._read(1, self.timeout))[0]
+            frame = await self._read(length + 1, self.timeout)
+            control_summ = lrc(memoryview(frame)[:length], length)
+            if frame[length] == control_summ:
+                break
+            # После NAK ККТ ждёт ENQ и, если ответ ещё у неё,
+            # подтверждает (ACK) и повторяет его
+            self._writer.write(NAK)
+            delay = retry.take()
+            if delay is not None:
+                await asyncio.sleep(delay)
+                self._writer.write(ENQ)
+            if delay is None or retry.expired() or \
+                    await self._read(1, self.timeout) != ACK:
+                msg = 'Контрольная сумма %i должна быть равна %i ' % (
+                    control_summ, frame[length])
+                raise KktError(msg)
+            timeout = max(retry.remaining(), self.timeout)
+        self._writer.write(ACK)
+        return frame[2:length], frame[1], frame[0:1]
+
+    async def clear(self):
+        """ Проверяет готовность ККТ и сбрасывает ответ, если он
+            остался в ККТ от предыдущего обмена.
+        """
+        self._writer.write(ENQ)
+        answer = await self._read(1, self.timeout)
+        if answer == ACK:
+            await self._read_answer(STX_TIMEOUT)
+        elif answer != NAK:
+            raise ConnectionError('Нет связи с устройством')
+        return True
+
+    def _build(self, command, params):
+        """ Собирает сообщение команды """
+        data = bytes((command,)) + (params or b'')
+        content = bytes((len(data),)) + data
+        return STX + content + bytes((lrc(content),))
+
+    async def execute(self, command, **kwargs):
+        """ Асинхронный аналог KKT.execute """
+        return await self._execute(command, kwargs)
+
+    async def _execute(self, command, values, integers=False, template=False,
+                       raw=False, password=None, convert=None, **options):
+        """ Асинхронный аналог KKT._execute. Сообщение из шаблона
+            заполняется под блокировкой устройства: шаблон общий для
+            всех команд клиента.
+        """
+        async with self._get_lock():
+            params = self._prepare(command, values, integers, template,
+                                   password, options)
+            data, error = (await self._ask(command, params,
+                                           without_password=True,
+                                           **options))[:2]
+        return self._result(command, data, error, raw, convert)
+
+    async def ask(self, command, params=None, sleep=0, pre_clear=True,
+                  without_password=False, disconnect=True, quick=False,
+                  frame=None, recover=None):
+        """ Асинхронный аналог BaseKKT.ask: отправляет команду и
+            возвращает (data, error, command). Соединение между
+            командами не закрывается.
+
+            Готовое сообщение frame (см. BaseKKT.template) передаётся
+            как есть, params тогда не используются. Крайний срок и
+            запас повторов определяются retry_policy, восстановление
+            после ошибок (recover, по умолчанию auto_recover) - как в
+            BaseKKT.ask.
+        """
+        async with self._get_lock():
+            return await self._ask(command, params, sleep, pre_clear,
+                                   without_password, disconnect, quick,
+                                   frame, recover)
+
+    async def _ask(self, command, params=None, sleep=0, pre_clear=True,
+                   without_password=False, disconnect=True, quick=False,
+                   frame=None, recover=None):
+        """ ask без блокировки устройства """
+        if frame is None:
+            if params is None and not without_password:
+                params = self.password
+            frame = self._build(command, params)
+        if recover is None:
+            recover = self.auto_recover
+        expected, maximum = self.get_duration(command)
+        retry = self.retry_policy.start(maximum)
+
+        if not self.is_connected:
+            await self.connect()
+        try:
+            if not quick:
+                await self.clear()
+            while True:
+                answer, error, command = await self._exchange(
+                    frame, retry, sleep)
+                if not (error and recover and
+                        await self._recover(error, retry)):
+                    break
+        except (ConnectionError, OSError):
+            await self.disconnect()
+            raise
+        if error:
+            raise KktError(error)
+        return answer, error, command
+
+    async def _exchange(self, frame, retry, sleep=0):
+        """ Отправляет сообщение и ждёт ответа до крайнего срока retry """
+        self._writer.write(frame)
+        await self._writer.drain()
+        if await self._read(1, self.timeout) != ACK:
+            raise ConnectionError('ККТ не подтвердила приём команды')
+        if sleep:
+            await asyncio.sleep(sleep)
+        return await self._read_answer(max(retry.remaining(), self.timeout),
+                                       retry)
+
+    async def _recover(self, error, retry):
+        """ Асинхронный аналог BaseKKT._recover """
+        action = BUG_ACTIONS.get(error, DEFAULT_BUG_ACTION)[1]
+        if action not in RECOVERABLE_ACTIONS:
+            return False
+        delay = retry.take()
+        if delay is None:
+            return False
+        await asyncio.sleep(delay)
+        if retry.expired():
+            return False
+        if action == ACTION_CONTINUE:
+            frame = self._build(0xB0, self.admin_password)
+            error = (await self._exchange(frame, retry))[1]
+            if error:
+                raise KktError(error)
+        self.recoveries += 1
+        return True
+
+    async def x12_loop(self, text='', control_tape=False):
+        """ Печать жирной строки без ограничения на 20 символов """
+        last_result = None
+        while len(text) > 0:
+            last_result = await self.x12(text=text[:20],
+                                         control_tape=control_tape)
+            text = text[20:]
+        return last_result
+
+    async def x17_loop(self, text='', control_tape=False):
+        """ Печать строки без ограничения на 36 символов """
+        last_result = None
+        while len(text) > 0:
+            last_result = await self.x17(text=text[:36],
+                                         control_tape=control_tape)
+            text = text[36:]
+        return last_result
+
+    async def money_registers(self, numbers=None):
+        """ Асинхронный аналог KKT.money_registers """
+        numbers, buffer = await self._read_registers(0x1A, numbers,
+                                                     MONEY_REGISTER_SIZE)
+        return money_registers(numbers, buffer, self.integer2money)
+
+    async def operation_registers(self, numbers=None):
+        """ Асинхронный аналог KKT.operation_registers """
+        numbers, buffer = await self._read_registers(0x1B, numbers,
+                                                     OPERATION_REGISTER_SIZE)
+        return operation_registers(numbers, buffer)
+
+    async def _read_registers(self, command, numbers, size):
+        """ Асинхронный аналог KKT._read_registers. Между регистрами
+            устройство свободно для других команд.
+        """
+        if numbers is None:
+            numbers = range(256)
+        numbers = tuple(numbers)
+        buffer = bytearray(len(numbers) * size)
+        offset = 0
+        for number in numbers:
+            data = await self._execute(command, {'register': number},
+                                       template=True, raw=True)
+            buffer[offset:offset+size] = data[1:size+1]
+            offset += size
+        return numbers, buffer
+
+    async def call(self, method, *args, **kwargs):
+        """ Выполняет синхронную функцию method(kkt, ...) один раз в
+            исполнителе executor, передавая её запросы к ККТ через
+            асинхронный ask(). Нужна для функций, которых нет среди
+            сопрограмм клиента: команды KKT выполняются без потоков.
+        """
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(self.executor, lambda:
+            method(_Bridge(self, loop), *args, **kwargs))
+
+
+def _command(method):
+    """ Сопрограмма команды KKT: метод KKT проверяет и упаковывает
+        параметры и возвращает результат _execute клиента, то есть
+        сопрограмму обмена с устройством.
+    """
+    async def command(self, *args, **kwargs):
+        return await method(self, *args, **kwargs)
+    command.__name__ = method.__name__
+    command.__doc__ = method.__doc__
+    return command
+
+
+# Сопрограммы для всех команд KKT: x10, x11, x80...x8D и т.д.
+for _name, _method in list(vars(KKT).items()):
+    if re.match(r'^x[0-9A-F]{2}$', _name) and callable(_method):
+        setattr(AsyncKKT, _name, _command(_method))
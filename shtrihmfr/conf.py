@@ -27,11 +27,50 @@ DEFAULT_PASSWORD       = (0x1, 0x0, 0x0, 0x0)
 # Порт в GNU/Linux по-умолчанию (COM1)
 DEFAULT_PORT = '/dev/ttyUSB0'
 DEFAULT_BOD  = 4800
+# Тайм-аут приёма байта, устанавливаемый ККТ при повышении скорости
+FAST_BYTE_TIMEOUT = 0.05
+
+# Порт TCP по-умолчанию для ККТ с сетевым интерфейсом
+DEFAULT_TCP_PORT = 7778
+# Пауза перед повторным соединением по TCP после ошибки (сек.),
+# удваивается при каждой неудаче до TCP_MAX_BACKOFF
+TCP_BACKOFF     = 0.5
+TCP_MAX_BACKOFF = 30
+# Интервал проверки простаивающих TCP-соединений (keep-alive), сек.
+TCP_KEEPALIVE   = 30
 
 # Кодировка текста для устройств
 CODE_PAGE = 'cp1251'
+# Символ вместо отсутствующих в кодировке
+TEXT_FALLBACK = '?'
+# Количество закодированных строк в кэше (см. utils.TextCache)
+TEXT_CACHE_SIZE = 4096
 
 # Кол-во попыток и таймаут
 MAX_ATTEMPT = 12
 MIN_TIMEOUT = 0.05
 
+# Общее время ожидания начала ответа (STX), сек. Равно сумме интервалов
+# прежнего ожидания MIN_TIMEOUT * 1.5**n для MAX_ATTEMPT попыток.
+STX_TIMEOUT = MIN_TIMEOUT * (1.5 ** MAX_ATTEMPT - 1) / 0.5
+
+# Политика повторов по умолчанию (см. retry.RetryPolicy): общий крайний
+# срок вызова (None - время выполнения команды), наибольшая пауза между
+# повторами, рост паузы и её случайное отклонение. Запас повторов -
+# MAX_ATTEMPT, первая пауза - MIN_TIMEOUT.
+RETRY_DEADLINE    = None
+RETRY_MAX_BACKOFF = 1.0
+RETRY_MULTIPLIER  = 1.5
+RETRY_JITTER      = 0.2
+
+# Максимальный простой порта в сессии (сек.), после которого он
+# переоткрывается перед следующей командой. None - без ограничения.
+SESSION_IDLE_TIMEOUT = None
+
+# Длина очереди команд обработчика устройства (см. worker.DeviceWorker)
+# и время ожидания места в ней (сек.), None - без ограничения
+WORKER_QUEUE_SIZE  = 100
+WORKER_PUT_TIMEOUT = 5
+
+# Шаблоны путей портов для поиска устройств (см. fleet.discover_ports)
+FLEET_PORTS = ('/dev/ttyUSB*', '/dev/ttyACM*')
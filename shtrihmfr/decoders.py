@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+#
+#  Copyright 2013 Grigoriy Kramarenko <root@rosix.ru>
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+#  MA 02110-1301, USA.
+#
+#
+
+### Разбор ответов на запросы состояния ###
+#
+# Команды 10H, 11H и 62H опрашиваются постоянно, поэтому их ответы
+# разбираются одним заранее скомпилированным struct.Struct.unpack_from
+# прямо из буфера ответа (bytes, bytearray или memoryview) без нарезки
+# и склейки строк. Результат - объект ответа (см. responses). Даты,
+# время и флаги разбираются сразу: отложенное значение (responses.lazy)
+# обходится дороже, чем их создание.
+#
+# Флаги разбираются по заранее построенным таблицам из 256 элементов:
+# байт -> кортеж названий, по одному обращению на байт.
+
+from __future__ import unicode_literals
+import datetime
+import struct
+
+from .protocol import KKT_FLAGS, FP_FLAGS, IBM_FLAGS, IBM_SHORT_FLAGS
+from .responses import ShortState, State, FPTotals
+from .utils import integer2money
+
+
+__all__ = ('flag_table', 'state_table', 'kkt_flags', 'fp_flags',
+    'ibm_flags', 'ibm_short_flags', 'decode_x10', 'decode_x11', 'decode_x62')
+
+
+# Даты и время, которые не заданы (нули) или испорчены, разбираются в
+# None - так же, как в схеме команд (см. schema).
+
+def _date(day, month, year):
+    """ Дата ДД-ММ-ГГ текущего века """
+    try:
+        return datetime.date(2000+year, month, day)
+    except ValueError:
+        return None
+
+
+def _software_date(day, month, year):
+    """ Дата ДД-ММ-ГГ программного обеспечения (с 1991 года) """
+    try:
+        if year > 90:
+            return datetime.date(1900+year, month, day)
+        return datetime.date(2000+year, month, day)
+    except ValueError:
+        return None
+
+
+def _time(hour, minute, second):
+    """ Время ЧЧ-ММ-СС """
+    try:
+        return datetime.time(hour, minute, second)
+    except ValueError:
+        return None
+
+
+def _short_answer(command, data, layout):
+    """ Ошибка короткого ответа, как в schema.Command.unpack """
+    return ValueError('Длина ответа команды %02XH (%d) меньше ожидаемой '
+                      '(%d)' % (command, len(data), layout.size))
+
+
+def flag_table(names, offset=0):
+    """ Таблица для байта флагов, где названия есть только у
+        установленных битов: {номер бита: название}. Байт содержит
+        биты offset...offset+7.
+    """
+    return tuple([ tuple([ names[offset+i] for i in range(8)
+                           if byte >> i & 1 and offset+i in names ])
+                   for byte in range(256) ])
+
+
+def state_table(states):
+    """ Таблица для байта флагов, где у каждого бита названы оба
+        состояния: {номер бита: {0: название, 1: название}}.
+    """
+    return tuple([ tuple([ states[i][byte >> i & 1] for i in sorted(states) ])
+                   for byte in range(256) ])
+
+
+KKT_FLAGS_LOW   = flag_table(KKT_FLAGS)
+KKT_FLAGS_HIGH  = flag_table(KKT_FLAGS, 8)
+FP_FLAGS_TABLE  = state_table(FP_FLAGS)
+IBM_FLAGS_TABLE = flag_table(IBM_FLAGS)
+IBM_SHORT_FLAGS_TABLE = flag_table(IBM_SHORT_FLAGS)
+
+
+def kkt_flags(flags):
+    """ Флаги ККТ (2 байта) """
+    return list(KKT_FLAGS_LOW[flags & 0xFF] + KKT_FLAGS_HIGH[flags >> 8])
+
+
+def fp_flags(flags):
+    """ Флаги ФП (1 байт) """
+    return list(FP_FLAGS_TABLE[flags])
+
+
+def ibm_flags(flags):
+    """ Флаги состояния ФР IBM (команда D0H) """
+    return list(IBM_FLAGS_TABLE[flags])
+
+
+def ibm_short_flags(flags):
+    """ Флаги состояния ФР IBM (команда D1H) """
+    return list(IBM_SHORT_FLAGS_TABLE[flags])
+
+
+# Ответ 10H: оператор, флаги ККТ, режим, подрежим, младший байт
+# количества операций, напряжения батареи и питания, ошибки ФП и ЭКЛЗ,
+# старший байт количества операций.
+X10 = struct.Struct(b'<BHBBBBBBBB')
+
+
+def decode_x10(data, error=0):
+    """ Разбирает ответ команды 10H (без кода ошибки) """
+    try:
+        (operator, flags, mode, submode, operations_low, battery, power,
+         fp_error, eklz_error, operations_high) = X10.unpack_from(data)
+    except struct.error:
+        raise _short_answer(0x10, data, X10)
+
+    return ShortState(
+        error, operator, kkt_flags(flags), mode, submode, battery,
+        power, fp_error, eklz_error, operations_high << 8 | operations_low,
+        bytes(data[X10.size:]))
+
+
+# Ответ 11H: оператор, версия (2 символа), сборка и дата ПО ККТ, номер
+# в зале, номер документа, флаги ККТ, режим, подрежим, порт, версия,
+# сборка и дата ПО ФП, текущие дата и время, флаги ФП, заводской номер,
+# последняя закрытая смена, свободные записи ФП, перерегистрации
+# (выполнено и осталось), ИНН (младшие 4 байта и старшие 2 байта).
+X11 = struct.Struct(b'<BBBH3BBHHBBBBBH3B3B3BBIHHBBIH')
+
+
+def decode_x11(data, error=0):
+    """ Разбирает ответ команды 11H (без кода ошибки) """
+    try:
+        (operator, kkt_major, kkt_minor, kkt_build,
+         kkt_day, kkt_month, kkt_year, hall, document, kkt_state,
+         mode, submode, port, fp_major, fp_minor, fp_build,
+         fp_day, fp_month, fp_year, day, month, year,
+         hour, minute, second, fp_state, serial_number, last_closed_session,
+         fp_free_records, registration_count, registration_left,
+         inn_low, inn_high) = X11.unpack_from(data)
+    except struct.error:
+        raise _short_answer(0x11, data, X11)
+
+    return State(
+        error, operator, '%s.%s' % (chr(kkt_major), chr(kkt_minor)),
+        kkt_build, _software_date(kkt_day, kkt_month, kkt_year), hall,
+        document, kkt_flags(kkt_state), mode, submode, port,
+        '%s.%s' % (chr(fp_major), chr(fp_minor)), fp_build,
+        _software_date(fp_day, fp_month, fp_year), _date(day, month, year),
+        _time(hour, minute, second), fp_flags(fp_state),
+        serial_number, last_closed_session, fp_free_records,
+        registration_count, registration_left, inn_high << 32 | inn_low)
+
+
+# Ответ 62H: оператор, сумма продаж (8 байт), суммы покупок, возвратов
+# продаж и возвратов покупок (по 6 байт: младшие 4 и старшие 2 байта).
+X62 = struct.Struct(b'<BQIHIHIH')
+
+# Так ККТ заполняет суммы при отсутствии ФП 2
+X62_MISSING = 0xFFFFFFFFFFFF
+
+
+def _x62_money(low, high, money):
+    value = high << 32 | low
+    if value == X62_MISSING:
+        return money(0)
+    return money(value)
+
+
+def decode_x62(data, money=integer2money):
+    """ Разбирает ответ команды 62H (без кода ошибки). Суммы
+        переводятся из копеек функцией money (см. KKT.integer2money).
+    """
+    try:
+        (operator, sale, purchase_low, purchase_high, refuse_sale_low,
+         refuse_sale_high, refuse_purchase_low,
+         refuse_purchase_high) = X62.unpack_from(data)
+    except struct.error:
+        raise _short_answer(0x62, data, X62)
+
+    return FPTotals(
+        operator, money(sale),
+        _x62_money(purchase_low, purchase_high, money),
+        _x62_money(refuse_sale_low, refuse_sale_high, money),
+        _x62_money(refuse_purchase_low, refuse_purchase_high, money))
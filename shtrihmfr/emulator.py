@@ -0,0 +1,628 @@
+# -*- coding: utf-8 -*-
+#
+#  Copyright 2013 Grigoriy Kramarenko <root@rosix.ru>
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+#  MA 02110-1301, USA.
+#
+#
+
+### Эмулятор ККТ Штрих-М ###
+#
+# Отвечает по протоколу ENQ/ACK/NAK/STX на реализованные в KKT
+# команды, ведёт режим и подрежим ККТ (KKT_MODES, KKT_SUBMODES),
+# состояние смены и чека, и возвращает коды ошибок из BUGS на
+# недопустимые последовательности команд.
+#
+# Эмулятор можно подключить к драйверу через псевдотерминал:
+#
+#     emulator = PtyEmulator(baudrate=115200).start()
+#     kkt = KKT(port=emulator.port)
+#
+# или без терминала, как обработчик транспорта в памяти:
+#
+#     kkt = KKT(transport=LoopbackTransport(handler=Emulator()))
+#
+# Запуск из командной строки: python -m shtrihmfr.emulator --baudrate 4800
+
+from __future__ import unicode_literals
+import datetime
+import os
+import struct
+import threading
+import time
+
+from .conf import *
+from .protocol import *
+from .utils import lrc
+
+
+__all__ = ('Emulator', 'PtyEmulator')
+
+# ASCII
+ENQ = 0x05
+STX = 0x02
+ACK = 0x06
+NAK = 0x15
+
+# Режимы ККТ
+MODE_OPEN_SESSION   = 2
+MODE_CLOSED_SESSION = 4
+MODE_OPEN_DOCUMENT  = 8
+
+
+def _pack(value, size):
+    """ Целое число в size байт, младший байт первый """
+    return bytearray(struct.pack('<q', value)[:size])
+
+
+def _unpack(data):
+    """ Целое число со знаком из байт, младший байт первый """
+    data = bytes(bytearray(data))
+    size = len(data)
+    fill = b'\xff' if size and bytearray(data)[-1] & 0x80 else b'\x00'
+    return struct.unpack('<q', data + fill * (8 - size))[0]
+
+
+def _date(value):
+    return bytearray((value.day, value.month, value.year % 100))
+
+
+def _time(value):
+    return bytearray((value.hour, value.minute, value.second))
+
+
+class Emulator(object):
+    """ Состояние и логика команд эмулируемой ККТ.
+
+        Эмулятор принимает байты от хоста методом feed() и возвращает
+        байты ответа, поэтому годится как обработчик LoopbackTransport.
+    """
+    serial_number  = 12345678
+    inn            = 7701000000
+    device_name    = 'ШТРИХ-ЭМУЛЯТОР'
+    baudrate       = DEFAULT_BOD
+    byte_timeout   = 100 # Код тайм-аута приёма байта, см. команду 14H
+    # Задержка на выполнение команды, сек.
+    command_delay  = 0.0
+
+    def __init__(self, **kwargs):
+        [ setattr(self, k, v) for k,v in kwargs.items() ]
+        self.mode          = MODE_CLOSED_SESSION
+        self.submode       = 0
+        self.document_type = 0
+        self.receipt_total = 0
+        self.operations    = 0
+        self.document      = 0
+        self.session       = 0
+        self.cash          = 0
+        self.registers     = {}
+        self.sales         = 0
+        self._buffer       = bytearray()
+        self._pending      = None
+        self._lock         = threading.Lock()
+        self.handlers = {
+            0x10: self.x10, 0x11: self.x11, 0x12: self.print_line,
+            0x13: self.operator_only, 0x14: self.x14, 0x15: self.x15,
+            0x17: self.print_line, 0x18: self.x18, 0x1A: self.x1A,
+            0x1B: self.x1B,
+            0x1E: self.admin_only, 0x21: self.admin_only,
+            0x22: self.admin_only, 0x23: self.admin_only,
+            0x25: self.operator_only, 0x29: self.operator_only,
+            0x40: self.x40, 0x41: self.x41, 0x50: self.x50,
+            0x51: self.x51, 0x52: self.operator_only, 0x62: self.x62,
+            0x80: self.x8count, 0x81: self.x8count, 0x82: self.x8count,
+            0x83: self.x8count, 0x84: self.x8count, 0x85: self.x85,
+            0x86: self.x8summa, 0x87: self.x8summa, 0x88: self.x88,
+            0x89: self.x89, 0x8A: self.x8summa, 0x8B: self.x8summa,
+            0x8C: self.operator_only, 0x8D: self.x8D,
+            0xA7: self.admin_only, 0xAB: self.xAB, 0xAF: self.admin_only,
+            0xB0: self.operator_only, 0xB1: self.xB1,
+            0xB2: self.admin_only, 0xBA: self.xBA,
+            0xC2: self.operator_only, 0xCA: self.xCA,
+            0xE0: self.xE0, 0xE1: self.operator_only,
+            0xE2: self.operator_only, 0xE3: self.operator_only,
+            0xE7: self.xE7, 0xFC: self.xFC,
+        }
+
+    # Обмен сообщениями
+
+    def __call__(self, data):
+        return self.feed(data)
+
+    def feed(self, data):
+        """ Принимает байты от хоста, возвращает байты ответа """
+        return b''.join([ chunk for delay, chunk in self.process(data) ])
+
+    def process(self, data):
+        """ Принимает байты от хоста, возвращает список пар (задержка
+            перед отправкой в секундах, байты ответа).
+        """
+        output = []
+        with self._lock:
+            self._buffer.extend(bytearray(data))
+            buf = self._buffer
+            while buf:
+                byte = buf[0]
+                if byte == STX:
+                    if len(buf) < 2 or len(buf) < buf[1] + 3:
+                        break
+                    length = buf[1]
+                    content = buf[1:length + 2]
+                    control = buf[length + 2]
+                    del buf[:length + 3]
+                    # Сообщение без кода команды ККТ не принимает
+                    if not length or self.control_summ(content) != control:
+                        output.append((0, bytes(bytearray((NAK,)))))
+                        continue
+                    output.append((0, bytes(bytearray((ACK,)))))
+                    command = content[1]
+                    error, answer = self.execute(command, content[2:])
+                    message = bytearray((len(answer) + 2, command, error)) + answer
+                    self._pending = bytes(bytearray((STX,)) + message \
+                                    + bytearray((self.control_summ(message),)))
+                    output.append((self.command_delay, self._pending))
+                    if command == 0x14 and not error:
+                        # Новая скорость действует после ответа
+                        self.baudrate = self._new_baudrate
+                else:
+                    del buf[0]
+                    if byte == ENQ:
+                        if self._pending is None:
+                            # ККТ ждёт команду
+                            output.append((0, bytes(bytearray((NAK,)))))
+                        else:
+                            # Ответ не подтверждён хостом: ККТ
+                            # сообщает о готовом ответе и повторяет его
+                            output.append((0, bytes(bytearray((ACK,)))))
+                            output.append((0, self._pending))
+                    elif byte == ACK:
+                        self._pending = None
+        return output
+
+    def control_summ(self, data):
+        return lrc(data)
+
+    def execute(self, command, params):
+        """ Выполняет команду, возвращает (код ошибки, данные) """
+        handler = self.handlers.get(command)
+        if handler is None:
+            # Команда не поддерживается в данной реализации ККТ
+            return 0x37, bytearray()
+        if len(params) < 4 and command != 0xFC:
+            return 0x33, bytearray() # Некорректные параметры в команде
+        return handler(command, params)
+
+    # Проверки
+
+    def operator(self, params):
+        """ Номер оператора по паролю или None """
+        password = _unpack(params[:4])
+        if 1 <= password <= 30:
+            return password
+        return None
+
+    def check(self, params, admin=False, modes=None):
+        """ Возвращает код ошибки или 0 """
+        operator = self.operator(params)
+        if operator is None or (admin and operator < 29):
+            return 0x4F # Неверный пароль
+        if modes is not None and self.mode not in modes:
+            if self.mode == MODE_OPEN_DOCUMENT:
+                return 0x4A # Открыт чек – операция невозможна
+            return 0x73 # Команда не поддерживается в данном режиме
+        return 0
+
+    def reply(self, params, data=None):
+        result = bytearray((self.operator(params),))
+        if data:
+            result += data
+        return 0, result
+
+    # Команды
+
+    def operator_only(self, command, params):
+        error = self.check(params)
+        if error:
+            return error, bytearray()
+        return self.reply(params)
+
+    def admin_only(self, command, params):
+        error = self.check(params, admin=True)
+        if error:
+            return error, bytearray()
+        return 0, bytearray()
+
+    def print_line(self, command, params):
+        return self.operator_only(command, params)
+
+    def x10(self, command, params):
+        error = self.check(params)
+        if error:
+            return error, bytearray()
+        data = bytearray((self.operator(params),)) + _pack(0x0003, 2) \
+             + bytearray((self.mode, self.submode, self.operations & 0xFF,
+                          0x9A, 0x8C, 0, 0, self.operations >> 8, 0, 0, 0))
+        return 0, data
+
+    def x11(self, command, params):
+        error = self.check(params)
+        if error:
+            return error, bytearray()
+        now = datetime.datetime.now()
+        data = bytearray((self.operator(params),)) \
+             + bytearray(b'A2') + _pack(2000, 2) \
+             + _date(datetime.date(2012, 5, 28)) \
+             + bytearray((1,)) + _pack(self.document, 2) \
+             + _pack(0x0003, 2) + bytearray((self.mode, self.submode, 0)) \
+             + bytearray(b'A2') + _pack(100, 2) \
+             + _date(datetime.date(2012, 5, 28)) \
+             + _date(now) + _time(now) \
+             + bytearray((0x65 if self.session_open else 0x25,)) \
+             + _pack(self.serial_number, 4) + _pack(self.session, 2) \
+             + _pack(2100 - self.session, 2) + bytearray((1, 15)) \
+             + _pack(self.inn, 6)
+        return 0, data
+
+    @property
+    def session_open(self):
+        return self.mode in (MODE_OPEN_SESSION, MODE_OPEN_DOCUMENT)
+
+    def x14(self, command, params):
+        error = self.check(params, admin=True)
+        if error:
+            return error, bytearray()
+        if len(params) < 7 or params[5] >= len(BAUDRATES):
+            return 0x33, bytearray()
+        self._new_baudrate = BAUDRATES[params[5]]
+        self.byte_timeout = params[6]
+        return 0, bytearray()
+
+    def x15(self, command, params):
+        error = self.check(params, admin=True)
+        if error:
+            return error, bytearray()
+        code = BAUDRATES.index(self.baudrate)
+        return 0, bytearray((code, self.byte_timeout))
+
+    def x18(self, command, params):
+        error = self.check(params)
+        if error:
+            return error, bytearray()
+        if len(params) < 36:
+            return 0x33, bytearray()
+        self.document += 1
+        return self.reply(params, _pack(self.document, 2))
+
+    def x1A(self, command, params):
+        error = self.check(params)
+        if error:
+            return error, bytearray()
+        number = params[4] if len(params) > 4 else 0
+        return self.reply(params, _pack(self.registers.get(number, 0), 6))
+
+    def x1B(self, command, params):
+        error = self.check(params)
+        if error:
+            return error, bytearray()
+        number = params[4] if len(params) > 4 else 0
+        return self.reply(params, _pack(self.registers.get(0x100 + number, 0), 2))
+
+    def x40(self, command, params):
+        error = self.check(params, admin=True,
+                           modes=(MODE_OPEN_SESSION, MODE_CLOSED_SESSION))
+        if error:
+            return error, bytearray()
+        return self.reply(params)
+
+    def x41(self, command, params):
+        error = self.check(params, admin=True, modes=(MODE_OPEN_SESSION,))
+        if error:
+            if self.mode == MODE_CLOSED_SESSION:
+                return 0x16, bytearray() # Смена не открыта
+            return error, bytearray()
+        self.mode = MODE_CLOSED_SESSION
+        self.document += 1
+        return self.reply(params)
+
+    def x50(self, command, params):
+        error = self.check(params, modes=(MODE_OPEN_SESSION, MODE_CLOSED_SESSION))
+        if error:
+            return error, bytearray()
+        summa = _unpack(params[4:9])
+        if command == 0x51:
+            if summa > self.cash:
+                return 0x46, bytearray() # Не хватает наличности в кассе
+            summa = -summa
+        self.open_session()
+        self.cash += summa
+        self.document += 1
+        return self.reply(params, _pack(self.document, 2))
+
+    x51 = x50
+
+    def x62(self, command, params):
+        error = self.check(params, admin=True)
+        if error:
+            return error, bytearray()
+        missing = _pack(-1, 6) # ФП 2 отсутствует
+        return self.reply(params, _pack(self.sales, 8) + missing * 3)
+
+    def open_session(self):
+        if self.mode == MODE_CLOSED_SESSION:
+            self.mode = MODE_OPEN_SESSION
+            self.session += 1
+
+    def open_document(self, document_type):
+        self.open_session()
+        self.mode = MODE_OPEN_DOCUMENT
+        self.document_type = document_type
+        self.receipt_total = 0
+        self.operations = 0
+
+    def x8D(self, command, params):
+        error = self.check(params, modes=(MODE_OPEN_SESSION, MODE_CLOSED_SESSION))
+        if error:
+            return error, bytearray()
+        if len(params) < 5 or params[4] > 3:
+            return 0x33, bytearray()
+        self.open_document(params[4])
+        return self.reply(params)
+
+    def x8count(self, command, params):
+        error = self.check(params)
+        if error:
+            return error, bytearray()
+        if len(params) < 59:
+            return 0x33, bytearray()
+        opened = self.mode == MODE_OPEN_DOCUMENT
+        if command == 0x84:
+            # Сторно возможно только в открытом чеке
+            if not opened:
+                return 0x55, bytearray() # Чек закрыт – операция невозможна
+        elif opened:
+            if command - 0x80 != self.document_type:
+                return 0x49, bytearray() # Операция невозможна в открытом чеке данного типа
+        elif not (self.session_open or self.mode == MODE_CLOSED_SESSION):
+            return 0x73, bytearray()
+        # Все ошибки проверяются до изменения состояния ККТ
+        count = _unpack(params[4:9])
+        price = _unpack(params[9:14])
+        if params[14] > 16:
+            return 0x63, bytearray() # Переполнение диапазона отдела
+        if opened and self.operations >= 0xFFFF:
+            return 0x94, bytearray() # Исчерпан лимит операций в чеке
+        summa = (count * price + 500) // 1000
+        if command == 0x84:
+            if summa > self.receipt_total:
+                return 0x2D, bytearray() # Сумма чека по секции меньше суммы сторно
+            summa = -summa
+        if not opened:
+            self.open_document(command - 0x80)
+        self.receipt_total += summa
+        self.operations += 1
+        return self.reply(params)
+
+    def x8summa(self, command, params):
+        error = self.check(params)
+        if error:
+            return error, bytearray()
+        if self.mode != MODE_OPEN_DOCUMENT:
+            return 0x55, bytearray()
+        summa = _unpack(params[4:9])
+        if command in (0x86, 0x8B):
+            if summa > self.receipt_total:
+                return 0x5A, bytearray() # Скидка превышает накопления в чеке
+            summa = -summa
+        self.receipt_total += summa
+        return self.reply(params)
+
+    def x85(self, command, params):
+        error = self.check(params)
+        if error:
+            return error, bytearray()
+        if self.mode != MODE_OPEN_DOCUMENT:
+            return 0x55, bytearray()
+        payments = [ _unpack(params[i:i + 5]) for i in range(4, 24, 5) ]
+        paid = sum(payments)
+        if paid < self.receipt_total:
+            return 0x45, bytearray() # Cумма всех типов оплаты меньше итога чека
+        odd = paid - self.receipt_total
+        if odd > payments[0]:
+            return 0x4D, bytearray() # Вносимая безналичной оплатой сумма больше суммы чека
+        if self.document_type in (0, 3):
+            self.cash += self.receipt_total
+            if self.document_type == 0:
+                self.sales += self.receipt_total
+        else:
+            if self.receipt_total > self.cash:
+                return 0x46, bytearray()
+            self.cash -= self.receipt_total
+        self.mode = MODE_OPEN_SESSION
+        self.document += 1
+        return self.reply(params, _pack(odd, 5))
+
+    def x88(self, command, params):
+        error = self.check(params)
+        if error:
+            return error, bytearray()
+        if self.mode != MODE_OPEN_DOCUMENT:
+            return 0x55, bytearray()
+        self.mode = MODE_OPEN_SESSION
+        self.receipt_total = 0
+        return self.reply(params)
+
+    def x89(self, command, params):
+        error = self.check(params)
+        if error:
+            return error, bytearray()
+        if self.mode != MODE_OPEN_DOCUMENT:
+            return 0x55, bytearray()
+        return self.reply(params, _pack(self.receipt_total, 5))
+
+    def xAB(self, command, params):
+        error = self.check(params, admin=True)
+        if error:
+            return error, bytearray()
+        return 0, _pack(self.serial_number, 5)
+
+    def xB1(self, command, params):
+        error = self.check(params, admin=True)
+        if error:
+            return error, bytearray()
+        return 0, bytearray('ЭКЛЗ 0.1'.encode(CODE_PAGE).ljust(18, b'\x00'))
+
+    def xBA(self, command, params):
+        error = self.check(params, admin=True)
+        if error:
+            return error, bytearray()
+        if len(params) < 6:
+            return 0x33, bytearray()
+        # Тип ККМ - строка в 16 байт
+        kkm = self.device_name.encode(CODE_PAGE)[:16]
+        return 0, bytearray(kkm.ljust(16, b'\x00'))
+
+    def xCA(self, command, params):
+        # Ответ без номера оператора
+        error = self.check(params)
+        return error, bytearray()
+
+    def xE0(self, command, params):
+        error = self.check(params, modes=(MODE_OPEN_SESSION, MODE_CLOSED_SESSION))
+        if error:
+            return error, bytearray()
+        if self.session_open:
+            return 0x15, bytearray() # Смена уже открыта
+        self.open_session()
+        return self.reply(params)
+
+    def xE7(self, command, params):
+        error = self.check(params, admin=True)
+        if error:
+            return error, bytearray()
+        return self.reply(params)
+
+    def xFC(self, command, params):
+        return 0, bytearray((0, 0, 1, 0, 0, 0)) \
+                + bytearray(self.device_name.encode(CODE_PAGE))
+
+
+class PtyEmulator(Emulator):
+    """ Эмулятор на псевдотерминале (только POSIX).
+
+        Драйвер подключается к пути self.port как к обычному
+        последовательному порту. Время передачи байта рассчитывается
+        из скорости baudrate (10 бит на байт: старт, 8 бит, стоп).
+    """
+
+    def __init__(self, **kwargs):
+        super(PtyEmulator, self).__init__(**kwargs)
+        self.port = None
+        self._master = None
+        self._slave = None
+        self._thread = None
+        self._running = False
+
+    @property
+    def byte_time(self):
+        """ Время передачи одного байта, сек. """
+        return 10.0 / self.baudrate
+
+    def start(self):
+        """ Открывает псевдотерминал и запускает обработку в потоке """
+        import tty
+        self._master, self._slave = os.openpty()
+        tty.setraw(self._slave)
+        self.port = os.ttyname(self._slave)
+        self._running = True
+        self._thread = threading.Thread(target=self.serve)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """ Останавливает эмулятор и закрывает псевдотерминал """
+        self._running = False
+        for fd in (self._slave, self._master):
+            if fd is not None:
+                try:
+                    os.close(fd)
+                except OSError:
+                    pass
+        self._master = self._slave = None
+        if self._thread is not None:
+            self._thread.join(1)
+
+    def host_baudrate(self):
+        """ Скорость, установленная драйвером на его стороне порта """
+        import termios
+        try:
+            speed = termios.tcgetattr(self._slave)[4]
+        except (TypeError, termios.error):
+            # Эмулятор уже остановлен
+            return None
+        for bod in BAUDRATES:
+            if getattr(termios, 'B%d' % bod, None) == speed:
+                return bod
+        return None
+
+    def serve(self):
+        # Дескриптор запоминается: stop() может обнулить его, пока
+        # поток ещё обрабатывает данные
+        master = self._master
+        while self._running:
+            try:
+                data = os.read(master, 512)
+            except OSError:
+                break
+            if not data:
+                break
+            if self.host_baudrate() != self.baudrate:
+                # На чужой скорости ККТ не распознаёт байты
+                continue
+            # Приём и передача байтов занимают время передачи по
+            # линии. Ответ на смену скорости идёт ещё на старой.
+            byte_time = self.byte_time
+            time.sleep(len(data) * byte_time)
+            for delay, chunk in self.process(data):
+                if delay:
+                    time.sleep(delay)
+                time.sleep(len(chunk) * byte_time)
+                try:
+                    os.write(master, chunk)
+                except OSError:
+                    return
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description='Эмулятор ККТ Штрих-М')
+    parser.add_argument('--baudrate', type=int, default=DEFAULT_BOD,
+                        choices=BAUDRATES)
+    parser.add_argument('--delay', type=float, default=0.0,
+                        help='задержка выполнения команды, сек.')
+    args = parser.parse_args()
+    emulator = PtyEmulator(baudrate=args.baudrate,
+                           command_delay=args.delay).start()
+    print(emulator.port)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        emulator.stop()
+
+
+if __name__ == '__main__':
+    main()
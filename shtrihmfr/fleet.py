@@ -0,0 +1,260 @@
+# -*- coding: utf-8 -*-
+#
+#  Copyright 2013 Grigoriy Kramarenko <root@rosix.ru>
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+#  MA 02110-1301, USA.
+#
+#
+
+### Группа устройств ###
+#
+# Fleet управляет множеством ККТ, подключённых к одному серверу. У
+# каждого устройства свой обработчик (worker.DeviceWorker) со своим
+# потоком и соединением, поэтому сбой или медленный ответ одной ККТ не
+# задерживает остальные. Команда для всей группы ставится в очереди
+# всех обработчиков сразу, и общее время равно времени самого
+# медленного устройства, а не сумме.
+#
+#     with Fleet(discover_ports()) as fleet:
+#         fleet.identify()
+#         states = fleet.x10()
+#         for port, state in states.items():
+#             print(port, state.kkt_mode)
+#         for port, error in states.errors.items():
+#             print(port, error)
+#
+# Обмен с ККТ - ожидание порта, а не вычисления, поэтому потоков
+# достаточно: отдельные процессы ускорения не дают.
+
+from __future__ import unicode_literals
+import glob
+import os
+import time
+
+from .conf import FLEET_PORTS
+from .kkt import KKT, KktError
+from .responses import response_type
+from .worker import DeviceWorker
+
+try:
+    from serial.tools.list_ports import comports
+except ImportError:
+    comports = None
+
+
+__all__ = ('discover_ports', 'Device', 'FleetResult', 'Fleet')
+
+
+def discover_ports(patterns=None):
+    """ Возвращает отсортированный список портов, к которым могут быть
+        подключены ККТ: пути по шаблонам patterns (по умолчанию
+        FLEET_PORTS), в Windows - порты COM из pyserial.
+    """
+    if patterns is None:
+        patterns = FLEET_PORTS
+    ports = set()
+    for pattern in patterns:
+        ports.update(glob.glob(pattern))
+    if os.name == 'nt' and comports is not None:
+        ports.update([ port[0] for port in comports() ])
+    return sorted(ports)
+
+
+Device = response_type('Device', ('port', 'serial_number', 'device_name'),
+    doc=' Опознанное устройство группы ')
+
+
+class FleetResult(object):
+    """ Результат команды на группе устройств.
+
+        results - {порт: результат} успешно выполненных команд,
+        errors - {порт: исключение} для завершившихся ошибкой,
+        elapsed - общее время выполнения (сек.).
+    """
+
+    def __init__(self, results, errors, elapsed):
+        self.results = results
+        self.errors  = errors
+        self.elapsed = elapsed
+
+    def __repr__(self):
+        return '<%s %d ok, %d errors, %.3f s>' % (self.__class__.__name__,
+            len(self.results), len(self.errors), self.elapsed)
+
+    @property
+    def ok(self):
+        """ Признак выполнения команды на всех устройствах """
+        return not self.errors
+
+    def __len__(self):
+        return len(self.results)
+
+    def __iter__(self):
+        return iter(self.results)
+
+    def __contains__(self, port):
+        return port in self.results
+
+    def __getitem__(self, port):
+        """ Результат устройства; его ошибка выбрасывается """
+        if port in self.errors:
+            raise self.errors[port]
+        return self.results[port]
+
+    def get(self, port, default=None):
+        return self.results.get(port, default)
+
+    def items(self):
+        return list(self.results.items())
+
+
+class Fleet(object):
+    """ Группа ККТ на портах ports.
+
+        Параметры options (пароли, скорость и т.д.) передаются в
+        конструктор kkt_class для каждого порта. Обработчики
+        запускаются start() или при входе в контекст.
+
+        Методы KKT доступны у группы под теми же именами и выполняются
+        на всех устройствах: fleet.x10() возвращает FleetResult.
+    """
+    kkt_class    = KKT
+    worker_class = DeviceWorker
+
+    def __init__(self, ports, kkt_class=None, worker_options=None, **options):
+        if kkt_class is not None:
+            self.kkt_class = kkt_class
+        worker_options = worker_options or {}
+        self.workers = {}
+        for port in ports:
+            kkt = self.kkt_class(port=port, **options)
+            self.workers[port] = self.worker_class(kkt, **worker_options)
+        # Опознанные устройства: {порт: Device}
+        self.devices = {}
+
+    def __repr__(self):
+        return '<%s %d>' % (self.__class__.__name__, len(self.workers))
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def __len__(self):
+        return len(self.workers)
+
+    def __iter__(self):
+        return iter(sorted(self.workers))
+
+    def __getattr__(self, name):
+        # Команды KKT: fleet.x10(...) -> run('x10', ...)
+        if name.startswith('_') or \
+                not callable(getattr(self.kkt_class, name, None)):
+            raise AttributeError(name)
+        def method(*args, **kwargs):
+            return self.run(name, *args, **kwargs)
+        method.__name__ = str(name)
+        return method
+
+    def start(self):
+        """ Запускает обработчики всех устройств """
+        for worker in self.workers.values():
+            worker.start()
+        return self
+
+    def stop(self):
+        """ Останавливает обработчики всех устройств """
+        for worker in self.workers.values():
+            worker.stop(wait=False)
+        for worker in self.workers.values():
+            worker.stop()
+
+    def worker(self, port):
+        """ Обработчик устройства по порту """
+        return self.workers[port]
+
+    def find(self, serial_number):
+        """ Возвращает порт устройства с заводским номером или None """
+        for port, device in self.devices.items():
+            if device.serial_number == serial_number:
+                return port
+        return None
+
+    def submit(self, method, *args, **kwargs):
+        """ Ставит команду в очереди всех устройств, возвращает
+            {порт: Future}.
+        """
+        return self.submit_to(self.workers, method, *args, **kwargs)
+
+    def submit_to(self, ports, method, *args, **kwargs):
+        """ Ставит команду в очереди устройств ports """
+        futures = {}
+        for port in ports:
+            worker = self.workers[port]
+            try:
+                futures[port] = worker.submit(method, *args, **kwargs)
+            except KktError as e:
+                futures[port] = e
+        return futures
+
+    def gather(self, futures, timeout=None):
+        """ Дожидается результатов {порт: Future} не дольше timeout
+            секунд в сумме и собирает их в FleetResult.
+        """
+        started = time.time()
+        deadline = None if timeout is None else started + timeout
+        results, errors = {}, {}
+        for port, future in futures.items():
+            if isinstance(future, Exception):
+                errors[port] = future
+                continue
+            remaining = None
+            if deadline is not None:
+                remaining = max(deadline - time.time(), 0)
+            try:
+                results[port] = future.result(remaining)
+            except Exception as e:
+                errors[port] = e
+        return FleetResult(results, errors, time.time() - started)
+
+    def run(self, method, *args, **kwargs):
+        """ Выполняет команду на всех устройствах параллельно и
+            возвращает FleetResult.
+        """
+        started = time.time()
+        result = self.gather(self.submit(method, *args, **kwargs))
+        result.elapsed = time.time() - started
+        return result
+
+    def identify(self, remove=True):
+        """ Опознаёт устройства по типу (FCH) и заводскому номеру
+            (11H). Порты, на которых ККТ не ответила, при remove
+            исключаются из группы. Возвращает FleetResult с Device.
+        """
+        def identify(kkt):
+            device_type = kkt.xFC()
+            state = kkt.x11()
+            return Device(kkt.port, state.serial_number,
+                          device_type.device_name)
+
+        result = self.run(identify)
+        self.devices.update(result.results)
+        if remove:
+            for port in result.errors:
+                self.workers.pop(port).stop()
+                self.devices.pop(port, None)
+        return result
@@ -21,26 +21,44 @@
 from __future__ import unicode_literals
 
 import serial
+import struct
 import time
 import datetime
+from operator import attrgetter
 
 from .conf import *
+from .decoders import decode_x10, decode_x11, decode_x62
 from .protocol import *
+from .responses import ExchangeParams, Document, Change, DeviceType
+from .retry import RetryPolicy
+from .registers import (MONEY_REGISTER_SIZE, OPERATION_REGISTER_SIZE,
+                        money_registers, operation_registers)
+from .schema import COMMANDS
+from .transport import get_transport
 from .utils import *
 
 # ASCII
-ENQ = chr(0x05) # Enquire. Прошу подтверждения.
-STX = chr(0x02) # Start of Text, начало текста. 
-ACK = chr(0x06) # Acknowledgement. Подтверждаю.
-NAK = chr(0x15) # Negative Acknowledgment, не подтверждаю.
+ENQ = b'\x05' # Enquire. Прошу подтверждения.
+STX = b'\x02' # Start of Text, начало текста. 
+ACK = b'\x06' # Acknowledgement. Подтверждаю.
+NAK = b'\x15' # Negative Acknowledgment, не подтверждаю.
 
 
 class KktError(Exception):
+    """ Ошибка ККТ. Для кода ошибки value, кроме источника и текста
+        (BUGS), заполняются категория и рекомендуемое действие
+        (BUG_ACTIONS).
+    """
+    value    = None
+    category = None
+    action   = None
 
     def __init__(self, value):
         if isinstance(value, int):
             self.value = value
             self.source, self.message = BUGS[value]
+            self.category, self.action = BUG_ACTIONS.get(value,
+                                                         DEFAULT_BUG_ACTION)
             msg = '%s: %s' % (self.source, self.message)
         else:
             msg = value
@@ -53,11 +71,57 @@ class KktError(Exception):
 
         super(KktError, self).__init__(msg)
 
+    @property
+    def retryable(self):
+        """ Признак ошибки, после которой команду можно повторить """
+        return self.action in RECOVERABLE_ACTIONS
+
 
 class ConnectionError(KktError):
     pass
 
 
+class FrameTemplate(object):
+    """ Заранее собранное сообщение частой команды.
+
+        Постоянная часть (STX, длина, код команды, пароль и
+        неизменяемые параметры, например флаги) и её LRC вычисляются
+        один раз. При вызове команды в буфер на место переменной части
+        длиной size байт записываются параметры и пересчитывается
+        только LRC этой части.
+    """
+    __slots__ = ('password', 'frame', 'offset', 'summ')
+
+    def __init__(self, command, password, fixed=b'', size=0):
+        self.password = password
+        frame = bytearray(STX)
+        frame.append(len(password) + len(fixed) + size + 1)
+        frame.append(command)
+        frame += password
+        frame += fixed
+        self.offset = len(frame)
+        # LRC считается без байта STX
+        self.summ = lrc(memoryview(frame)[1:])
+        frame.extend(bytearray(size + 1))
+        frame[-1] = self.summ
+        self.frame = frame
+
+    def fill(self, *parts):
+        """ Записывает части параметров в переменную часть сообщения и
+            возвращает готовое сообщение. Общая длина частей должна быть
+            равна size.
+        """
+        data = b''.join(parts)
+        frame = self.frame
+        if len(data) != len(frame) - self.offset - 1:
+            raise KktError('Длина параметров не совпадает с шаблоном '
+                           'сообщения')
+        # Срез той же длины заменяется на месте, без перевыделения
+        frame[self.offset:-1] = data
+        frame[-1] = lrc(data, self.summ)
+        return frame
+
+
 class BaseKKT(object):
     """
     Базовый класс включает методы непосредственного общения с
@@ -129,6 +193,24 @@ class BaseKKT(object):
     stopbits       = serial.STOPBITS_ONE
     timeout        = 0.7
     writeTimeout   = 0.7
+    idle_timeout   = SESSION_IDLE_TIMEOUT
+    transport      = None
+    durations      = None
+    money_type     = float
+    retry_policy   = RetryPolicy()
+    # Автоматическое восстановление после временных ошибок ККТ (см.
+    # BUG_ACTIONS), по умолчанию выключено
+    auto_recover   = False
+    recoveries     = 0
+
+    # Обработчик (worker.DeviceWorker), владеющий экземпляром
+    worker         = None
+
+    _conn          = None
+    _frame         = None
+    _templates     = None
+    _session       = 0
+    _last_activity = None
 
     def __init__(self, **kwargs):
         """ Пароли можно передавать в виде набора шестнадцатеричных
@@ -142,90 +224,165 @@ class BaseKKT(object):
 
         [ setattr(self, k, v) for k,v in kwargs.items() ]
 
+    def __enter__(self):
+        self.open_session()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close_session()
+
     @property
     def is_connected(self):
         """ Возвращает состояние соединение """
         return bool(self._conn)
 
+    @property
+    def in_session(self):
+        """ Возвращает признак открытой сессии """
+        return self._session > 0
+
     @property
     def conn(self):
         """ Возвращает соединение """
-        if hasattr(self, '_conn') and self._conn is not None:
-            return self._conn
-
-        self.connect()
+        if self._conn is None:
+            self.connect()
 
         return self._conn
 
+    def open_session(self):
+        """ Открывает долговременную сессию: порт остаётся открытым
+            между командами и закрывается только при выходе из
+            последней вложенной сессии или при ошибке обмена.
+
+            Используется как контекстный менеджер:
+
+                with kkt:
+                    kkt.x10()
+                    kkt.x11()
+        """
+        self._session += 1
+        return self
+
+    def close_session(self):
+        """ Закрывает сессию и, если она была внешней, порт """
+        if self._session > 0:
+            self._session -= 1
+        if not self._session:
+            self.disconnect()
+        return True
+
+    def get_duration(self, command):
+        """ Возвращает ожидаемое и максимальное время выполнения
+            команды (сек.). Значения из атрибута durations (словарь
+            {код: (ожидаемое, максимальное)}) имеют приоритет над
+            таблицей KKT_DURATIONS.
+        """
+        if self.durations and command in self.durations:
+            return self.durations[command]
+        return KKT_DURATIONS.get(command, DEFAULT_DURATION)
+
+    def is_idle_expired(self):
+        """ Проверяет, не превысил ли простой порта idle_timeout """
+        if not self.idle_timeout or self._last_activity is None:
+            return False
+        return time.time() - self._last_activity > self.idle_timeout
+
     def connect(self):
-        """ Устанавливает соединение """
-        try:
-            self._conn = serial.Serial(
-                self.port, self.bod,
+        """ Устанавливает соединение.
+
+            Транспорт определяется адресом port (см. transport.py) либо
+            задаётся явно атрибутом transport: классом или уже
+            созданным экземпляром транспорта.
+        """
+        conn = self.transport
+        if conn is None or isinstance(conn, type):
+            conn = get_transport(
+                self.port, transport=conn,
+                baudrate=self.bod,
                 parity=self.parity,
                 stopbits=self.stopbits,
                 timeout=self.timeout,
-                writeTimeout=self.writeTimeout
+                write_timeout=self.writeTimeout
             )
-        except serial.SerialException:
+        try:
+            conn.open()
+        except (IOError, OSError):
             raise ConnectionError('Невозможно соединиться с ККМ (порт=%s)' % self.port)
 
+        self._conn = conn
+        self._last_activity = time.time()
         return self.check_port()
 
     def disconnect(self):
         """ Закрывает соединение """
-        if self.conn:
-            self._conn.close()
-            self._conn = None
+        if self._conn is not None:
+            try:
+                self._conn.close()
+            finally:
+                self._conn = None
+                self._last_activity = None
         return True
 
     def check_port(self):
         """ Проверка на готовность порта """
-        if not self.conn.isOpen():
-            raise ConnectionError('Последовательный порт закрыт')
+        if not self.conn.is_open:
+            raise ConnectionError('Порт закрыт')
         return True
 
-    def check_state(self):
-        """ Проверка на ожидание команды """
+    def check_state(self, retry=None):
+        """ Проверка на ожидание команды
+
+            Если ККТ не ответила, ответ дочитывается после паузы из
+            retry (см. retry.Retry) или политики retry_policy.
+        """
         self.check_port()
         self._write(ENQ)
         answer = self._read(1)
         if not answer:
-            time.sleep(MIN_TIMEOUT)
-            answer = self._read(1)
+            if retry is None:
+                retry = self.retry_policy.start()
+            if retry.remaining() > 0:
+                time.sleep(retry.backoff())
+                answer = self._read(1)
         if answer in (NAK, ACK):
             return answer
         elif not answer:
             raise ConnectionError('Нет связи с устройством')
 
-    def check_STX(self):
-        """ Проверка на данные """
-        answer = self._read(1)
-        # Для гарантированного получения ответа стоит обождать
-        # некоторое время, от минимального (0.05 секунд) 
-        # до 12.8746337890625 секунд по умолчанию для 12 попыток
-        n = 0
-        timeout = MIN_TIMEOUT
-        while not answer and n < MAX_ATTEMPT:
-            time.sleep(timeout)
+    def check_STX(self, timeout=None, retry=None):
+        """ Проверка на данные
+
+            Ожидает начало ответа не дольше timeout секунд (по умолчанию
+            - до крайнего срока retry, но не меньше тайм-аута порта) с
+            одним общим крайним сроком. Ожидание прерывается сразу, как
+            только в порт поступили данные.
+        """
+        if timeout is None:
+            if retry is None:
+                retry = self.retry_policy.start()
+            timeout = max(retry.remaining(), self.timeout)
+        deadline = time.time() + timeout
+        answer = None
+        while not answer:
+            remaining = deadline - time.time()
+            if remaining <= 0 or not self._wait(remaining):
+                break
             answer = self._read(1)
-            n += 1
-            timeout *= 1.5
         if answer == STX:
             return True
         else:
             raise ConnectionError('Нет связи с устройством')
 
-    def check_NAK(self):
+    def check_NAK(self, retry=None):
         """ Проверка на ожидание команды """
-        answer = self.check_state()
+        answer = self.check_state(retry)
         if answer == NAK:
             return True
         return False
 
-    def check_ACK(self):
+    def check_ACK(self, retry=None):
         """ Проверка на подготовку ответа """
-        answer = self.check_state()
+        answer = self.check_state(retry)
         if answer == ACK:
             return True
         return False
@@ -234,6 +391,16 @@ class BaseKKT(object):
         """ Высокоуровневый метод считывания соединения """
         return self.conn.read(read)
 
+    def _wait(self, timeout):
+        """ Ожидает поступления данных в соединение не дольше timeout
+            секунд. Возвращает True, если данные можно считывать.
+        """
+        return self.conn.wait(timeout)
+
+    def _readinto(self, buffer):
+        """ Высокоуровневый метод считывания соединения в буфер """
+        return self.conn.readinto(buffer)
+
     def _write(self, write):
         """ Высокоуровневый метод записи в соединение """
         return self.conn.write(write)
@@ -242,97 +409,237 @@ class BaseKKT(object):
         """ Высокоуровневый метод слива в ККТ """
         return self.conn.flush()
 
-    def clear(self):
-        """ Сбрасывает ответ, если он болтается в ККМ """
-        def one_round():
+    def clear(self, retry=None):
+        """ Сбрасывает ответ, если он болтается в ККМ. Повторы и паузы
+            между ними определяются retry или политикой retry_policy.
+        """
+        if retry is None:
+            retry = self.retry_policy.start()
+        while True:
             self._write(ENQ)
             answer = self._read(1)
             if answer == NAK or not answer:
                 return True
-            time.sleep(MIN_TIMEOUT*10)
-            return False
-
-        n = 0
-        while n < MAX_ATTEMPT and not one_round():
-            n += 1
-        if n >= MAX_ATTEMPT:
-            return False
-        return True
-
-    def read(self):
-        """ Считывает весь ответ ККМ """
-        answer = self.check_state()
+            if answer == ACK and self._wait(self.timeout) \
+                    and self._read(1) == STX:
+                # ККТ повторяет неподтверждённый ответ: принимаем его,
+                # чтобы ККТ перешла к ожиданию команды
+                length = self._read(1)
+                if length:
+                    self.read_frame(bytearray(length)[0])
+                    self._write(ACK)
+            if not retry.sleep():
+                return False
+
+    def wait_state(self, retry, interval):
+        """ Опрашивает ККТ (ENQ) с интервалом interval, пока она не
+            ответит или не наступит крайний срок retry (см.
+            retry.Retry). Долгие команды могут не отвечать на ENQ во
+            время выполнения, такое ожидание запас повторов не расходует.
+        """
+        while True:
+            try:
+                answer = self.check_state(retry)
+            except ConnectionError:
+                answer = None
+            remaining = retry.remaining()
+            if answer or remaining <= 0:
+                return answer
+            time.sleep(min(interval, remaining))
+
+    def read(self, timeout=None, expected=MIN_TIMEOUT, retry=None):
+        """ Считывает весь ответ ККМ.
+
+            Ответ ожидается до крайнего срока retry (по умолчанию -
+            retry_policy на timeout секунд). ККТ подтверждает приём
+            сообщения (ACK) и по готовности передаёт ответ; если
+            подтверждения нет, ККТ опрашивается (ENQ) с интервалом
+            expected. См. get_duration.
+
+            Ответ с неверной контрольной суммой отклоняется (NAK).
+            ККТ сама его не повторяет, поэтому ответ запрашивается
+            снова через ENQ, пока не кончится запас retry.
+        """
+        if retry is None:
+            retry = self.retry_policy.start(timeout)
+        answer = None
+        if self._wait(min(self.timeout, retry.remaining())):
+            answer = self._read(1)
+        if answer != ACK:
+            answer = self.wait_state(retry, expected)
         if answer == NAK :
-            i = 0
-            while i < MAX_ATTEMPT and not self.check_ACK():
-                i += 1
-            if i >= MAX_ATTEMPT:
-                self.disconnect()
-                raise ConnectionError('Нет связи с устройством')
+            while not self.check_ACK(retry):
+                if not retry.sleep():
+                    self.disconnect()
+                    raise ConnectionError('Нет связи с устройством')
         elif not answer:
             self.disconnect()
             raise ConnectionError('Нет связи с устройством')
-        j = 0
-        while j < MAX_ATTEMPT and not self.check_STX():
-            j += 1
-        if j >= MAX_ATTEMPT:
-            self.disconnect()
-            raise ConnectionError('Нет связи с устройством')
-        
-        length  = ord(self._read(1))
-        command = self._read(1)
-        error   = self._read(1)
-        data    = self._read(length-2)
-        if length-2 != len(data):
-            self._write(NAK)
-            self.disconnect()
-            msg = 'Длина ответа (%i) не равна длине полученных данных (%i)' % (length, len(data))
-            raise KktError(msg)
+        while True:
+            try:
+                self.check_STX(retry=retry)
+            except ConnectionError:
+                self.disconnect()
+                raise
 
-        control_read = self._read(1)
-        control_summ = get_control_summ(chr(length) + command \
-                                        + error + data)
-        if control_read != control_summ:
+            length = self._read(1)
+            if not length:
+                self.disconnect()
+                raise ConnectionError('Нет связи с устройством')
+            length = bytearray(length)[0]
+            frame, received, control_summ = self.read_frame(length)
+            # Кадр: код команды, код ошибки, данные (length-2 байт) и LRC
+            if received < length + 1:
+                self._write(NAK)
+                self.disconnect()
+                msg = 'Длина ответа (%i) не равна длине полученных данных (%i)' % (length, max(received-2, 0))
+                raise KktError(msg)
+
+            control_read = frame[length]
+            if control_read == control_summ:
+                break
+            # Ответ искажён: после NAK ККТ ждёт ENQ и, если ответ ещё
+            # у неё, подтверждает (ACK) и повторяет его
             self._write(NAK)
-            self.disconnect()
-            msg = "Контрольная сумма %i должна быть равна %i " % (ord(control_summ), ord(control_read))
-            raise KktError(msg)
+            self._flush()
+            if not retry.sleep() or self.wait_state(retry, expected) != ACK:
+                self.disconnect()
+                msg = "Контрольная сумма %i должна быть равна %i " % (control_summ, control_read)
+                raise KktError(msg)
 
         self._write(ACK)
         self._flush()
         #~ time.sleep(MIN_TIMEOUT*2)
+        command = bytes(frame[0:1])
+        error   = frame[1]
+        # Данные ответа - тот же буфер без кода команды, кода ошибки и
+        # LRC: удаление с краёв bytearray не копирует содержимое.
+        del frame[length:]
+        del frame[:2]
         return {
             'command': command,
-            'error':   ord(error),
-            'data':    data
+            'error':   error,
+            'data':    frame
         }
 
-    def send(self, command, params, quick=False):
-        """ Стандартная обработка команды """
+    def read_frame(self, length):
+        """ Считывает остаток сообщения после байта длины (код команды,
+            код ошибки, данные и LRC) в заранее выделенный буфер.
+
+            Сообщение запрашивается у порта целиком одним чтением,
+            дочитывание происходит только если порт отдал его частями.
+            Контрольная сумма считается по мере поступления байтов.
+
+            Возвращает (буфер, количество принятых байт, LRC принятых
+            байт сообщения без байта контрольной суммы).
+        """
+        size   = length + 1
+        frame  = bytearray(size)
+        view   = memoryview(frame)
+        summ   = length
+        offset = 0
+        while offset < size:
+            count = self._readinto(view[offset:])
+            if not count:
+                break
+            end = min(offset + count, length)
+            if end > offset:
+                summ = lrc(view[offset:end], summ)
+            offset += count
+        return frame, offset, summ
+
+    def preempt(self):
+        """ Даёт обработчику (worker.DeviceWorker) выполнить ждущие
+            более срочные команды. Вызывается перед сборкой сообщения:
+            выполненные команды могут заполнить те же шаблоны.
+        """
+        if self.worker is not None:
+            self.worker.preempt()
+
+    def template(self, command, fixed=b'', size=0, password=None):
+        """ Возвращает шаблон сообщения команды (см. FrameTemplate) с
+            паролем оператора (или password), неизменяемыми параметрами
+            fixed и переменной частью длиной size байт.
+
+            Шаблоны хранятся в экземпляре и собираются заново только
+            при смене пароля. Перед этим выполняются более срочные
+            команды обработчика (см. preempt), поэтому шаблон нужно
+            заполнить и отправить сразу. При повторном заполнении в
+            одной команде preempt вызывается перед каждым fill.
+        """
+        self.preempt()
+        if password is None:
+            password = self.password
+        templates = self._templates
+        if templates is None:
+            templates = self._templates = {}
+        key = (command, fixed, size)
+        template = templates.get(key)
+        if template is None or template.password != password:
+            template = templates[key] = FrameTemplate(command, password,
+                                                      fixed, size)
+        return template
+
+    def send(self, command, params, quick=False, frame=None):
+        """ Стандартная обработка команды
+
+            Сообщение собирается в буфер, который переиспользуется
+            между командами экземпляра. Готовое сообщение (например,
+            из шаблона, см. template) передаётся в frame.
+        """
 
         #~ self.clear()
 
         if not quick:
             self._flush()
-        data    = chr(command)
-        length  = 1
-        if not params is None:
-            data   += params
-            length += len(params)
-        content = chr(length) + data
-        control_summ = get_control_summ(content)
-
-        self._write(STX + content + control_summ)
+        if frame is None:
+            frame = self._frame
+            if frame is None:
+                frame = self._frame = bytearray()
+            del frame[:]
+            frame += STX
+            frame.append(0)
+            frame.append(command)
+            if not params is None:
+                frame += params
+            frame[1] = len(frame) - 2
+            # LRC считается без байта STX
+            frame.append(lrc(memoryview(frame)[1:]))
+
+        self._write(frame)
         self._flush()
 
         return True
 
     def ask(self, command, params=None, sleep=0, pre_clear=True,\
-                without_password=False, disconnect=True, quick=False):
+                without_password=False, disconnect=True, quick=False,\
+                frame=None, recover=None):
         """ Высокоуровневый метод получения ответа. Состоит из
             последовательной цепочки действий. 
             
             Возвращает позиционные параметры: (data, error, command)
+
+            data - bytearray: буфер чтения ответа без копирования, его
+            элементы - целые на Python 2 и 3. Чтобы хранить данные или
+            использовать их как ключ, преобразуйте их в bytes(data).
+
+            Если передано готовое сообщение frame (см. template),
+            params не используются.
+
+            Внутри сессии (см. open_session) порт после команды не
+            закрывается, даже если disconnect=True.
+
+            Время ожидания ответа определяется по get_duration: быстрые
+            команды быстро завершаются ошибкой связи, долгие ждут
+            ответа до своего максимального времени. Все ожидания и
+            повторы вызова ограничены одним крайним сроком и запасом
+            повторов политики retry_policy (см. retry.RetryPolicy).
+
+            При recover (по умолчанию auto_recover) ошибки, после
+            которых команду можно повторить (см. BUG_ACTIONS), не
+            выбрасываются: команда повторяется после паузы, а при
+            ожидании продолжения печати - после команды B0H. Повторы
+            расходуют тот же крайний срок и запас вызова.
         """
 
         #~ raise KktError('Тест ошибки')
@@ -346,21 +653,265 @@ class BaseKKT(object):
             params = self.password
         #~ if pre_clear:
             #~ self.clear()
-        self.send(command, params, quick=quick)
-        if sleep:
-            time.sleep(sleep)
-        a = self.read()
+        if frame is None:
+            # Готовое сообщение собрано после preempt (см. template)
+            self.preempt()
+        if recover is None:
+            recover = self.auto_recover
+        if self._conn is not None and self.is_idle_expired():
+            # Порт слишком долго простаивал, переоткрываем его. Только
+            # перед обменом: долгая команда не должна его прерывать.
+            self.disconnect()
+        expected, maximum = self.get_duration(command)
+        retry = self.retry_policy.start(maximum)
+        while True:
+            try:
+                self.send(command, params, quick=quick, frame=frame)
+                if sleep:
+                    time.sleep(sleep)
+                a = self.read(expected=expected, retry=retry)
+                error = a['error']
+                if not (error and recover and self._recover(error, retry)):
+                    break
+            except (IOError, OSError) as e:
+                # Сбой самого порта: закрываем его, чтобы следующая
+                # команда открыла соединение заново.
+                self.disconnect()
+                raise ConnectionError('Ошибка обмена с ККМ (порт=%s): %s' % (self.port, e))
+        self._last_activity = time.time()
         answer, error, command = (a['data'], a['error'], a['command'])
-        if disconnect:
+        if disconnect and not self.in_session:
             self.disconnect()
         if error:
             raise KktError(error)
 
         return answer, error, command
 
+    def _recover(self, error, retry):
+        """ Восстановление после ошибки error по BUG_ACTIONS. Возвращает
+            True, если команду нужно повторить.
+        """
+        action = BUG_ACTIONS.get(error, DEFAULT_BUG_ACTION)[1]
+        if action not in RECOVERABLE_ACTIONS or not retry.sleep():
+            return False
+        if action == ACTION_CONTINUE:
+            self.send(0xB0, self.admin_password)
+            a = self.read(expected=self.get_duration(0xB0)[0], retry=retry)
+            if a['error']:
+                raise KktError(a['error'])
+        self.recoveries += 1
+        return True
+
+
+def _change(result):
+    """ Сдача закрытия чека (77H, 85H) """
+    return Change(result.operator, result.odd)
+
 
 class KKT(BaseKKT):
     """ Класс с командами, исполняемыми согласно протокола """
+    auto_bod     = False
+    max_bod      = BAUDRATES[-1]
+    byte_timeout = FAST_BYTE_TIMEOUT
+    kkt_port     = 0
+    # Согласованная скорость обмена (см. negotiate_bod), None - ещё не
+    # согласована
+    negotiated_bod = None
+
+    def connect(self):
+        """ Устанавливает соединение и, если включено auto_bod,
+            согласует максимальную скорость обмена (см. negotiate_bod).
+
+            Скорость согласуется один раз: следующие соединения
+            открываются сразу на ней. После потери связи она
+            согласуется заново.
+        """
+        result = super(KKT, self).connect()
+        if self.auto_bod and self.negotiated_bod is None:
+            self.negotiated_bod = self.negotiate_bod()
+        return result
+
+    def ask(self, *args, **kwargs):
+        try:
+            return super(KKT, self).ask(*args, **kwargs)
+        except ConnectionError:
+            # ККТ могла перезагрузиться и вернуться к другой скорости
+            self.negotiated_bod = None
+            raise
+
+    def probe(self):
+        """ Проверяет, отвечает ли ККТ на текущей скорости порта """
+        self._conn.reset_input_buffer()
+        try:
+            return self.check_state() in (NAK, ACK)
+        except ConnectionError:
+            return False
+
+    def find_bod(self):
+        """ Подбирает скорость, на которой отвечает ККТ: сначала
+            текущую, затем остальные от большей к меньшей.
+            Возвращает скорость или None.
+        """
+        conn = self._conn
+        for bod in [self.bod] + sorted(BAUDRATES, reverse=True):
+            conn.set_baudrate(bod)
+            if self.probe():
+                return bod
+        return None
+
+    def negotiate_bod(self):
+        """ Переводит ККТ и порт на максимальную скорость обмена, не
+            превышающую max_bod, с тайм-аутом приёма байта
+            byte_timeout. Если ККТ не ответила на новой скорости,
+            подбирается та, на которой она отвечает.
+
+            Работает только для транспорта с изменяемой скоростью
+            (последовательный порт). Возвращает установленную скорость.
+        """
+        conn = self._conn
+        if not hasattr(conn, 'set_baudrate'):
+            return self.bod
+
+        # Порт не должен закрываться после каждой команды
+        self._session += 1
+        try:
+            current = self.find_bod()
+            if current is None:
+                raise ConnectionError('Не удалось определить скорость обмена с ККМ')
+            self.bod = current
+
+            target = max([ b for b in BAUDRATES if b <= self.max_bod ])
+            if target == current:
+                return current
+
+            try:
+                # Ответ на команду ККТ выдаёт ещё на старой скорости
+                self.x14(target, self.byte_timeout, port=self.kkt_port)
+            except KktError:
+                return current
+
+            conn.set_baudrate(target)
+            if self.probe():
+                self.bod = target
+            else:
+                bod = self.find_bod()
+                if bod is None:
+                    raise ConnectionError('Нет связи с ККМ после смены скорости обмена')
+                self.bod = bod
+            return self.bod
+        finally:
+            self._session -= 1
+
+    @staticmethod
+    def _date(year, month, day):
+        """ Дата для команд 22H и 23H, год - полный или двузначный """
+        try:
+            return datetime.date(2000 + year % 100, month, day)
+        except (ValueError, TypeError) as e:
+            raise KktError('Неверная дата: %s' % e)
+
+    def money2integer(self, money, digits=2):
+        """ Переводит денежную величину (количество, процент) в целое
+            для ККТ согласно money_type: float и Decimal задаются в
+            рублях, int - сразу в копейках (тысячных долях количества,
+            сотых долях процента) и передаются без преобразований.
+        """
+        return MONEY_TYPES[self.money_type][0](money, digits)
+
+    def integer2money(self, integer, digits=2):
+        """ Переводит целое от ККТ в денежную величину типа money_type:
+            float (по умолчанию), Decimal или int (копейки как есть).
+        """
+        return MONEY_TYPES[self.money_type][1](integer, digits)
+
+    def execute(self, command, **kwargs):
+        """ Выполняет команду по её описанию в schema.SCHEMA.
+
+            Параметры команды передаются именованными аргументами,
+            пароль подставляется согласно схеме. Возвращает код ошибки,
+            если ответ не содержит данных, порядковый номер оператора,
+            если ответ содержит только его, иначе объект ответа
+            (schema.Layout.result_type, см. responses).
+        """
+        return self._execute(command, kwargs)
+
+    def pack_params(self, command, values, integers=False):
+        """ Упаковывает словарь параметров команды по схеме (без
+            пароля). При integers денежные величины и количества уже
+            переведены в целые (см. money2integer).
+
+            Недостающие и неверные параметры - KktError до отправки.
+        """
+        try:
+            return COMMANDS[command].pack(
+                values, None if integers else self.money2integer)
+        except KeyError as e:
+            raise KktError('Не задан параметр %s команды %02XH' % (
+                e.args[0], command))
+        except (struct.error, ValueError, TypeError, AttributeError,
+                OverflowError) as e:
+            raise KktError('Неверные параметры команды %02XH: %s' % (command, e))
+
+    def _execute(self, command, values, integers=False, template=False,
+                 raw=False, password=None, convert=None, **options):
+        """ Упаковывает параметры values по схеме, отправляет команду и
+            разбирает ответ (см. execute).
+
+            При template сообщение собирается из шаблона (см.
+            template), при raw возвращаются данные ответа без разбора.
+            password заменяет пароль, заданный схемой. Результат
+            передаётся в convert, если она задана. Остальные аргументы
+            передаются в ask.
+
+            Команды KKT возвращают результат _execute как есть, поэтому
+            AsyncKKT выполняет их без изменений (см. aio).
+        """
+        params = self._prepare(command, values, integers, template,
+                               password, options)
+        data, error = self.ask(command, params, without_password=True,
+                               **options)[:2]
+        return self._result(command, data, error, raw, convert)
+
+    def _prepare(self, command, values, integers, template, password,
+                 options):
+        """ Собирает параметры команды с паролем. Сообщение из шаблона
+            записывается в options['frame'].
+        """
+        params = self.pack_params(command, values, integers)
+        if password is None:
+            password = COMMANDS[command].password
+            if password == 'operator':
+                password = self.password
+            elif password == 'admin':
+                password = self.admin_password
+            elif password == 'zero':
+                password = password_prapare(0)
+            else:
+                password = b''
+        if template:
+            options['frame'] = self.template(command, size=len(params),
+                                             password=password).fill(params)
+            return None
+        return password + params or None
+
+    def _result(self, command, data, error, raw=False, convert=None):
+        """ Разбирает ответ команды по схеме (см. execute) """
+        schema = COMMANDS[command]
+        names = schema.response.names
+        try:
+            if raw:
+                result = data
+            elif not names:
+                result = error
+            else:
+                result = schema.unpack(data, self.integer2money)
+                if names == ['operator']:
+                    result = result['operator']
+            if convert is not None:
+                result = convert(result)
+        except ValueError as e:
+            raise KktError('%s' % e)
+        return result
 
 ## Implemented
     def x01(self, code):
@@ -380,13 +931,10 @@ class KKT(BaseKKT):
                 Код ошибки (1 байт)
                 Количество блоков данных (2 байта)
         """
-        command = 0x01
-        params = self.admin_password + chr(code)
-        data, error, command = self.ask(command, params)
-        return data
+        return self._execute(0x01, {'device': code}, raw=True, convert=bytes)
 
 ## Implemented
-    def x02(self, code):
+    def x02(self, code=None):
         """ Запрос данных
             Команда: 02H. Длина сообщения: 5 байт.
                 Пароль ЦТО или пароль системного администратора, если
@@ -403,11 +951,10 @@ class KKT(BaseKKT):
                     07 – оперативная память ККТ
                 Номер блока данных (2 байта)
                 Блок данных (32 байта)
+
+            Код устройства code не передаётся: он задан в команде 01H.
         """
-        command = 0x02
-        params = self.admin_password + chr(code)
-        data, error, command = self.ask(command, params)
-        return data
+        return self._execute(0x02, {}, raw=True, convert=bytes)
 
 ## Implemented
     def x03(self):
@@ -417,11 +964,9 @@ class KKT(BaseKKT):
             Ответ: 03H. Длина сообщения: 2 байта.
                 Код ошибки (1 байт)
         """
-        command = 0x03
-        params = self.admin_password
-        data, error, command = self.ask(command, params)
-        return error
+        return self.execute(0x03)
 
+## Implemented
     def x0D(self, old_password, new_password, rnm, inn):
         """ Фискализация (перерегистрация) с длинным РНМ
             Команда: 0DH. Длина сообщения: 22 байта.
@@ -436,9 +981,11 @@ class KKT(BaseKKT):
                 Номер последней закрытой смены (2 байта) 0000...2100
                 Дата фискализации (перерегистрации) (3 байта) ДД-ММ-ГГ
         """
-        raise NotImplemented
+        return self.execute(0x0D, old_password=old_password,
+                            new_password=new_password, rnm=rnm, inn=inn)
 
-    def x0E(self):
+## Implemented
+    def x0E(self, serial_number):
         """ Ввод длинного заводского номера
             Команда: 0EH. Длина сообщения: 12 байт.
                 Пароль (4 байта) (пароль «0»)
@@ -446,8 +993,9 @@ class KKT(BaseKKT):
             Ответ: 0EH. Длина сообщения: 2 байта.
                 Код ошибки (1 байт)
         """
-        raise NotImplemented
+        return self.execute(0x0E, serial_number=serial_number)
 
+## Implemented
     def x0F(self):
         """ Запрос длинного заводского номера и длинного РНМ
             Команда: 0FH. Длина сообщения: 5 байт.
@@ -457,7 +1005,7 @@ class KKT(BaseKKT):
                 Заводской номер (7 байт) 00000000000000...99999999999999
                 РНМ (7 байт) 00000000000000...99999999999999
         """
-        raise NotImplemented
+        return self.execute(0x0F)
 
 ## Implemented
     def x10(self):
@@ -480,29 +1028,8 @@ class KKT(BaseKKT):
                     двухбайтного числа (см. документацию)
                 Зарезервировано (3 байта)
         """
-        command = 0x10
-        data, error, command = self.ask(command)
-
-        # Флаги ККТ
-        kkt_flags = string2bits(data[2] + data[1]) # старший байт и младший байт
-        kkt_flags = [ KKT_FLAGS[i] for i, x in enumerate(kkt_flags) if x ] 
-        # Количество операций
-        operations = int2.unpack(data[10]+data[5]) # старший байт и младший байт
-
-        result = {
-            'error':           error,
-            'operator':        ord(data[0]),
-            'kkt_flags':       kkt_flags,
-            'kkt_mode':        ord(data[3]),
-            'kkt_submode':     ord(data[4]),
-            'voltage_battery': ord(data[6]),
-            'voltage_power':   ord(data[7]),
-            'fp_error':        ord(data[8]),
-            'eklz_error':      ord(data[9]),
-            'operations':      operations,
-            'reserve':         data[11:],
-        }
-        return result
+        return self._execute(0x10, {}, template=True, raw=True,
+                             convert=lambda data: decode_x10(data, 0))
 
 ## Implemented
     def x11(self):
@@ -536,67 +1063,8 @@ class KKT(BaseKKT):
                 ИНН (6 байт)
         """
 
-        command = 0x11
-        data, error, command = self.ask(command)
-
-        # Дата ПО ККТ
-        day   = ord(data[5])
-        month = ord(data[6])
-        year  = ord(data[7])
-        if year > 90:
-            kkt_date = datetime.date(1900+year, month, day)
-        else:
-            kkt_date = datetime.date(2000+year, month, day)
-
-        # Флаги ККТ
-        kkt_flags = string2bits(data[12] + data[11]) # старший байт и младший байт
-        kkt_flags = [ KKT_FLAGS[i] for i, x in enumerate(kkt_flags) if x ] 
-
-        # Дата ПО ФП
-        day   = ord(data[20])
-        month = ord(data[21])
-        year  = ord(data[22])
-        if year > 90:
-            fp_date = datetime.date(1900+year, month, day)
-        else:
-            fp_date = datetime.date(2000+year, month, day)
-
-        # Дата и время текущие
-        date = datetime.date(2000+ord(data[25]), ord(data[24]), ord(data[23]))
-        time = datetime.time(ord(data[26]), ord(data[27]), ord(data[28]))
-
-        # Флаги ФП
-        fp_flags = string2bits(data[29])
-        fp_flags = [ FP_FLAGS[i][x] for i, x in enumerate(fp_flags) ] 
-
-        result = {
-            'error':       error,
-            'operator':    ord(data[0]),
-            'kkt_version': '%s.%s' % (data[1], data[2]),
-            'kkt_build':   int2.unpack(data[3] + data[4]),
-            'kkt_date':    kkt_date,
-            'hall':        ord(data[8]),
-            'document':    int2.unpack(data[9] + data[10]),
-            'kkt_flags':   kkt_flags,
-            'kkt_mode':    ord(data[13]),
-            'kkt_submode': ord(data[14]),
-            'kkt_port':    ord(data[15]),
-            'fp_version':  '%s.%s' % (data[16], data[17]),
-            'fp_build':    int2.unpack(data[18] + data[19]),
-            'fp_date':     fp_date,
-            'date':        date,
-            'time':        time,
-            'fp_flags':    fp_flags,
-            'serial_number': int4.unpack(data[30] + data[31] \
-                                       + data[32] + data[33]),
-            'last_closed_session': int2.unpack(data[34] + data[35]),
-            'fp_free_records':     int2.unpack(data[36] + data[37]),
-            'registration_count':  ord(data[38]),
-            'registration_left':   ord(data[39]),
-            'inn':          int6.unpack(data[40] + data[41] + data[42]\
-                                      + data[43] + data[44] + data[45])
-        }
-        return result
+        return self._execute(0x11, {}, raw=True,
+                             convert=lambda data: decode_x11(data, 0))
 
 ## Implemented multistring for x12
     def x12_loop(self, text='', control_tape=False):
@@ -627,13 +1095,9 @@ class KKT(BaseKKT):
 
         if len(text) > 20:
             raise KktError('Длина строки должна быть меньше или равна 20 символов')
-        text = text.encode(CODE_PAGE).ljust(20, chr(0x0))
-
-        params = self.password + chr(flags) + text
 
-        data, error, command = self.ask(command, params, quick=True)
-        operator = ord(data[0])
-        return operator
+        return self._execute(command, {'flags': flags, 'text': text},
+                             quick=True)
 
 ## Implemented
     def x13(self):
@@ -644,11 +1108,10 @@ class KKT(BaseKKT):
                 Код ошибки (1 байт)
                 Порядковый номер оператора (1 байт) 1...30
         """
-        params = self.password
-        data, error, command = self.ask(0x13, params)
-        return error
+        return self.execute(0x13)
 
-    def x14(self):
+## Implemented
+    def x14(self, bod, timeout=0.1, port=0):
         """ Установка параметров обмена
             Команда: 14H. Длина сообщения: 8 байт.
                 Пароль системного администратора (4 байта)
@@ -683,9 +1146,14 @@ class KKT(BaseKKT):
                 подтверждение на прием команды и ответное сообщение 
                 выдаются ККТ со старой скоростью обмена.
         """
-        raise NotImplemented
+        if not bod in BAUDRATES:
+            raise KktError('Скорость обмена должна быть одной из %s' % (BAUDRATES,))
+
+        return self.execute(0x14, port=port, bod_code=BAUDRATES.index(bod),
+                            timeout_code=timeout2code(timeout))
 
-    def x15(self):
+## Implemented
+    def x15(self, port=0):
         """ Чтение параметров обмена
             Команда: 15H. Длина сообщения: 6 байт.
                 Пароль системного администратора (4 байта)
@@ -695,8 +1163,11 @@ class KKT(BaseKKT):
                 Код скорости обмена (1 байт) 0...6
                 Тайм аут приема байта (1 байт) 0...255
         """
-        raise NotImplemented
+        return self._execute(0x15, {'port': port}, convert=lambda result:
+            ExchangeParams(BAUDRATES[result.bod_code],
+                           code2timeout(result.timeout_code)))
 
+## Implemented
     def x16(self):
         """ Технологическое обнуление
             Команда: 16H. Длина сообщения: 1 байт.
@@ -709,7 +1180,7 @@ class KKT(BaseKKT):
                 последовательности действий, описанных в ремонтной 
                 документации на ККТ.
         """
-        raise NotImplemented
+        return self.execute(0x16)
 
 ## Implemented multistring for x17
     def x17_loop(self, text='', control_tape=False):
@@ -747,13 +1218,9 @@ class KKT(BaseKKT):
 
         if len(text) > 40:
             raise KktError('Длина строки должна быть меньше или равна 40 символов')
-        text = text.encode(CODE_PAGE).ljust(40, chr(0x0))
 
-        params = self.password + chr(flags) + text
-
-        data, error, command = self.ask(command, params, quick=True)
-        operator = ord(data[0])
-        return operator
+        return self._execute(command, {'flags': flags, 'text': text},
+                             template=True, quick=True)
 
 ## Implemented
     def x18(self, text, number=1):
@@ -771,19 +1238,13 @@ class KKT(BaseKKT):
                 Печатаемые символы – символы в кодовой странице 
                 WIN1251. Символы с кодами 0..31 не отображаются.
         """
-        command = 0x18
-
         if len(text) > 30:
-            raise 'Длина строки должна быть меньше или равна 30 символов'
-        text = text.encode(CODE_PAGE).ljust(30, chr(0x0))
-
-        params = self.password + text + chr(flags) 
-
-        data, error, command = self.ask(command, params)
-        operator = ord(data[0])
-        return operator
+            raise KktError('Длина строки должна быть меньше или равна 30 символов')
+        return self._execute(0x18, {'text': text, 'number': number},
+                             convert=attrgetter('operator'))
 
-    def x19(self):
+## Implemented
+    def x19(self, period):
         """ Тестовый прогон
             Команда: 19H. Длина сообщения: 6 байт.
                 Пароль оператора (4 байта)
@@ -792,10 +1253,10 @@ class KKT(BaseKKT):
                 Код ошибки (1 байт)
                 Порядковый номер оператора (1 байт) 1...30
         """
-        raise NotImplemented
+        return self.execute(0x19, period=period)
 
 ## Implemented
-    def x1A(self):
+    def x1A(self, number):
         """ Запрос денежного регистра
             Команда: 1AH. Длина сообщения: 6 байт.
                 Пароль оператора (4 байта)
@@ -806,19 +1267,13 @@ class KKT(BaseKKT):
                 Содержимое регистра (6 байт)
         
         Пример запроса:
-            integer2money(int6.unpack(kkt.ask(0x1A, kkt.password + chr(121))[0][1:]))
+            kkt.integer2money(kkt.execute(0x1A, register=121).value)
         """
-        
-        command = 0x1A
-
-        params = self.password + chr(number) 
-
-        data, error, command = self.ask(command, params)
-
-        return integer2money(int6.unpack(data[1:]))
+        return self._execute(0x1A, {'register': number}, convert=lambda
+                             result: self.integer2money(result.value))
 
 ## Implemented
-    def x1B(self):
+    def x1B(self, number):
         """ Запрос операционного регистра
             Команда: 1BH. Длина сообщения: 6 байт.
                 Пароль оператора (4 байта)
@@ -828,15 +1283,53 @@ class KKT(BaseKKT):
                 Порядковый номер оператора (1 байт) 1...30
                 Содержимое регистра (2 байта)
         """
-        command = 0x1B
-
-        params = self.password + chr(number) 
-
-        data, error, command = self.ask(command, params)
-
-        return int2.unpack(data[1:])
+        return self._execute(0x1B, {'register': number},
+                             convert=attrgetter('value'))
+
+## Implemented bulk reading for x1A
+    def money_registers(self, numbers=None):
+        """ Чтение денежных регистров (по умолчанию - всех 256)
+            командой 1AH. Содержимое регистров собирается в один буфер
+            и разбирается за один проход.
+
+            Возвращает Registers: значения в копейках в registers.values,
+            по номеру регистра - в типе money_type.
+        """
+        numbers, buffer = self._read_registers(0x1A, numbers,
+                                               MONEY_REGISTER_SIZE)
+        return money_registers(numbers, buffer, self.integer2money)
+
+## Implemented bulk reading for x1B
+    def operation_registers(self, numbers=None):
+        """ Чтение операционных регистров (по умолчанию - всех 256)
+            командой 1BH. Возвращает Registers.
+        """
+        numbers, buffer = self._read_registers(0x1B, numbers,
+                                               OPERATION_REGISTER_SIZE)
+        return operation_registers(numbers, buffer)
+
+    def _read_registers(self, command, numbers, size):
+        """ Запрашивает регистры по одному в одной сессии и складывает
+            их содержимое подряд в заранее выделенный буфер.
+        """
+        if numbers is None:
+            numbers = range(256)
+        numbers = tuple(numbers)
+        buffer = bytearray(len(numbers) * size)
+        template = self.template(command, size=1)
+        with self:
+            offset = 0
+            for number in numbers:
+                self.preempt()
+                frame = template.fill(self.pack_params(
+                    command, {'register': number}))
+                data = self.ask(command, frame=frame)[0]
+                buffer[offset:offset+size] = data[1:size+1]
+                offset += size
+        return numbers, buffer
 
-    def x1C(self):
+## Implemented
+    def x1C(self, license):
         """ Запись лицензии
             Команда: 1CH. Длина сообщения: 10 байт.
                 Пароль системного администратора (4 байта)
@@ -844,8 +1337,9 @@ class KKT(BaseKKT):
             Ответ: 1CH. Длина сообщения: 2 байта.
                 Код ошибки (1 байт)
         """
-        raise NotImplemented
+        return self.execute(0x1C, license=license)
 
+## Implemented
     def x1D(self):
         """ Чтение лицензии
             Команда: 1DH. Длина сообщения: 5 байт.
@@ -854,7 +1348,7 @@ class KKT(BaseKKT):
                 Код ошибки (1 байт)
                 Лицензия (5 байт) 0000000000...9999999999
         """
-        raise NotImplemented
+        return self.execute(0x1D)
 
 ## Implemented
     def x1E(self, table, row, field, value):
@@ -871,18 +1365,11 @@ class KKT(BaseKKT):
             Примечание: поля бывают бинарные и строковые, поэтому value
             делаем в исходном виде.
         """
-        command = 0x1E
-
-        table = chr(table)
-        row   = int2.pack(row)
-        field = chr(field)
-
-        params = self.admin_password + table + row + field + value
-
-        data, error, command = self.ask(command, params)
-        return error
+        return self.execute(0x1E, table=table, row=row, field=field,
+                            value=value)
 
-    def x1F(self):
+## Implemented
+    def x1F(self, table, row, field):
         """ Чтение таблицы
             Команда: 1FH. Длина сообщения: 9 байт.
                 Пароль системного администратора (4 байта)
@@ -893,9 +1380,10 @@ class KKT(BaseKKT):
                 Код ошибки (1 байт)
                 Значение (X байт) до 40 байт
         """
-        raise NotImplemented
+        return self.execute(0x1F, table=table, row=row, field=field)
 
-    def x20(self):
+## Implemented
+    def x20(self, point):
         """ Запись положения десятичной точки
             Команда: 20H. Длина сообщения: 6 байт.
                 Пароль системного администратора (4 байта)
@@ -904,7 +1392,7 @@ class KKT(BaseKKT):
                 Код ошибки (1 байт)
 
         """
-        raise NotImplemented
+        return self.execute(0x20, point=point)
 
 ## Implemented
     def x21(self, hour, minute, second):
@@ -915,13 +1403,11 @@ class KKT(BaseKKT):
             Ответ: 21H. Длина сообщения: 2 байта.
                 Код ошибки (1 байт)
         """
-        command = 0x21
-        hour    = chr(hour)
-        minute  = chr(minute)
-        second  = chr(second)
-        params  = self.admin_password + hour + minute + second
-        data, error, command = self.ask(command, params)
-        return error
+        try:
+            value = datetime.time(hour, minute, second)
+        except (ValueError, TypeError) as e:
+            raise KktError('Неверное время: %s' % e)
+        return self.execute(0x21, time=value)
 
 ## Implemented
     def x22(self, year, month, day):
@@ -932,17 +1418,7 @@ class KKT(BaseKKT):
             Ответ: 22H. Длина сообщения: 2 байта.
                 Код ошибки (1 байт)
         """
-        command = 0x22
-        
-        if year >= 2000:
-            year = year - 2000
-
-        year    = chr(year)
-        month   = chr(month)
-        day     = chr(day)
-        params  = self.admin_password + day + month + year
-        data, error, command = self.ask(command, params)
-        return error
+        return self.execute(0x22, date=self._date(year, month, day))
 
 ## Implemented
     def x23(self, year, month, day):
@@ -953,16 +1429,9 @@ class KKT(BaseKKT):
             Ответ: 23H. Длина сообщения: 2 байта.
                 Код ошибки (1 байт)
         """
-        command = 0x23
-        if year >= 2000:
-            year = year - 2000
-        year    = chr(year)
-        month   = chr(month)
-        day     = chr(day)
-        params  = self.admin_password + day + month + year
-        data, error, command = self.ask(command, params)
-        return error
+        return self.execute(0x23, date=self._date(year, month, day))
 
+## Implemented
     def x24(self):
         """ Инициализация таблиц начальными значениями
             Команда: 24H. Длина сообщения: 5 байт.
@@ -970,7 +1439,7 @@ class KKT(BaseKKT):
             Ответ: 24H. Длина сообщения: 2 байта.
                 Код ошибки (1 байт)
         """
-        raise NotImplemented
+        return self.execute(0x24)
 
 ## Implemented
     def x25(self, fullcut=True):
@@ -982,16 +1451,12 @@ class KKT(BaseKKT):
                 Код ошибки (1 байт)
                 Порядковый номер оператора (1 байт) 1...30
         """
-        command = 0x25
-
         cut = int(not bool(fullcut)) # 0 по умолчанию
 
-        params = self.password + chr(cut)
-        data, error, command = self.ask(command, params)
-        operator = ord(data[0])
-        return operator
+        return self.execute(0x25, cut=cut)
 
-    def x26(self):
+## Implemented
+    def x26(self, font):
         """ Прочитать параметры шрифта
             Команда: 26H. Длина сообщения: 6 байт.
                 Пароль системного администратора (4 байта)
@@ -1003,8 +1468,9 @@ class KKT(BaseKKT):
                 Высота символа с учетом межстрочного интервала в точках (1 байт)
                 Количество шрифтов в ККТ (1 байт)
         """
-        raise NotImplemented
+        return self.execute(0x26, font=font)
 
+## Implemented
     def x27(self):
         """ Общее гашение
             Команда: 27H. Длина сообщения: 5 байт.
@@ -1012,9 +1478,10 @@ class KKT(BaseKKT):
             Ответ: 27H. Длина сообщения: 2 байта.
                 Код ошибки (1 байт)
         """
-        raise NotImplemented
+        return self.execute(0x27)
 
-    def x28(self):
+## Implemented
+    def x28(self, drawer):
         """ Открыть денежный ящик
             Команда: 28H. Длина сообщения: 6 байт.
                 Пароль оператора (4 байта)
@@ -1023,7 +1490,7 @@ class KKT(BaseKKT):
                 Код ошибки (1 байт)
                 Порядковый номер оператора (1 байт) 1...30
         """
-        raise NotImplemented
+        return self.execute(0x28, drawer=drawer)
 
 ## Implemented
     def x29(self, receipt_tape=False, control_tape=False, row_count=1):
@@ -1039,23 +1506,19 @@ class KKT(BaseKKT):
                 Код ошибки (1 байт)
                 Порядковый номер оператора (1 байт) 1...30
         """
-        command = 0x29
-
         flags = 4 # по умолчанию bin(4) == '0b00000100'
         if receipt_tape:
-            tape = 2 # bin(2) == '0b00000010'
+            flags = 2 # bin(2) == '0b00000010'
         if control_tape:
-            tape = 1 # bin(1) == '0b00000001'
+            flags = 1 # bin(1) == '0b00000001'
 
         if row_count < 1 or row_count > 255:
             raise KktError("Количество строк должно быть в диапазоне между 1 и 255")
 
-        params  = self.password + chr(flags) + chr(row_count)
-        data, error, command = self.ask(command, params)
-        operator = ord(data[0])
-        return operator
+        return self.execute(0x29, flags=flags, row_count=row_count)
 
-    def x2A(self):
+## Implemented
+    def x2A(self, direction):
         """ Выброс подкладного документа
             Команда: 2AH. Длина сообщения: 6 байт.
                 Пароль оператора (4 байта)
@@ -1064,8 +1527,9 @@ class KKT(BaseKKT):
                 Код ошибки (1 байт)
                 Порядковый номер оператора (1 байт) 1...30
         """
-        raise NotImplemented
+        return self.execute(0x2A, direction=direction)
 
+## Implemented
     def x2B(self):
         """ Прерывание тестового прогона
             Команда: 2BH. Длина сообщения: 5 байт.
@@ -1074,8 +1538,9 @@ class KKT(BaseKKT):
                 Код ошибки (1 байт)
                 Порядковый номер оператора (1 байт) 1...30
         """
-        raise NotImplemented
+        return self.execute(0x2B)
 
+## Implemented
     def x2C(self):
         """ Снятие показаний операционных регистров
             Команда: 2СH. Длина сообщения: 5 байт.
@@ -1084,9 +1549,10 @@ class KKT(BaseKKT):
                 Код ошибки (1 байт)
                 Порядковый номер оператора (1 байт) 29, 30
         """
-        raise NotImplemented
+        return self.execute(0x2C)
 
-    def x2D(self):
+## Implemented
+    def x2D(self, table):
         """ Запрос структуры таблицы
             Команда: 2DH. Длина сообщения: 6 байт.
                 Пароль системного администратора (4 байта)
@@ -1097,9 +1563,10 @@ class KKT(BaseKKT):
                 Количество рядов (2 байта)
                 Количество полей (1 байт)
         """
-        raise NotImplemented
+        return self.execute(0x2D, table=table)
 
-    def x2E(self):
+## Implemented
+    def x2E(self, table, field):
         """ Запрос структуры поля
             Команда: 2EH. Длина сообщения: 7 байт.
                 Пароль системного администратора (4 байта)
@@ -1113,9 +1580,10 @@ class KKT(BaseKKT):
                 Минимальное значение поля – для полей типа BIN (X байт)
                 Максимальное значение поля – для полей типа BIN (X байт)
         """
-        raise NotImplemented
+        return self.execute(0x2E, table=table, field=field)
 
-    def x2F(self):
+## Implemented
+    def x2F(self, flags, font, text=''):
         """ Печать строки данным шрифтом
             Команда: 2FH. Длина сообщения: 47 байт.
                 Пароль оператора (4 байта)
@@ -1131,7 +1599,7 @@ class KKT(BaseKKT):
                 Печатаемые символы – символы в кодовой странице 
                 WIN1251. Символы с кодами 0...31 не отображаются.
         """
-        raise NotImplemented
+        return self.execute(0x2F, flags=flags, font=font, text=text)
 
 ## Implemented
     def x40(self):
@@ -1142,12 +1610,7 @@ class KKT(BaseKKT):
                 Код ошибки (1 байт)
                 Порядковый номер оператора (1 байт) 29, 30
         """
-        command = 0x40
-
-        params  = self.admin_password
-        data, error, command = self.ask(command, params)
-        operator = ord(data[0])
-        return operator
+        return self.execute(0x40)
 
 ## Implemented
     def x41(self):
@@ -1158,13 +1621,9 @@ class KKT(BaseKKT):
                 Код ошибки (1 байт)
                 Порядковый номер оператора (1 байт) 29, 30
         """
-        command = 0x41
-
-        params  = self.admin_password
-        data, error, command = self.ask(command, params)
-        operator = ord(data[0])
-        return operator
+        return self.execute(0x41)
 
+## Implemented
     def x42(self):
         """ Отчѐт по секциям
             Команда: 42H. Длина сообщения: 5 байт.
@@ -1173,8 +1632,9 @@ class KKT(BaseKKT):
                 Код ошибки (1 байт)
                 Порядковый номер оператора (1 байт) 29, 30
         """
-        raise NotImplemented
+        return self.execute(0x42)
 
+## Implemented
     def x43(self):
         """ Отчѐт по налогам
             Команда: 43H. Длина сообщения: 5 байт.
@@ -1183,7 +1643,7 @@ class KKT(BaseKKT):
                 Код ошибки (1 байт)
                 Порядковый номер оператора (1 байт) 29, 30
         """
-        raise NotImplemented
+        return self.execute(0x43)
 
 ## Implemented
     def x50(self, summa):
@@ -1196,19 +1656,7 @@ class KKT(BaseKKT):
                 Порядковый номер оператора (1 байт) 1...30
                 Сквозной номер документа (2 байта)
         """
-        command = 0x50
-        summa = money2integer(summa)
-        summa = int5.pack(summa)
-        params = self.password + summa
-
-        data, error, command = self.ask(command, params)
-        operator = ord(data[0])
-        document = int4.unpack(data[1:3])
-        result = {
-            'operator': operator,
-            'document': document,
-        }
-        return result
+        return self._x5summa(0x50, summa)
 
 ## Implemented
     def x51(self, summa):
@@ -1222,19 +1670,16 @@ class KKT(BaseKKT):
                 Сквозной номер документа (2 байта)
 
         """
-        command = 0x51
-        summa = money2integer(summa)
-        summa = int5.pack(summa)
-        params = self.password + summa
+        return self._x5summa(0x51, summa)
 
-        data, error, command = self.ask(command, params)
-        operator = ord(data[0])
-        document = int4.unpack(data[1:3])
-        result = {
-            'operator': operator,
-            'document': document,
-        }
-        return result
+    def _x5summa(self, command, summa):
+        """ Общий метод для внесения и выплаты """
+        summa = self.money2integer(summa)
+        if summa < 0 or summa > 9999999999:
+            raise KktError("Сумма должна быть в диапазоне между 0 и 9999999999")
+        return self._execute(command, {'summa': summa}, integers=True,
+                             convert=lambda result: Document(
+                                 result.operator, result.document))
 
 ## Implemented
     def x52(self):
@@ -1245,14 +1690,10 @@ class KKT(BaseKKT):
                 Код ошибки (1 байт)
                 Порядковый номер оператора (1 байт) 1...30
         """
-        command = 0x52
+        return self.execute(0x52)
 
-        params  = self.password
-        data, error, command = self.ask(command, params)
-        operator = ord(data[0])
-        return operator
-
-    def x53(self):
+## Implemented
+    def x53(self, advertising):
         """ Конец Документа
             Команда: 53H. Длина сообщения: 6 байт.
                 Пароль оператора (4 байта)
@@ -1263,8 +1704,9 @@ class KKT(BaseKKT):
                 Код ошибки (1 байт)
                 Порядковый номер оператора (1 байт) 1...30
         """
-        raise NotImplemented
+        return self.execute(0x53, advertising=advertising)
 
+## Implemented
     def x54(self):
         """ Печать рекламного текста
             Команда: 54H. Длина сообщения:5 байт.
@@ -1273,9 +1715,10 @@ class KKT(BaseKKT):
                 Код ошибки (1 байт)
                 Порядковый номер оператора (1 байт) 1...30
         """
-        raise NotImplemented
+        return self.execute(0x54)
 
-    def x60(self):
+## Implemented
+    def x60(self, serial_number):
         """ Ввод заводского номера
             Команда: 60H. Длина сообщения: 9 байт.
                 Пароль (4 байта) (пароль «0»)
@@ -1283,8 +1726,9 @@ class KKT(BaseKKT):
             Ответ: 60H. Длина сообщения: 2 байта.
                 Код ошибки (1 байт)
         """
-        raise NotImplemented
+        return self.execute(0x60, serial_number=serial_number)
 
+## Implemented
     def x61(self):
         """ Инициализация ФП
             Команда: 61H. Длина сообщения: 1 байт.
@@ -1297,7 +1741,7 @@ class KKT(BaseKKT):
                 инициализации и используется в технологических целях 
                 при производстве ККМ на заводе-изготовителе.
         """
-        raise NotImplemented
+        return self.execute(0x61)
 
 ## Implemented
     def x62(self, after=False):
@@ -1318,26 +1762,11 @@ class KKT(BaseKKT):
                 Сумма всех сменных возвратов покупок (6 байт) При отсутствии ФП 2:
                     FFh FFh FFh FFh FFh FFh
         """
-        command = 0x62
-        params  = self.admin_password + chr(1 if after else 0)
-        data, error, command = self.ask(command, params)
-
-        result = {
-            'operator': ord(data[0]),
-            'sale': integer2money(int8.unpack(data[1:9])),
-            'purchase': integer2money(int6.unpack(data[9:15])),
-            'refuse_sale': integer2money(int6.unpack(data[15:21])),
-            'refuse_purchase': integer2money(int6.unpack(data[21:])),
-        }
-
-        # Если ФП 2 установлена, то почемуто вовращает предельное число.
-        # Поэтому мы его сбрасываем.
-        for key in ('purchase', 'refuse_sale', 'refuse_purchase'):
-            if result[key] == 2814749767106.55:
-                result[key] = 0
-
-        return result
+        return self._execute(0x62, {'after': 1 if after else 0}, raw=True,
+                             convert=lambda data: decode_x62(
+                                 data, self.integer2money))
 
+## Implemented
     def x63(self):
         """ Запрос даты последней записи в ФП
             Команда: 63H. Длина сообщения: 5 байт.
@@ -1350,9 +1779,10 @@ class KKT(BaseKKT):
                     (перерегистрация), «1» – сменный итог
                 Дата (3 байта) ДД-ММ-ГГ
         """
-        raise NotImplemented
+        return self.execute(0x63)
 
-    def x64(self):
+## Implemented
+    def x64(self, tax_password):
         """ Запрос диапазона дат и смен
             Команда: 64H. Длина сообщения: 5 байт.
                 Пароль налогового инспектора (4 байта)
@@ -1363,9 +1793,10 @@ class KKT(BaseKKT):
                 Номер первой смены (2 байта) 0000...2100
                 Номер последней смены (2 байта) 0000...2100
         """
-        raise NotImplemented
+        return self.execute(0x64, tax_password=tax_password)
 
-    def x65(self):
+## Implemented
+    def x65(self, old_password, new_password, rnm, inn):
         """ Фискализация (перерегистрация)
             Команда: 65H. Длина сообщения: 20 байт.
                 Пароль старый (4 байта)
@@ -1379,9 +1810,11 @@ class KKT(BaseKKT):
                 Номер последней закрытой смены (2 байта) 0000...2100
                 Дата фискализации (перерегистрации) (3 байта) ДД-ММ-ГГ
         """
-        raise NotImplemented
+        return self.execute(0x65, old_password=old_password,
+                            new_password=new_password, rnm=rnm, inn=inn)
 
-    def x66(self):
+## Implemented
+    def x66(self, tax_password, report_type, first_date, last_date):
         """ Фискальный отчет по диапазону дат
             Команда: 66H. Длина сообщения: 12 байт.
                 Пароль налогового инспектора (4 байта)
@@ -1395,9 +1828,12 @@ class KKT(BaseKKT):
                 Номер первой смены (2 байта) 0000...2100
                 Номер последней смены (2 байта) 0000...2100
         """
-        raise NotImplemented
+        return self.execute(0x66, tax_password=tax_password,
+                            report_type=report_type, first_date=first_date,
+                            last_date=last_date)
 
-    def x67(self):
+## Implemented
+    def x67(self, tax_password, report_type, first_session, last_session):
         """ Фискальный отчет по диапазону смен
             Команда: 67H. Длина сообщения: 10 байт.
                 Пароль налогового инспектора (4 байта)
@@ -1411,18 +1847,23 @@ class KKT(BaseKKT):
                 Номер первой смены (2 байта) 0000...2100
                 Номер последней смены (2 байта) 0000...2100
         """
-        raise NotImplemented
+        return self.execute(0x67, tax_password=tax_password,
+                            report_type=report_type,
+                            first_session=first_session,
+                            last_session=last_session)
 
-    def x68(self):
+## Implemented
+    def x68(self, tax_password):
         """ Прерывание полного отчета
             Команда: 68H. Длина сообщения: 5 байт.
                 Пароль налогового инспектора (4 байта)
             Ответ: 68H. Длина сообщения: 2 байта.
                 Код ошибки (1 байт)
         """
-        raise NotImplemented
+        return self.execute(0x68, tax_password=tax_password)
 
-    def x69(self):
+## Implemented
+    def x69(self, tax_password, registration):
         """ Чтение параметров фискализации (перерегистрации)
             Команда: 69H. Длина сообщения: 6 байт.
                 Пароль налогового инспектора, при котором была проведена
@@ -1437,9 +1878,12 @@ class KKT(BaseKKT):
                     (2 байта) 0000...2100
                 Дата фискализации (перерегистрации) (3 байта) ДД-ММ-ГГ
         """
-        raise NotImplemented
+        return self.execute(0x69, tax_password=tax_password,
+                            registration=registration)
 
-    def x70(self):
+## Implemented
+    def x70(self, document_type, duplicate_type, duplicate_count,
+            duplicate_offsets, fonts, rows, offsets):
         """ Открыть фискальный подкладной документ
             Команда: 70H. Длина сообщения: 26 байт.
                 Пароль оператора (4 байта)
@@ -1474,9 +1918,15 @@ class KKT(BaseKKT):
             *– Для колонок величина смещения задаѐтся в символах, для 
             блоков строк – в строках.
         """
-        raise NotImplemented
+        return self.execute(0x70, document_type=document_type,
+                            duplicate_type=duplicate_type,
+                            duplicate_count=duplicate_count,
+                            duplicate_offsets=duplicate_offsets, fonts=fonts,
+                            rows=rows, offsets=offsets)
 
-    def x71(self):
+## Implemented
+    def x71(self, document_type, duplicate_type, duplicate_count,
+            duplicate_offsets):
         """ Открыть стандартный фискальный подкладной документ
             Команда: 71H. Длина сообщения: 13 байт.
                 Пароль оператора (4 байта)
@@ -1495,9 +1945,14 @@ class KKT(BaseKKT):
                 Порядковый номер оператора (1 байт) 1...30
                 Сквозной номер документа (2 байта)
         """
-        raise NotImplemented
+        return self.execute(0x71, document_type=document_type,
+                            duplicate_type=duplicate_type,
+                            duplicate_count=duplicate_count,
+                            duplicate_offsets=duplicate_offsets)
 
-    def x72(self):
+## Implemented
+    def x72(self, count_format, line_count, rows, fonts, widths, offsets,
+            first_line, count, price, department, taxes=[0,0,0,0], text=''):
         """ Формирование операции на подкладном документе
             Команда: 72H. Длина сообщения: 82 байта.
                 Пароль оператора (4 байта)
@@ -1537,9 +1992,15 @@ class KKT(BaseKKT):
                 Код ошибки (1 байт)
                 Порядковый номер оператора (1 байт) 1...30
         """
-        raise NotImplemented
+        return self.execute(0x72, count_format=count_format,
+                            line_count=line_count, rows=rows, fonts=fonts,
+                            widths=widths, offsets=offsets,
+                            first_line=first_line, count=count, price=price,
+                            department=department, taxes=taxes, text=text)
 
-    def x73(self):
+## Implemented
+    def x73(self, first_line, count, price, department, taxes=[0,0,0,0],
+            text=''):
         """ Формирование стандартной операции на подкладном
                 документе
             Команда: 73H. Длина сообщения: 61 байт.
@@ -1557,9 +2018,13 @@ class KKT(BaseKKT):
                 Код ошибки (1 байт)
                 Порядковый номер оператора (1 байт) 1...30
         """
-        raise NotImplemented
+        return self.execute(0x73, first_line=first_line, count=count,
+                            price=price, department=department, taxes=taxes,
+                            text=text)
 
-    def x74(self):
+## Implemented
+    def x74(self, line_count, rows, fonts, widths, offsets, operation_type,
+            first_line, summa, taxes=[0,0,0,0], text=''):
         """ Формирование скидки/надбавки на подкладном документе
             Команда: 74H. Длина сообщения: 68 байт.
                 Пароль оператора (4 байта)
@@ -1587,9 +2052,14 @@ class KKT(BaseKKT):
                 Код ошибки (1 байт)
                 Порядковый номер оператора (1 байт) 1...30
         """
-        raise NotImplemented
+        return self.execute(0x74, line_count=line_count, rows=rows,
+                            fonts=fonts, widths=widths, offsets=offsets,
+                            operation_type=operation_type,
+                            first_line=first_line, summa=summa, taxes=taxes,
+                            text=text)
 
-    def x75(self):
+## Implemented
+    def x75(self, operation_type, first_line, summa, taxes=[0,0,0,0], text=''):
         """ Формирование стандартной скидки/надбавки на
                 подкладном документе
             Команда: 75H. Длина сообщения: 56 байт.
@@ -1607,9 +2077,14 @@ class KKT(BaseKKT):
                 Код ошибки (1 байт)
                 Порядковый номер оператора (1 байт) 1...30
         """
-        raise NotImplemented
+        return self.execute(0x75, operation_type=operation_type,
+                            first_line=first_line, summa=summa, taxes=taxes,
+                            text=text)
 
-    def x76(self):
+## Implemented
+    def x76(self, line_count, total_line, rows, fonts, widths, offsets,
+            first_line, cash, payment2, payment3, payment4, discount,
+            taxes=[0,0,0,0], text=''):
         """ Формирование закрытия чека на подкладном документе
             Команда: 76H. Длина сообщения: 182 байта.
                 Пароль оператора (4 байта)
@@ -1759,11 +2234,16 @@ class KKT(BaseKKT):
                 Порядковый номер оператора (1 байт) 1...30
                 Сдача (5 байт) 0000000000...9999999999
         """
-        raise NotImplemented
+        return self.execute(0x76, line_count=line_count, total_line=total_line,
+                            rows=rows, fonts=fonts, widths=widths,
+                            offsets=offsets, first_line=first_line, cash=cash,
+                            payment2=payment2, payment3=payment3,
+                            payment4=payment4, discount=discount, taxes=taxes,
+                            text=text)
 
 ## Implemented
     def x77(self, cash=0, payment2=0, payment3=0, payment4=0, discount=0,
-    text='',  taxes=[0,0,0,0]):
+    text='',  taxes=[0,0,0,0], first_line=1):
         """ Формирование стандартного закрытия чека на подкладном
                 документе
             Команда: 77H. Длина сообщения: 72 байта.
@@ -1786,11 +2266,11 @@ class KKT(BaseKKT):
         """
         command = 0x77
 
-        cash     = money2integer(cash)
-        payment2 = money2integer(payment2)
-        payment3 = money2integer(payment3)
-        payment4 = money2integer(payment4)
-        discount = money2integer(discount)
+        cash     = self.money2integer(cash)
+        payment2 = self.money2integer(payment2)
+        payment3 = self.money2integer(payment3)
+        payment4 = self.money2integer(payment4)
+        discount = self.money2integer(discount)
 
         if cash < 0 or cash > 9999999999:
             raise KktError("Наличные должны быть в диапазоне между 0 и 9999999999")
@@ -1812,26 +2292,14 @@ class KKT(BaseKKT):
             if t not in range(0, 5):
                raise KktError("Налоги должны быть равны 0,1,2,3 или 4")
 
-        cash       = int5.pack(cash)
-        payment2   = int5.pack(payment2)
-        payment3   = int5.pack(payment3)
-        payment4   = int5.pack(payment4)
-        discount   = int2.pack(discount)
-        taxes      = digits2string(taxes)
-        text       = text.encode(CODE_PAGE).ljust(40, chr(0x0))
-
-        params  = self.password + cash + payment2 + payment3 + payment4\
-                                + discount + taxes + text
-        data, error, command = self.ask(command, params, quick=True)
-        operator = ord(data[0])
-        odd = int5.unpack(data[1:6])
-        result = {
-            'operator': operator,
-            'odd': integer2money(odd),
-        }
-        return result
+        return self._execute(command, {
+            'first_line': first_line, 'cash': cash, 'payment2': payment2,
+            'payment3': payment3, 'payment4': payment4,
+            'discount': discount, 'taxes': taxes, 'text': text,
+        }, integers=True, quick=True, convert=_change)
 
-    def x78(self):
+## Implemented
+    def x78(self, width, length, orientation, intervals):
         """ Конфигурация подкладного документа
             Команда: 78H. Длина сообщения: 209 байт.
                 Пароль оператора (4 байта)
@@ -1856,8 +2324,10 @@ class KKT(BaseKKT):
             не равен шагу по вертикали: эти параметры печатающего 
             механизма указываются в инструкции по эксплуатации на ККТ.
         """
-        raise NotImplemented
+        return self.execute(0x78, width=width, length=length,
+                            orientation=orientation, intervals=intervals)
 
+## Implemented
     def x79(self):
         """ Установка стандартной конфигурации подкладного
                 документа
@@ -1867,9 +2337,10 @@ class KKT(BaseKKT):
                 Код ошибки (1 байт)
                 Порядковый номер оператора (1 байт) 1...30
         """
-        raise NotImplemented
+        return self.execute(0x79)
 
-    def x7A(self):
+## Implemented
+    def x7A(self, line, text=''):
         """ Заполнение буфера подкладного документа нефискальной
                 информацией
             Команда: 7AH. Длина сообщения: (6 + X) байт.
@@ -1883,9 +2354,10 @@ class KKT(BaseKKT):
                 Код ошибки (1 байт)
                 Порядковый номер оператора (1 байт) 1...30
         """
-        raise NotImplemented
+        return self.execute(0x7A, line=line, text=text)
 
-    def x7B(self):
+## Implemented
+    def x7B(self, line):
         """ Очистка строки буфера подкладного документа от
                 нефискальной информации
             Команда: 7BH. Длина сообщения: 6 байт.
@@ -1895,8 +2367,9 @@ class KKT(BaseKKT):
                 Код ошибки (1 байт)
                 Порядковый номер оператора (1 байт) 1...30
         """
-        raise NotImplemented
+        return self.execute(0x7B, line=line)
 
+## Implemented
     def x7C(self):
         """ Очистка всего буфера подк ладного документа от
                 нефискальной информации
@@ -1906,9 +2379,10 @@ class KKT(BaseKKT):
                 Код ошибки (1 байт)
                 Порядковый номер оператора (1 байт) 1...30
         """
-        raise NotImplemented
+        return self.execute(0x7C)
 
-    def x7D(self):
+## Implemented
+    def x7D(self, clear, print_type):
         """ Печать подкладного документа
             Команда: 7DH. Длина сообщения: 7 байт.
                 Пароль оператора (4 байта)
@@ -1921,9 +2395,10 @@ class KKT(BaseKKT):
             Код ошибки (1 байт)
             Порядковый номер оператора (1 байт) 1...30
         """
-        raise NotImplemented
+        return self.execute(0x7D, clear=clear, print_type=print_type)
 
-    def x7E(self):
+## Implemented
+    def x7E(self, width, length, orientation, interval):
         """ Общая конфигурация подкладного документа
             Команда: 7EH. Длина сообщения: 11 байт.
                 Пароль оператора (4 байта)
@@ -1941,7 +2416,8 @@ class KKT(BaseKKT):
             не равен шагу по вертикали: эти параметры печатающего 
             механизма указываются в инструкции по эксплуатации на ККТ.
         """
-        raise NotImplemented
+        return self.execute(0x7E, width=width, length=length,
+                            orientation=orientation, interval=interval)
 
 ## Implemented
     def _x8count(self, command, count, price, text='', department=0, taxes=[0,0,0,0]):
@@ -1962,8 +2438,8 @@ class KKT(BaseKKT):
         """
         command = command
 
-        count = count2integer(count)
-        price = money2integer(price)
+        count = self.money2integer(count, 3)
+        price = self.money2integer(price)
 
         if count < 0 or count > 9999999999:
             raise KktError("Количество должно быть в диапазоне между 0 и 9999999999")
@@ -1982,16 +2458,10 @@ class KKT(BaseKKT):
             if t not in range(0, 5):
                raise KktError("Налоги должны быть равны 0,1,2,3 или 4")
 
-        count      = int5.pack(count)
-        price      = int5.pack(price)
-        department = chr(department)
-        taxes      = digits2string(taxes)
-        text       = text.encode(CODE_PAGE).ljust(40, chr(0x0))
-
-        params  = self.password + count + price + department + taxes + text
-        data, error, command = self.ask(command, params, quick=True)
-        operator = ord(data[0])
-        return operator
+        return self._execute(command, {
+            'count': count, 'price': price, 'department': department,
+            'taxes': taxes, 'text': text,
+        }, integers=True, template=True, quick=True)
 
 ## Implemented
     def x80(self, count, price, text='', department=0, taxes=[0,0,0,0]):
@@ -2099,7 +2569,8 @@ class KKT(BaseKKT):
                         text=text, department=department, taxes=taxes)
 
 ## Implemented
-    def x85(self, cash=0, summs=[0,0,0,0], discount=0, taxes=[0,0,0,0], text=''):
+    def x85(self, cash=0, summs=[0,0,0,0], discount=0, taxes=[0,0,0,0],
+            text=''):
         """ Закрытие чека
             Команда: 85H. Длина сообщения: 71 байт.
                 Пароль оператора (4 байта)
@@ -2121,15 +2592,15 @@ class KKT(BaseKKT):
         """
         command = 0x85
 
-        summa1 = money2integer(summs[0] or cash)
-        summa2 = money2integer(summs[1])
-        summa3 = money2integer(summs[2])
-        summa4 = money2integer(summs[3])
-        discount = money2integer(discount)
+        summa1 = self.money2integer(summs[0] or cash)
+        summa2 = self.money2integer(summs[1])
+        summa3 = self.money2integer(summs[2])
+        summa4 = self.money2integer(summs[3])
+        discount = self.money2integer(discount)
         
         for i,s in enumerate([summa1, summa2, summa3, summa4]):
             if s < 0 or s > 9999999999:
-                raise KktError("Переменная `summa%d` должна быть в диапазоне между 0 и 9999999999" % i+1)
+                raise KktError("Переменная `summa%d` должна быть в диапазоне между 0 и 9999999999" % (i + 1))
         if discount < -9999 or discount > 9999:
             raise KktError("Скидка должна быть в диапазоне между -9999 и 9999")
 
@@ -2143,24 +2614,11 @@ class KKT(BaseKKT):
             if t not in range(0, 5):
                raise KktError("Налоги должны быть равны 0,1,2,3 или 4")
 
-        summa1 = int5.pack(summa1)
-        summa2 = int5.pack(summa2)
-        summa3 = int5.pack(summa3)
-        summa4 = int5.pack(summa4)
-        discount = int2.pack(discount)
-        taxes    = digits2string(taxes)
-        text     = text.encode(CODE_PAGE).ljust(40, chr(0x0))
-
-        params  = self.password + summa1 + summa2 + summa3 + summa4 \
-                                + discount + taxes + text
-        data, error, command = self.ask(command, params)
-        operator = ord(data[0])
-        odd = int5.unpack(data[1:6])
-        result = {
-            'operator': operator,
-            'odd': integer2money(odd),
-        }
-        return result
+        return self._execute(command, {
+            'cash': summa1, 'payment2': summa2, 'payment3': summa3,
+            'payment4': summa4, 'discount': discount, 'taxes': taxes,
+            'text': text,
+        }, integers=True, convert=_change)
 
 ## Implemented
     def _x8summa(self, command, summa, text='', taxes=[0,0,0,0]):
@@ -2179,7 +2637,7 @@ class KKT(BaseKKT):
         """
         command = command
 
-        summa = money2integer(summa)
+        summa = self.money2integer(summa)
 
         if summa < 0 or summa > 9999999999:
             raise KktError("Сумма должна быть в диапазоне между 0 и 9999999999")
@@ -2193,14 +2651,9 @@ class KKT(BaseKKT):
             if t not in range(0, 5):
                raise KktError("Налоги должны быть равны 0,1,2,3 или 4")
 
-        summa      = int5.pack(summa)
-        taxes      = digits2string(taxes)
-        text       = text.encode(CODE_PAGE).ljust(40, chr(0x0))
-
-        params  = self.password + summa + taxes + text
-        data, error, command = self.ask(command, params, quick=True)
-        operator = ord(data[0])
-        return operator
+        return self._execute(command, {
+            'summa': summa, 'taxes': taxes, 'text': text,
+        }, integers=True, quick=True)
 
 ## Implemented
     def x86(self, summa, text='', taxes=[0,0,0,0]):
@@ -2250,10 +2703,7 @@ class KKT(BaseKKT):
                 Порядковый номер оператора (1 байт) 1...30
 
         """
-        command = 0x88
-        data, error, command = self.ask(command)
-        operator = ord(data[0])
-        return operator
+        return self.execute(0x88)
 
 ## Implemented
     def x89(self):
@@ -2265,10 +2715,8 @@ class KKT(BaseKKT):
                 Порядковый номер оператора (1 байт) 1...30
                 Подытог чека (5 байт) 0000000000...9999999999
         """
-        command = 0x89
-        data, error, command = self.ask(command)
-        operator = ord(data[0])
-        return operator
+        return self._execute(0x89, {}, template=True,
+                             convert=attrgetter('operator'))
 
 ## Implemented
     def x8A(self, summa, text='', taxes=[0,0,0,0]):
@@ -2322,10 +2770,7 @@ class KKT(BaseKKT):
                 документа продажи, покупки, возврата продажи и 
                 возврата покупки.
         """
-        command = 0x8C
-        data, error, command = self.ask(command)
-        operator = ord(data[0])
-        return operator
+        return self.execute(0x8C)
 
 ## Implemented
     def x8D(self, document_type):
@@ -2341,17 +2786,14 @@ class KKT(BaseKKT):
                 Код ошибки (1 байт)
                 Порядковый номер оператора (1 байт) 1...30
         """
-        command = 0x8D
-
         if not document_type in range(4):
             raise KktError("Тип документа должен быть значением 0,1,2 или 3")
 
-        params  = self.password + chr(document_type)
-        data, error, command = self.ask(command, params)
-        operator = ord(data[0])
-        return operator
+        return self.execute(0x8D, document_type=document_type)
 
-    def x90(self):
+## Implemented
+    def x90(self, dispenser, hose, dose, department, cash, taxes=[0,0,0,0],
+            text=''):
         """ Формирование чека отпуска нефтепродуктов в режиме
             предоплаты заданной дозы
             Команда: 90H. Длина сообщения: 61 байт.
@@ -2372,9 +2814,12 @@ class KKT(BaseKKT):
                 Доза в миллилитрах (4 байта) 00000000...99999999
                 Доза в денежных единицах (5 байт) 0000000000...9999999999
         """
-        raise NotImplemented
+        return self.execute(0x90, dispenser=dispenser, hose=hose, dose=dose,
+                            department=department, cash=cash, taxes=taxes,
+                            text=text)
 
-    def x91(self):
+## Implemented
+    def x91(self, dispenser, hose, department, cash, taxes=[0,0,0,0], text=''):
         """ Формирование чека отпуска нефтепродуктов в режиме
                 предоплаты на заданную сумму
             Команда: 91H. Длина сообщения: 57 байт.
@@ -2394,9 +2839,12 @@ class KKT(BaseKKT):
                 Доза в миллилитрах (4 байта) 00000000...99999999
                 Доза в денежных единицах (5 байт) 0000000000...9999999999
         """
-        raise NotImplemented
+        return self.execute(0x91, dispenser=dispenser, hose=hose,
+                            department=department, cash=cash, taxes=taxes,
+                            text=text)
 
-    def x92(self):
+## Implemented
+    def x92(self, dispenser, hose, department, taxes=[0,0,0,0], text=''):
         """ Формирование чека коррекции при неполном отпуске
                 нефтепродуктов
             Команда: 92H. Длина сообщения: 52 байта.
@@ -2415,9 +2863,11 @@ class KKT(BaseKKT):
                 Недолитая доза в миллилитрах (4 байта) 00000000...99999999
                 Возвращаемая сумма (5 байт) 0000000000...9999999999
         """
-        raise NotImplemented
+        return self.execute(0x92, dispenser=dispenser, hose=hose,
+                            department=department, taxes=taxes, text=text)
 
-    def x93(self):
+## Implemented
+    def x93(self, dispenser, hose, dose):
         """ Задание дозы РК в миллилитрах
             Команда: 93H. Длина сообщения: 11 байт.
                 Пароль оператора (4 байта)
@@ -2431,9 +2881,10 @@ class KKT(BaseKKT):
                 Доза в миллилитрах (4 байта) 00000000...99999999
                 Доза в денежных единицах (5 байт) 0000000000...9999999999
         """
-        raise NotImplemented
+        return self.execute(0x93, dispenser=dispenser, hose=hose, dose=dose)
 
-    def x94(self):
+## Implemented
+    def x94(self, dispenser, hose, cash):
         """ Задание дозы РК в денежных единицах
             Команда: 94H. Длина сообщения: 12 байт.
                 Пароль оператора (4 байта)
@@ -2446,9 +2897,10 @@ class KKT(BaseKKT):
                 Доза в миллилитрах (4 байта) 00000000...99999999
                 Доза в денежных единицах (5 байт) 0000000000...9999999999
         """
-        raise NotImplemented
+        return self.execute(0x94, dispenser=dispenser, hose=hose, cash=cash)
 
-    def x95(self):
+## Implemented
+    def x95(self, dispenser, hose, department, taxes=[0,0,0,0], text=''):
         """ Продажа нефтепродуктов
             Команда: 95H. Длина сообщения: 52 байта.
                 Пароль оператора (4 байта)
@@ -2464,9 +2916,11 @@ class KKT(BaseKKT):
                 Код ошибки (1 байт)
                 Порядковый номер оператора (1 байт) 1...30
         """
-        raise NotImplemented
+        return self.execute(0x95, dispenser=dispenser, hose=hose,
+                            department=department, taxes=taxes, text=text)
 
-    def x96(self):
+## Implemented
+    def x96(self, dispenser, hose):
         """ Останов РК
             Команда: 96H. Длина сообщения: 7 байт.
                 Пароль оператора (4 байта)
@@ -2476,9 +2930,10 @@ class KKT(BaseKKT):
                 Код ошибки (1 байт)
                 Порядковый номер оператора (1 байт) 1...30
         """
-        raise NotImplemented
+        return self.execute(0x96, dispenser=dispenser, hose=hose)
 
-    def x97(self):
+## Implemented
+    def x97(self, dispenser, hose):
         """ Пуск РК
             Команда: 97H. Длина сообщения: 7 байт.
                 Пароль оператора (4 байта)
@@ -2488,9 +2943,10 @@ class KKT(BaseKKT):
                 Код ошибки (1 байт)
                 Порядковый номер оператора (1 байт) 1...30
         """
-        raise NotImplemented
+        return self.execute(0x97, dispenser=dispenser, hose=hose)
 
-    def x98(self):
+## Implemented
+    def x98(self, dispenser, hose):
         """ Сброс РК
             Команда: 98H. Длина сообщения: 7 байт.
                 Пароль оператора (4 байта)
@@ -2500,8 +2956,9 @@ class KKT(BaseKKT):
                 Код ошибки (1 байт)
                 Порядковый номер оператора (1 байт) 1...30
         """
-        raise NotImplemented
+        return self.execute(0x98, dispenser=dispenser, hose=hose)
 
+## Implemented
     def x99(self):
         """ Сброс всех ТРК
             Команда: 99H. Длина сообщения: 5 байт.
@@ -2510,9 +2967,10 @@ class KKT(BaseKKT):
                 Код ошибки (1 байт)
                 Порядковый номер оператора (1 байт) 1...30
         """
-        raise NotImplemented
+        return self.execute(0x99)
 
-    def x9A(self):
+## Implemented
+    def x9A(self, dispenser, hose, slowdown, price):
         """ Задание параметров РК
             Команда: 9AH. Длина сообщения: 13 байт.
                 Пароль оператора (4 байта)
@@ -2524,9 +2982,11 @@ class KKT(BaseKKT):
                 Код ошибки (1 байт)
                 Порядковый номер оператора (1 байт) 1...30
         """
-        raise NotImplemented
+        return self.execute(0x9A, dispenser=dispenser, hose=hose,
+                            slowdown=slowdown, price=price)
 
-    def x9B(self):
+## Implemented
+    def x9B(self, dispenser, hose):
         """ Считать литровый суммарный счетчик
             Команда: 9BH. Длина сообщения: 7 байт.
                 Пароль оператора (4 байта)
@@ -2537,9 +2997,10 @@ class KKT(BaseKKT):
                 Порядковый номер оператора (1 байт) 1...30
                 Суммарный счетчик в миллилитрах (4 байта) 00000000...99999999
         """
-        raise NotImplemented
+        return self.execute(0x9B, dispenser=dispenser, hose=hose)
 
-    def x9E(self):
+## Implemented
+    def x9E(self, dispenser, hose):
         """ Запрос текущей дозы РК
             Команда: 9EH. Длина сообщения: 7 байт.
                 Пароль оператора (4 байта)
@@ -2550,9 +3011,10 @@ class KKT(BaseKKT):
                 Порядковый номер оператора (1 байт) 1...30
                 Текущая доза в миллилитрах (4 байта) 00000000...99999999
         """
-        raise NotImplemented
+        return self.execute(0x9E, dispenser=dispenser, hose=hose)
 
-    def x9F(self):
+## Implemented
+    def x9F(self, dispenser, hose):
         """ Запрос состояния РК
             Команда: 9FH. Длина сообщения: 7 байт.
                 Пароль оператора (4 байта)
@@ -2602,9 +3064,10 @@ class KKT(BaseKKT):
                     09 – обрыв фаз датчика объѐма COS
                     FF – неисправность оборудования
         """
-        raise NotImplemented
+        return self.execute(0x9F, dispenser=dispenser, hose=hose)
 
-    def xA0(self):
+## Implemented
+    def xA0(self, report_type, department, first_date, last_date):
         """ Отчет ЭКЛЗ по отделам в заданном диапазоне дат
             Команда: A0H. Длина сообщения: 13 байт.
                 Пароль системного администратора (4 байта)
@@ -2617,9 +3080,12 @@ class KKT(BaseKKT):
 
             Примечание: Время выполнения команды – до 150 секунд.
         """
-        raise NotImplemented
+        return self.execute(0xA0, report_type=report_type,
+                            department=department, first_date=first_date,
+                            last_date=last_date)
 
-    def xA1(self):
+## Implemented
+    def xA1(self, report_type, department, first_session, last_session):
         """ Отчет ЭКЛЗ по отделам в заданном диапазоне номеров
                 смен
             Команда: A1H. Длина сообщения: 11 байт.
@@ -2633,9 +3099,12 @@ class KKT(BaseKKT):
 
             Примечание: Время выполнения команды – до 150 секунд.
         """
-        raise NotImplemented
+        return self.execute(0xA1, report_type=report_type,
+                            department=department, first_session=first_session,
+                            last_session=last_session)
 
-    def xA2(self):
+## Implemented
+    def xA2(self, report_type, first_date, last_date):
         """ Отчет ЭКЛЗ по закрытиям смен в заданном диапазоне дат
             Команда: A2H. Длина сообщения: 12 байт.
                 Пароль системного администратора (4 байта)
@@ -2647,9 +3116,11 @@ class KKT(BaseKKT):
 
             Примечание: Время выполнения команды – до 100 секунд.
         """
-        raise NotImplemented
+        return self.execute(0xA2, report_type=report_type,
+                            first_date=first_date, last_date=last_date)
 
-    def xA3(self):
+## Implemented
+    def xA3(self, report_type, first_session, last_session):
         """ Отчет ЭКЛЗ по закрытиям смен в заданном диапазоне
                 номеров смен
             Команда: A3H. Длина сообщения: 10 байт.
@@ -2662,7 +3133,9 @@ class KKT(BaseKKT):
 
             Примечание: Время выполнения команды – до 100 секунд.
         """
-        raise NotImplemented
+        return self.execute(0xA3, report_type=report_type,
+                            first_session=first_session,
+                            last_session=last_session)
 
 ## Implemented
     def xA4(self, number):
@@ -2675,12 +3148,11 @@ class KKT(BaseKKT):
 
             Примечание: Время выполнения команды – до 40 секунд.
         """
-        command = 0xBA
-        params  = self.admin_password + int2.pack(int(number))
-        data, error, command = self.ask(command, params)
-        return True
+        return self._execute(0xA4, {'session': int(number)},
+                             convert=lambda error: True)
 
-    def xA5(self):
+## Implemented
+    def xA5(self, kpk):
         """ Платежный документ из ЭКЛЗ по номеру КПК
             Команда: A5H. Длина сообщения: 9 байт.
                 Пароль системного администратора (4 байта)
@@ -2690,9 +3162,10 @@ class KKT(BaseKKT):
 
             Примечание: Время выполнения команды – до 40 секунд.
         """
-        raise NotImplemented
+        return self.execute(0xA5, kpk=kpk)
 
-    def xA6(self):
+## Implemented
+    def xA6(self, session):
         """ Контрольная лента из ЭКЛЗ по номеру смены
             Команда: A6H. Длина сообщения: 7 байт.
                 Пароль системного администратора (4 байта)
@@ -2702,7 +3175,7 @@ class KKT(BaseKKT):
 
             Примечание: Время выполнения команды – до 40 секунд.
         """
-        raise NotImplemented
+        return self.execute(0xA6, session=session)
 
 ## Implemented
     def xA7(self):
@@ -2713,11 +3186,9 @@ class KKT(BaseKKT):
             Ответ: A7H. Длина сообщения: 2 байта.
                 Код ошибки (1 байт)
         """
-        command = 0xA7
-        params  = self.admin_password
-        data, error, command = self.ask(command, params)
-        return error
+        return self.execute(0xA7)
 
+## Implemented
     def xA8(self):
         """ Итог активизации ЭКЛЗ
             Команда: A8H. Длина сообщения: 5 байт.
@@ -2725,12 +3196,13 @@ class KKT(BaseKKT):
             Ответ: A8H. Длина сообщения: 2 байта.
                 Код ошибки (1 байт)
         """
-        raise NotImplemented
+        return self.execute(0xA8)
         #~ command = 0xA8
         #~ params  = self.admin_password
         #~ data, error, command = self.ask(command, params)
         #~ return error
 
+## Implemented
     def xA9(self):
         """ Активизация ЭКЛЗ
             Команда: A9H. Длина сообщения: 5 байт.
@@ -2738,12 +3210,13 @@ class KKT(BaseKKT):
             Ответ: A9H. Длина сообщения: 2 байта.
                 Код ошибки (1 байт)
         """
-        raise NotImplemented
+        return self.execute(0xA9)
         #~ command = 0xA9
         #~ params  = self.admin_password
         #~ data, error, command = self.ask(command, params)
         #~ return error
 
+## Implemented
     def xAA(self):
         """ Закрытие архива ЭКЛЗ
             Команда: AAH. Длина сообщения: 5 байт.
@@ -2751,7 +3224,7 @@ class KKT(BaseKKT):
             Ответ: AAH. Длина сообщения: 2 байта.
                 Код ошибки (1 байт)
         """
-        raise NotImplemented
+        return self.execute(0xAA)
         #~ command = 0xAA
         #~ params  = self.admin_password
         #~ data, error, command = self.ask(command, params)
@@ -2766,11 +3239,9 @@ class KKT(BaseKKT):
                 Код ошибки (1 байт)
                 Номер ЭКЛЗ (5 байт) 0000000000...9999999999
         """
-        command = 0xAB
-        params  = self.admin_password
-        data, error, command = self.ask(command, params)
-        return int5.unpack(data[:5])
+        return self.execute(0xAB).eklz_number
 
+## Implemented
     def xAC(self):
         """ Прекращение ЭКЛЗ
             Команда: ACH. Длина сообщения: 5 байт.
@@ -2778,8 +3249,9 @@ class KKT(BaseKKT):
             Ответ: ACH. Длина сообщения: 2 байта.
                 Код ошибки (1 байт)
         """
-        raise NotImplemented
+        return self.execute(0xAC)
 
+## Implemented
     def xAD(self):
         """ Запрос состояния по коду 1 ЭКЛЗ
             Команда: ADH. Длина сообщения: 5 байт.
@@ -2798,11 +3270,9 @@ class KKT(BaseKKT):
                 «Драйвер ККТ: руководство программиста» версии А4.3 и 
                 выше.
         """
-        raise NotImplemented
-        command = 0xAD
-        params  = self.admin_password
-        data, error, command = self.ask(command, params)
+        return self.execute(0xAD)
 
+## Implemented
     def xAE(self):
         """ Запрос состояния по коду 2 ЭКЛЗ
             Команда: AEH. Длина сообщения: 5 байт.
@@ -2815,10 +3285,7 @@ class KKT(BaseKKT):
                 Итог возвратов продаж (6 байт) 000000000000...999999999999
                 Итог возвратов покупок (6 байт) 000000000000...999999999999
         """
-        raise NotImplemented
-        command = 0xAE
-        params  = self.admin_password
-        data, error, command = self.ask(command, params)
+        return self.execute(0xAE)
 
 ## Implemented
     def xAF(self):
@@ -2828,10 +3295,7 @@ class KKT(BaseKKT):
             Ответ: AFH. Длина сообщения: 2 байта.
                 Код ошибки (1 байт)
         """
-        command = 0xAF
-        params  = self.admin_password
-        data, error, command = self.ask(command, params)
-        return error
+        return self.execute(0xAF)
 
 ## Implemented
     def xB0(self, admin_password=None):
@@ -2843,11 +3307,10 @@ class KKT(BaseKKT):
                 Код ошибки (1 байт)
                 Порядковый номер оператора (1 байт) 1...30
         """
-        command = 0xB0
-        params  = self.admin_password
-        data, error, command = self.ask(command, params)
-        operator = ord(data[0])
-        return operator
+        if admin_password is None:
+            admin_password = self.admin_password
+        return self._execute(0xB0, {},
+                             password=password_prapare(admin_password))
 
 ## Implemented
     def xB1(self):
@@ -2858,11 +3321,7 @@ class KKT(BaseKKT):
                 Код ошибки (1 байт)
                 Строка символов в кодировке WIN1251 (18 байт)
         """
-        command = 0xB1
-        params  = self.admin_password
-        data, error, command = self.ask(command, params)
-        version = data[:18].decode(CODE_PAGE)
-        return version
+        return self.execute(0xB1).version
 
 ## Implemented
     def xB2(self):
@@ -2876,10 +3335,7 @@ class KKT(BaseKKT):
                 Команда работает только с отладочным комплектом ЭКЛЗ. 
                 Время выполнения команды – до 20 секунд.
         """
-        command = 0xB2
-        params  = self.admin_password
-        data, error, command = self.ask(command, params)
-        return error
+        return self.execute(0xB2)
 
 ## Implemented
     def xB3(self):
@@ -2890,12 +3346,10 @@ class KKT(BaseKKT):
                 Код ошибки (1 байт)
                 Строка или фрагмент отчета (см. спецификацию ЭКЛЗ) (X байт)
         """
-        command = 0xE1
-        params  = self.admin_password
-        data, error, command = self.ask(command, params)
-        return data.decode(CODE_PAGE)
+        return self.execute(0xB3).text
 
-    def xB4(self):
+## Implemented
+    def xB4(self, session):
         """ Запрос контрольной ленты ЭКЛЗ
             Команда: B4H. Длина сообщения: 7 байт.
                 Пароль системного администратора (4 байта)
@@ -2904,9 +3358,10 @@ class KKT(BaseKKT):
                 Код ошибки (1 байт)
                 Тип ККМ – строка символов в кодировке WIN1251 (16 байт)
         """
-        raise NotImplemented
+        return self.execute(0xB4, session=session)
 
-    def xB5(self):
+## Implemented
+    def xB5(self, kpk):
         """ Запрос документа ЭКЛЗ
             Команда: B5H. Длина сообщения: 9 байт.
                 Пароль системного администратора (4 байта)
@@ -2917,9 +3372,10 @@ class KKT(BaseKKT):
 
             Примечание: Время выполнения команды – до 40 секунд.
         """
-        raise NotImplemented
+        return self.execute(0xB5, kpk=kpk)
 
-    def xB6(self):
+## Implemented
+    def xB6(self, report_type, department, first_date, last_date):
         """ Запрос отчѐта ЭКЛЗ по отделам в заданном диапазоне дат
             Команда: B6H. Длина сообщения: 13 байт.
                 Пароль системного администратора (4 байта)
@@ -2934,9 +3390,12 @@ class KKT(BaseKKT):
             Примечание: Время выполнения команды – до 150 секунд.
 
         """
-        raise NotImplemented
+        return self.execute(0xB6, report_type=report_type,
+                            department=department, first_date=first_date,
+                            last_date=last_date)
 
-    def xB7(self):
+## Implemented
+    def xB7(self, report_type, department, first_session, last_session):
         """ Запрос отчѐта ЭКЛЗ по отделам в заданном диапазоне
                 номеров смен
             Команда: B7H. Длина сообщения: 11 байт.
@@ -2952,9 +3411,12 @@ class KKT(BaseKKT):
             Примечание: Время выполнения команды – до 150 секунд.
 
         """
-        raise NotImplemented
+        return self.execute(0xB7, report_type=report_type,
+                            department=department, first_session=first_session,
+                            last_session=last_session)
 
-    def xB8(self):
+## Implemented
+    def xB8(self, report_type, first_date, last_date):
         """ Запрос отчѐта ЭКЛЗ по закрытиям смен в заданном
                 диапазоне дат
             Команда: B8H. Длина сообщения: 12 байт.
@@ -2969,9 +3431,11 @@ class KKT(BaseKKT):
             Примечание: Время выполнения команды – до 100 секунд.
 
         """
-        raise NotImplemented
+        return self.execute(0xB8, report_type=report_type,
+                            first_date=first_date, last_date=last_date)
 
-    def xB9(self):
+## Implemented
+    def xB9(self, report_type, first_session, last_session):
         """ Запрос отчѐта ЭКЛЗ по закрытиям смен в заданном диапазоне
                 номеров смен.
             Команда: B9H. Длина сообщения: 10 байт.
@@ -2985,7 +3449,9 @@ class KKT(BaseKKT):
 
             Примечание: Время выполнения команды – до 100 секунд.
         """
-        raise NotImplemented
+        return self.execute(0xB9, report_type=report_type,
+                            first_session=first_session,
+                            last_session=last_session)
 
 ## Implemented
     def xBA(self, number):
@@ -2999,12 +3465,9 @@ class KKT(BaseKKT):
 
             Примечание: Время выполнения команды – до 40 секунд.
         """
-        command = 0xBA
-        params  = self.admin_password + int2.pack(int(number))
-        data, error, command = self.ask(command, params)
-        kkm = data.decode(CODE_PAGE)
-        return kkm
+        return self.execute(0xBA, session=int(number)).kkm
 
+## Implemented
     def xBB(self):
         """ Запрос итога активизации ЭКЛЗ
             Команда: BBH. Длина сообщения: 5 байт.
@@ -3013,9 +3476,10 @@ class KKT(BaseKKT):
                 Код ошибки (1 байт)
                 Тип ККМ – строка символов в кодировке WIN1251 (16 байт)
         """
-        raise NotImplemented
+        return self.execute(0xBB)
 
-    def xBC(self):
+## Implemented
+    def xBC(self, code):
         """ Вернуть ошибку ЭКЛЗ
             Команда: BCH. Длина сообщения: 6 байт.
                 Пароль системного администратора (4 байта)
@@ -3026,9 +3490,10 @@ class KKT(BaseKKT):
             Примечание:
                 Команда работает только с отладочным комплектом ЭКЛЗ.
         """
-        raise NotImplemented
+        return self.execute(0xBC, code=code)
 
-    def xC0(self):
+## Implemented
+    def xC0(self, line, data):
         """ Загрузка графики
             Команда: C0H. Длина сообщения: 46 байт.
                 Пароль оператора (4 байта)
@@ -3038,9 +3503,10 @@ class KKT(BaseKKT):
                 Код ошибки (1 байт)
                 Порядковый номер оператора (1 байт) 1...30
         """
-        raise NotImplemented
+        return self.execute(0xC0, line=line, data=data)
 
-    def xC1(self):
+## Implemented
+    def xC1(self, first_line, last_line):
         """ Печать графики
             Команда: C1H. Длина сообщения: 7 байт.
                 Пароль оператора (4 байта)
@@ -3050,7 +3516,7 @@ class KKT(BaseKKT):
                 Код ошибки (1 байт)
                 Порядковый номер оператора (1 байт) 1...30
         """
-        raise NotImplemented
+        return self.execute(0xC1, first_line=first_line, last_line=last_line)
 
     def xC2(self,barcode):
         """ Печать штрих-кода
@@ -3061,15 +3527,10 @@ class KKT(BaseKKT):
                 Код ошибки (1 байт)
                 Порядковый номер оператора (1 байт) 1...30
         """
-        command = 0xC2
-        barcode = int5.pack(barcode)
-
-        params  = self.password + barcode
-        data, error, command = self.ask(command, params)
-        operator = ord(data[0])
-        return operator
+        return self.execute(0xC2, barcode=barcode)
 
-    def xC3(self):
+## Implemented
+    def xC3(self, first_line, last_line):
         """ Печать расширенной графики
             Команда: C3H. Длина сообщения: 9 байт.
                 Пароль оператора (4 байта)
@@ -3079,9 +3540,10 @@ class KKT(BaseKKT):
                 Код ошибки (1 байт)
                 Порядковый номер оператора (1 байт) 1...30
         """
-        raise NotImplemented
+        return self.execute(0xC3, first_line=first_line, last_line=last_line)
 
-    def xC4(self):
+## Implemented
+    def xC4(self, line, data):
         """ Загрузка расширенной графики
             Команда: C4H. Длина сообщения: 47 байт.
                 Пароль оператора (4 байта)
@@ -3091,9 +3553,10 @@ class KKT(BaseKKT):
                 Код ошибки (1 байт)
                 Порядковый номер оператора (1 байт) 1...30
         """
-        raise NotImplemented
+        return self.execute(0xC4, line=line, data=data)
 
-    def xC5(self):
+## Implemented
+    def xC5(self, repeat, data):
         """ Печать линии
             Команда: C5H. Длина сообщения: X + 7 байт.
                 Пароль оператора (4 байта)
@@ -3103,8 +3566,9 @@ class KKT(BaseKKT):
                 Код ошибки (1 байт)
                 Порядковый номер оператора (1 байт) 1...30
         """
-        raise NotImplemented
+        return self.execute(0xC5, repeat=repeat, data=data)
 
+## Implemented
     def xC6(self):
         """ Суточный отчет с гашением в буфер
             Команда: C6H. Длина сообщения: 5 байт.
@@ -3113,8 +3577,9 @@ class KKT(BaseKKT):
                 Код ошибки (1 байт)
                 Порядковый номер оператора (1 байт) 1...30
         """
-        raise NotImplemented
+        return self.execute(0xC6)
 
+## Implemented
     def xC7(self):
         """ Распечатать отчет из буфера
             Команда: C7H. Длина сообщения: 5 байт.
@@ -3123,8 +3588,9 @@ class KKT(BaseKKT):
                 Код ошибки (1 байт)
                 Порядковый номер оператора (1 байт) 1...30
         """
-        raise NotImplemented
+        return self.execute(0xC7)
 
+## Implemented
     def xC8(self):
         """ Запрос количества строк в буфере печати
             Команда: C8H. Длина сообщения: 5 байт.
@@ -3134,9 +3600,10 @@ class KKT(BaseKKT):
                 Количество строк в буфере печати(2 байта)
                 Количество напечатанных строк (2 байта)
         """
-        raise NotImplemented
+        return self.execute(0xC8)
 
-    def xC9(self):
+## Implemented
+    def xC9(self, line):
         """ Получить строку буфера печати
             Команда: C9H. Длина сообщения: 7 байт.
                 Пароль оператора (4 байта)
@@ -3145,7 +3612,7 @@ class KKT(BaseKKT):
                 Код ошибки (1 байт)
                 Данные строки (n байт)
         """
-        raise NotImplemented
+        return self.execute(0xC9, line=line)
 
 ## Implemented
     def xCA(self):
@@ -3155,10 +3622,9 @@ class KKT(BaseKKT):
             Ответ: CAH. Длина сообщения: 2 байта
                 Код ошибки (1 байт)
         """
-        command = 0xCA
-        data, error, command = self.ask(command)
-        return error
+        return self.execute(0xCA)
 
+## Implemented
     def xD0(self):
         """ Запрос состояния ФР IBM длинный
             Команда: D0H. Длина сообщения: 5 байт.
@@ -3189,8 +3655,9 @@ class KKT(BaseKKT):
                         4 – Смена открыта 24 часа закончились (0 – нет,
                             1 – есть)
         """
-        raise NotImplemented
+        return self.execute(0xD0)
 
+## Implemented
     def xD1(self):
         """ Запрос состояния ФР IBM короткий
             Команда: D1H. Длина сообщения: 5 байт.
@@ -3203,9 +3670,10 @@ class KKT(BaseKKT):
                     Битовое поле (назначение бит):
                         0 – Буфер печати ККТ пуст (0 –нет, 1 – есть)
         """
-        raise NotImplemented
+        return self.execute(0xD1)
 
-    def xDD(self):
+## Implemented
+    def xDD(self, data_type, block, data):
         """ Загрузка данных
             Команда: DDH. Длина сообщения: 71 байт.
                 Пароль (4 байта)
@@ -3216,9 +3684,10 @@ class KKT(BaseKKT):
                 Код ошибки (1 байт)
                 Порядковый номер оператора (1 байт) 1...30
         """
-        raise NotImplemented
+        return self.execute(0xDD, data_type=data_type, block=block, data=data)
 
-    def xDE(self):
+## Implemented
+    def xDE(self, barcode_type, length, first_block, parameters, align):
         """ Печать многомерного штрих -кода
             Команда: DEH. Длина сообщения: 15 байт.
                 Пароль (4 байта)
@@ -3237,7 +3706,9 @@ class KKT(BaseKKT):
 
             Примечание: тип штрих-кода смотрите в документации
         """
-        raise NotImplemented
+        return self.execute(0xDE, barcode_type=barcode_type, length=length,
+                            first_block=first_block, parameters=parameters,
+                            align=align)
 
 ## Implemented
     def xE0(self):
@@ -3251,10 +3722,7 @@ class KKT(BaseKKT):
                 Команда открывает смену в ФП и переводит ККТ в режим 
                 «Открытой смены».
         """
-        command = 0xE0
-        data, error, command = self.ask(command)
-        operator = ord(data[0])
-        return operator
+        return self.execute(0xE0)
 
 ## Implemented
     def xE1(self):
@@ -3272,10 +3740,7 @@ class KKT(BaseKKT):
                 бумаги.
 
         """
-        command = 0xE1
-        data, error, command = self.ask(command)
-        operator = ord(data[0])
-        return operator
+        return self.execute(0xE1)
 
 ## Implemented
     def xE2(self):
@@ -3290,10 +3755,7 @@ class KKT(BaseKKT):
                 Команда переводит ККТ в режим, позволяющий печатать
                 произвольные текстовые строки.
         """
-        command = 0xE2
-        data, error, command = self.ask(command)
-        operator = ord(data[0])
-        return operator
+        return self.execute(0xE2)
 
 ## Implemented
     def xE3(self):
@@ -3308,12 +3770,10 @@ class KKT(BaseKKT):
                 Команда выводит ККТ в режим, позволяющий печатать
                 произвольные текстовые строки.
         """
-        command = 0xE3
-        data, error, command = self.ask(command)
-        operator = ord(data[0])
-        return operator
+        return self.execute(0xE3)
 
-    def xE4(self):
+## Implemented
+    def xE4(self, number, text=''):
         """ Печать Реквизита
             Команда: E4H. Длина сообщения: 7-206 байт.
                 Пароль оператора (4 байта)
@@ -3330,8 +3790,9 @@ class KKT(BaseKKT):
                 разделителем строк 0х0А. Может быть напечатано не 
                 более 4-х строк.
         """
-        raise NotImplemented
+        return self.execute(0xE4, number=number, text=text)
 
+## Implemented
     def xE5(self):
         """ Запрос состояния купюроприемника
             Команда: E5H. Длина сообщения: 5 байт.
@@ -3346,9 +3807,10 @@ class KKT(BaseKKT):
                     на последнюю команду
                 Poll (подробности в описании протокола CCNet)
         """
-        raise NotImplemented
+        return self.execute(0xE5)
 
-    def xE6(self):
+## Implemented
+    def xE6(self, register_set):
         """ Запрос регистров купюроприемника
             Команда: E6H. Длина сообщения: 6 байт.
                 Пароль оператора (4 байта)
@@ -3362,7 +3824,7 @@ class KKT(BaseKKT):
                 Количество купюр типа 0.23(4*24=96 байт) 24 4-х байтный
                     целых числа.
         """
-        raise NotImplemented
+        return self.execute(0xE6, register_set=register_set)
 
 ## Implemented
     def xE7(self):
@@ -3373,11 +3835,7 @@ class KKT(BaseKKT):
                 Код ошибки(1 байт)
                 Порядковый номер оператора (1 байт) 29, 30
         """
-        command = 0xE7
-        params = self.admin_password
-        data, error, command = self.ask(command, params)
-        operator = ord(data[0])
-        return operator
+        return self.execute(0xE7)
 
 ## Implemented
     def xE8(self, tax_password):
@@ -3387,12 +3845,10 @@ class KKT(BaseKKT):
             Ответ: E8H. Длина сообщения: 2 байта.
                 Код ошибки(1 байт)
         """
-        command = 0xE8
-        params = tax_password
-        data, error, command = self.ask(command, params)
-        return error
+        return self.execute(0xE8, tax_password=tax_password)
 
-    def xF0(self):
+## Implemented
+    def xF0(self, position):
         """ Управление заслонкой
             Команда: F0H. Длина сообщения: 6 байт.
                 Пароль оператора (4 байта)
@@ -3401,9 +3857,10 @@ class KKT(BaseKKT):
                 Код ошибки (1 байт)
                 Порядковый номер оператора (1 байт) 1...30
         """
-        raise NotImplemented
+        return self.execute(0xF0, position=position)
 
-    def xF1(self):
+## Implemented
+    def xF1(self, grab):
         """ Выдать чек
             Команда: F1H. Длина сообщения: 6 байт.
                 Пароль оператора (4 байта)
@@ -3415,9 +3872,10 @@ class KKT(BaseKKT):
                 Код ошибки (1 байт)
                 Порядковый номер оператора (1 байт) 1...30
         """
-        raise NotImplemented
+        return self.execute(0xF1, grab=grab)
 
-    def xF3(self):
+## Implemented
+    def xF3(self, password, new_password):
         """ Установить пароль ЦТО
             Команда: F3H. Длина сообщения: 9 байт.
                 Пароль ЦТО (4 байта)
@@ -3425,7 +3883,7 @@ class KKT(BaseKKT):
             Ответ: F3H. Длина сообщения: 2 байта.
                 Код ошибки (1 байт)
         """
-        raise NotImplemented
+        return self.execute(0xF3, password=password, new_password=new_password)
 
 ## Implemented
     def xFC(self):
@@ -3450,21 +3908,11 @@ class KKT(BaseKKT):
             Примечание:
                 Команда предназначена для идентификации устройств.
         """
-        command = 0xFC
-
-        data, error, command = self.ask(command, without_password=True)
-        result = {
-            'device_type':         ord(data[0]),
-            'device_subtype':      ord(data[1]),
-            'protocol_version':    ord(data[2]),
-            'protocol_subversion': ord(data[3]),
-            'device_model':        ord(data[4]),
-            'device_language':     ord(data[5]),
-            'device_name': data[6:].decode(CODE_PAGE),
-        }
-        return result
+        return self._execute(0xFC, {}, convert=lambda result:
+                             DeviceType(*result.values()))
 
-    def xFD(self):
+## Implemented
+    def xFD(self, port, data):
         """ Управление портом дополнительного внешнего устройства
             Команда: FDH. Длина сообщения: (6+X) байт.
                 Пароль оператора (4 байта)
@@ -3480,7 +3928,7 @@ class KKT(BaseKKT):
                 функционирования которого не требуется формирования 
                 ответного сообщения.
         """
-        raise NotImplemented
+        return self.execute(0xFD, port=port, data=data)
 
 
 
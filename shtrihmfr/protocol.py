@@ -26,8 +26,14 @@ from __future__ import unicode_literals
 VERSION = (1, 1) # 2012-05-28
 __version__ = '%s.%s' % VERSION
 
-__all__ = ('KKT_COMMANDS', 'BUGS', 'KKT_MODES', 'KKT_SUBMODES',
-    'KKT_FLAGS', 'FP_FLAGS')
+__all__ = ('KKT_COMMANDS', 'KKT_DURATIONS', 'DEFAULT_DURATION', 'BUGS',
+    'KKT_MODES', 'KKT_SUBMODES', 'KKT_FLAGS', 'FP_FLAGS', 'IBM_FLAGS',
+    'IBM_SHORT_FLAGS', 'BAUDRATES', 'MONEY_REGISTERS', 'OPERATION_REGISTERS',
+    'KKT_PRIORITIES', 'DEFAULT_PRIORITY', 'PRIORITY_NAMES',
+    'PRIORITY_RECEIPT', 'PRIORITY_OPERATOR', 'PRIORITY_TELEMETRY',
+    'PRIORITY_REPORT', 'BUG_ACTIONS', 'DEFAULT_BUG_ACTION',
+    'RECOVERABLE_ACTIONS', 'ACTION_RETRY', 'ACTION_CONTINUE', 'ACTION_CANCEL',
+    'ACTION_ABORT')
 
 ### Команды ККТ ###
 #                     Разрядность денежных величин
@@ -105,7 +111,7 @@ KKT_COMMANDS = {
     0x51: 'Выплата',
     0x52: 'Печать клише',
     0x53: 'Конец документа',
-    0x53: 'Печать рекламного текста',
+    0x54: 'Печать рекламного текста',
 
     0x60: 'Ввод заводского номера',
     0x61: 'Инициализация ФП',
@@ -233,6 +239,122 @@ KKT_COMMANDS = {
     0xFD: 'Управление портом дополнительного внешнего устройства',
 }
 
+### Длительность выполнения команд ###
+# Ожидаемое и максимальное время (сек.) от отправки команды до начала
+# ответа ККТ: (ожидаемое, максимальное). Максимумы для отчётов ЭКЛЗ
+# взяты из примечаний к командам, остальные - оценочные. Команды,
+# которых нет в таблице, выполняются не дольше DEFAULT_DURATION.
+
+DEFAULT_DURATION = (0.5, 15)
+
+_QUERY  = (0.05, 1)   # Запросы состояния и данных без печати
+_EKLZ   = (0.2, 5)    # Запросы к ЭКЛЗ без печати
+_PRINT  = (0.3, 10)   # Печать строки, операции чека
+_REPORT = (2, 40)     # Суточные отчёты и отчёты из буфера
+
+KKT_DURATIONS = {
+    0x01: _QUERY, 0x02: _QUERY, 0x03: _QUERY, 0x0F: _QUERY,
+    0x10: _QUERY, 0x11: _QUERY, 0x13: _QUERY, 0x14: (0.1, 2),
+    0x15: _QUERY, 0x16: (1, 20),
+    0x12: _PRINT, 0x17: _PRINT, 0x18: _PRINT, 0x19: _PRINT,
+    0x1A: _QUERY, 0x1B: _QUERY, 0x1D: _QUERY, 0x1F: _QUERY,
+    0x25: _PRINT, 0x26: _QUERY, 0x29: _PRINT,
+    0x2C: _REPORT, 0x2D: _QUERY, 0x2E: _QUERY, 0x2F: _PRINT,
+
+    0x40: _REPORT, 0x41: _REPORT, 0x42: _REPORT, 0x43: _REPORT,
+    0x50: _PRINT, 0x51: _PRINT, 0x52: _PRINT, 0x53: _PRINT,
+    0x54: _PRINT,
+
+    0x61: (5, 100), 0x62: _QUERY, 0x63: _QUERY, 0x64: _QUERY,
+    0x65: (2, 40), 0x66: (5, 100), 0x67: (5, 100), 0x69: _QUERY,
+
+    0x80: _PRINT, 0x81: _PRINT, 0x82: _PRINT, 0x83: _PRINT,
+    0x84: _PRINT, 0x85: (0.5, 15), 0x86: _PRINT, 0x87: _PRINT,
+    0x88: _PRINT, 0x89: _PRINT, 0x8A: _PRINT, 0x8B: _PRINT,
+    0x8C: (0.5, 15), 0x8D: _PRINT,
+
+    0x90: (5, 100), 0x91: (5, 100), 0x92: (5, 100),
+    0x9B: _QUERY, 0x9E: _QUERY, 0x9F: _QUERY,
+
+    0xA0: (10, 150), 0xA1: (10, 150), 0xA2: (5, 100), 0xA3: (5, 100),
+    0xA4: (2, 40), 0xA5: (2, 40), 0xA6: (2, 40), 0xA7: _EKLZ,
+    0xA8: (2, 40), 0xAB: _EKLZ, 0xAD: _EKLZ, 0xAE: _EKLZ,
+
+    0xB0: _PRINT, 0xB1: _EKLZ, 0xB2: (2, 20), 0xB3: _EKLZ,
+    0xB4: _EKLZ, 0xB5: (2, 40), 0xB6: (10, 150), 0xB7: (10, 150),
+    0xB8: (5, 100), 0xB9: (5, 100), 0xBA: (2, 40), 0xBB: _EKLZ,
+    0xBC: _EKLZ,
+
+    0xC1: _PRINT, 0xC2: _PRINT, 0xC5: _PRINT, 0xC6: _REPORT,
+    0xC7: _REPORT, 0xC8: _QUERY, 0xC9: _QUERY, 0xCA: _QUERY,
+
+    0xD0: _QUERY, 0xD1: _QUERY,
+
+    0xE0: _PRINT, 0xE5: _QUERY, 0xE6: _QUERY,
+    0xFC: _QUERY,
+}
+
+### Приоритеты команд ###
+# Порядок выполнения команд, ждущих в очереди обработчика устройства
+# (см. worker.DeviceWorker): меньше - раньше. Команды, которых нет в
+# таблице, считаются действиями кассира (DEFAULT_PRIORITY).
+
+PRIORITY_RECEIPT   = 0  # Операции чека покупателя
+PRIORITY_OPERATOR  = 1  # Действия кассира: смена, внесение, отчёты
+PRIORITY_TELEMETRY = 2  # Фоновые запросы состояния
+PRIORITY_REPORT    = 3  # Выгрузка отчётов и данных
+
+DEFAULT_PRIORITY = PRIORITY_OPERATOR
+
+PRIORITY_NAMES = {
+    PRIORITY_RECEIPT:   'receipt',
+    PRIORITY_OPERATOR:  'operator',
+    PRIORITY_TELEMETRY: 'telemetry',
+    PRIORITY_REPORT:    'report',
+}
+
+_RECEIPT   = PRIORITY_RECEIPT
+_TELEMETRY = PRIORITY_TELEMETRY
+_BULK      = PRIORITY_REPORT
+
+KKT_PRIORITIES = {
+    0x01: _BULK, 0x02: _BULK, 0x0F: _TELEMETRY,
+    0x10: _TELEMETRY, 0x11: _TELEMETRY, 0x12: _RECEIPT, 0x15: _TELEMETRY,
+    0x17: _RECEIPT, 0x18: _RECEIPT, 0x1A: _TELEMETRY, 0x1B: _TELEMETRY,
+    0x1D: _TELEMETRY, 0x1F: _TELEMETRY,
+    0x25: _RECEIPT, 0x26: _TELEMETRY, 0x2C: _BULK, 0x2D: _TELEMETRY,
+    0x2E: _TELEMETRY, 0x2F: _RECEIPT,
+
+    0x62: _TELEMETRY, 0x63: _TELEMETRY, 0x64: _TELEMETRY,
+    0x66: _BULK, 0x67: _BULK, 0x69: _TELEMETRY,
+
+    0x70: _RECEIPT, 0x71: _RECEIPT, 0x72: _RECEIPT, 0x73: _RECEIPT,
+    0x74: _RECEIPT, 0x75: _RECEIPT, 0x76: _RECEIPT, 0x77: _RECEIPT,
+    0x7D: _RECEIPT,
+
+    0x80: _RECEIPT, 0x81: _RECEIPT, 0x82: _RECEIPT, 0x83: _RECEIPT,
+    0x84: _RECEIPT, 0x85: _RECEIPT, 0x86: _RECEIPT, 0x87: _RECEIPT,
+    0x88: _RECEIPT, 0x89: _RECEIPT, 0x8A: _RECEIPT, 0x8B: _RECEIPT,
+    0x8D: _RECEIPT,
+
+    0x9E: _TELEMETRY, 0x9F: _TELEMETRY,
+
+    0xA0: _BULK, 0xA1: _BULK, 0xA2: _BULK, 0xA3: _BULK, 0xA4: _BULK,
+    0xA5: _BULK, 0xA6: _BULK, 0xAB: _TELEMETRY, 0xAD: _TELEMETRY,
+    0xAE: _TELEMETRY,
+
+    0xB0: _RECEIPT, 0xB1: _TELEMETRY, 0xB3: _BULK, 0xB4: _BULK,
+    0xB5: _BULK, 0xB6: _BULK, 0xB7: _BULK, 0xB8: _BULK, 0xB9: _BULK,
+    0xBA: _BULK,
+
+    0xC2: _RECEIPT, 0xC8: _TELEMETRY, 0xC9: _BULK,
+
+    0xD0: _TELEMETRY, 0xD1: _TELEMETRY,
+
+    0xE4: _RECEIPT, 0xE5: _TELEMETRY, 0xE6: _TELEMETRY,
+    0xFC: _TELEMETRY,
+}
+
 ### Коды ошибок ###
 # В первом параметре значений указывается источник возникновения ошибки:
 # фискальная память (ФП), электронная контрольная лента защищѐнная
@@ -419,6 +541,108 @@ BUGS = {
     0xCA: ('ККТ', 'Температура вне условий эксплуатации'),
 }
 
+### Классы ошибок ###
+# Каждому коду BUGS соответствует пара (категория, действие). Действие -
+# рекомендуемый способ восстановления:
+#   ACTION_RETRY    - повторить команду после паузы (ККТ занята
+#                     предыдущей командой);
+#   ACTION_CONTINUE - выполнить продолжение печати (B0H) и повторить;
+#   ACTION_CANCEL   - аннулировать открытый чек (88H);
+#   ACTION_ABORT    - прервать операцию: нужен кассир, другие параметры
+#                     или обслуживание ККТ.
+# Первые два действия BaseKKT.ask может выполнить сам (см.
+# auto_recover) в пределах крайнего срока и запаса повторов вызова,
+# остальные только сообщаются в KktError.action.
+#
+# Сбои связи с ФП и ЭКЛЗ повторять нельзя: запись в ФП могла пройти, и
+# повтор фискальной операции зарегистрирует её дважды. Режим вывода
+# данных ФП (06H) ожиданием не снимается - только командой 03H или
+# окончанием выдачи. После восстановления ОЗУ (93H) открытый документ
+# и режим ККТ могли быть сброшены: команду нельзя повторять, не
+# проверив состояние.
+
+ACTION_RETRY    = 'retry'
+ACTION_CONTINUE = 'continue'
+ACTION_CANCEL   = 'cancel'
+ACTION_ABORT    = 'abort'
+
+# Действия, которые выполняются автоматически
+RECOVERABLE_ACTIONS = (ACTION_RETRY, ACTION_CONTINUE)
+
+_NONE     = ('none', None)                 # Ошибок нет
+_BUSY     = ('busy', ACTION_RETRY)         # ККТ временно занята
+_LINK     = ('link', ACTION_ABORT)         # Сбой связи с ФП или ЭКЛЗ
+_PAUSED   = ('print', ACTION_CONTINUE)     # Печать приостановлена
+_PAPER    = ('paper', ACTION_ABORT)        # Нет ленты или документа
+_DOCUMENT = ('document', ACTION_CANCEL)    # Мешает открытый чек
+_STATE    = ('state', ACTION_ABORT)        # Не тот режим или смена
+_PARAMS   = ('params', ACTION_ABORT)       # Неверные параметры команды
+_MONEY    = ('money', ACTION_ABORT)        # Суммы и накопления
+_ACCESS   = ('access', ACTION_ABORT)       # Пароль и блокировка
+_FISCAL   = ('fiscal', ACTION_ABORT)       # ФП и ЭКЛЗ: ресурс, регистрация
+_DEVICE   = ('hardware', ACTION_ABORT)     # Неисправность оборудования
+
+# Класс кодов, которых нет в таблице
+DEFAULT_BUG_ACTION = ('unknown', ACTION_ABORT)
+
+BUG_ACTIONS = {
+    0x00: _NONE, 0x01: _DEVICE, 0x02: _DEVICE, 0x03: _DEVICE,
+    0x04: _PARAMS, 0x05: _PARAMS, 0x06: _STATE, 0x07: _PARAMS,
+    0x08: _PARAMS, 0x09: _PARAMS, 0x0A: _PARAMS, 0x0B: _DEVICE,
+
+    0x11: _FISCAL, 0x12: _FISCAL, 0x13: _FISCAL, 0x14: _FISCAL,
+    0x15: _STATE, 0x16: _STATE, 0x17: _PARAMS, 0x18: _PARAMS,
+    0x19: _PARAMS, 0x1A: _FISCAL, 0x1B: _FISCAL, 0x1C: _DEVICE,
+    0x1D: _DEVICE, 0x1E: _FISCAL, 0x1F: _DEVICE,
+
+    0x20: _MONEY, 0x21: _MONEY, 0x22: _PARAMS, 0x23: _FISCAL,
+    0x24: _FISCAL, 0x25: _FISCAL, 0x26: _DEVICE, 0x27: _DEVICE,
+    0x2B: _STATE, 0x2C: _STATE, 0x2D: _MONEY, 0x2E: _MONEY,
+
+    0x30: _ACCESS, 0x32: _STATE, 0x33: _PARAMS, 0x34: _PARAMS,
+    0x35: _PARAMS, 0x36: _PARAMS, 0x37: _PARAMS, 0x38: _DEVICE,
+    0x39: _DEVICE, 0x3A: _MONEY, 0x3B: _MONEY, 0x3C: _FISCAL,
+    0x3D: _STATE, 0x3E: _MONEY, 0x3F: _MONEY,
+
+    0x40: _PARAMS, 0x41: _PARAMS, 0x42: _PARAMS, 0x43: _PARAMS,
+    0x44: _PARAMS, 0x45: _MONEY, 0x46: _MONEY, 0x47: _MONEY,
+    0x48: _PARAMS, 0x49: _STATE, 0x4A: _DOCUMENT, 0x4B: _DOCUMENT,
+    0x4C: _MONEY, 0x4D: _MONEY, 0x4E: _STATE, 0x4F: _ACCESS,
+
+    0x50: _BUSY, 0x51: _MONEY, 0x52: _MONEY, 0x53: _MONEY,
+    0x54: _MONEY, 0x55: _STATE, 0x56: _STATE, 0x57: _FISCAL,
+    0x58: _PAUSED, 0x59: _DOCUMENT, 0x5A: _MONEY, 0x5B: _PARAMS,
+    0x5C: _DEVICE, 0x5D: _PARAMS, 0x5E: _PARAMS, 0x5F: _PARAMS,
+
+    0x60: _PARAMS, 0x61: _PARAMS, 0x62: _PARAMS, 0x63: _PARAMS,
+    0x64: _DEVICE, 0x65: _MONEY, 0x66: _MONEY, 0x67: _LINK,
+    0x68: _MONEY, 0x69: _MONEY, 0x6A: _LINK, 0x6B: _PAPER,
+    0x6C: _PAPER, 0x6D: _MONEY, 0x6E: _MONEY, 0x6F: _MONEY,
+
+    0x70: _FISCAL, 0x71: _DEVICE, 0x72: _STATE, 0x73: _STATE,
+    0x74: _DEVICE, 0x75: _DEVICE, 0x76: _DEVICE, 0x77: _DEVICE,
+    0x78: _FISCAL, 0x79: _FISCAL, 0x7A: _PARAMS, 0x7B: _DEVICE,
+    0x7C: _PARAMS, 0x7D: _PARAMS, 0x7E: _PARAMS, 0x7F: _PARAMS,
+
+    0x80: _LINK, 0x81: _LINK, 0x82: _LINK, 0x83: _LINK,
+    0x84: _MONEY, 0x85: _MONEY, 0x86: _MONEY, 0x87: _MONEY,
+    0x88: _MONEY, 0x89: _MONEY, 0x8A: _PARAMS, 0x8B: _PARAMS,
+    0x8C: _PARAMS, 0x8D: _PARAMS, 0x8E: _PARAMS, 0x8F: _FISCAL,
+
+    0x90: _PARAMS, 0x91: _PARAMS, 0x92: _PARAMS, 0x93: _STATE,
+    0x94: _DOCUMENT, 0x95: _DEVICE,
+
+    0xA0: _LINK, 0xA1: _DEVICE, 0xA2: _PARAMS, 0xA3: _FISCAL,
+    0xA4: _DEVICE, 0xA5: _DEVICE, 0xA6: _FISCAL, 0xA7: _FISCAL,
+    0xA8: _FISCAL, 0xA9: _PARAMS, 0xAA: _FISCAL,
+
+    0xB0: _PARAMS, 0xB1: _PARAMS, 0xB2: _FISCAL,
+
+    0xC0: _STATE, 0xC1: _STATE, 0xC2: _DEVICE, 0xC3: _FISCAL,
+    0xC4: _FISCAL, 0xC5: _PAPER, 0xC6: _PAPER, 0xC7: _STATE,
+    0xC8: _DEVICE, 0xC9: _BUSY, 0xCA: _DEVICE,
+}
+
 blank_dict = {}
 ### Режимы ККТ ###
 # Режим ККМ – одно из состояний ККМ, в котором она может находиться.
@@ -519,3 +743,90 @@ FP_FLAGS = {
     6: {0:'Смена в ФП закрыта',            1:'Смена в ФП открыта'},
     7: {0:'24 часа в ФП не кончились',     1:'24 часа в ФП кончились'},
 }
+
+### Флаги состояния ФР IBM (команды D0H и D1H) ###
+IBM_FLAGS = {
+    0: 'Сериализована',
+    1: 'Фискализирована',
+    2: 'Активизирована ЭКЛЗ',
+    3: 'Смена открыта',
+    4: 'Смена открыта 24 часа закончились',
+}
+
+IBM_SHORT_FLAGS = {
+    0: 'Буфер печати ККТ пуст',
+}
+
+### Скорости обмена ###
+# Коды скорости в командах 14H и 15H соответствуют индексам.
+BAUDRATES = (2400, 4800, 9600, 19200, 38400, 57600, 115200)
+
+
+### Регистры ###
+# Названия регистров для пакетного чтения (см. registers). Регистры
+# отделов, скидок, оплат и налогов идут по четыре - по типам операций
+# в порядке _OPERATIONS; денежные регистры чека (0...119) повторяются
+# для смены со сдвигом 121. Регистры без названия зависят от модели ККТ
+# и называются по номеру.
+_OPERATIONS = ('приходов', 'расходов', 'возвратов прихода',
+               'возвратов расхода')
+_PAYMENTS   = ('наличными', 'типом 2', 'типом 3', 'типом 4')
+_TAXES      = ('А', 'Б', 'В', 'Г')
+
+
+def _registers(start, template, groups, suffix):
+    """ Названия регистров по группам из четырёх операций """
+    names = {}
+    number = start
+    for group in groups:
+        for operation in _OPERATIONS:
+            names[number] = template % {'group': group,
+                                        'operation': operation} + suffix
+            number += 1
+    return names
+
+
+def _money_registers(start, suffix):
+    names = _registers(start, 'Накопление %(operation)s в %(group)d отдел',
+                       range(1, 17), suffix)
+    names.update(_registers(start + 64, 'Накопление скидок с %(operation)s',
+                            ('',), suffix))
+    names.update(_registers(start + 68, 'Накопление надбавок на %(operation)s',
+                            ('',), suffix))
+    names.update(_registers(start + 72,
+        'Накопление оплат %(group)s с %(operation)s', _PAYMENTS, suffix))
+    names.update(_registers(start + 88,
+        'Накопление налога %(group)s с %(operation)s', _TAXES, suffix))
+    names.update(_registers(start + 104,
+        'Оборот по налогу %(group)s с %(operation)s', _TAXES, suffix))
+    return names
+
+
+MONEY_REGISTERS = _money_registers(0, ' в чеке')
+MONEY_REGISTERS.update(_money_registers(121, ' за смену'))
+MONEY_REGISTERS.update({
+    241: 'Накопление наличности в кассе',
+    242: 'Накопление внесений за смену',
+    243: 'Накопление выплат за смену',
+    244: 'Необнуляемая сумма до фискализации',
+    245: 'Сумма продаж в смене из ЭКЛЗ',
+    246: 'Сумма покупок в смене из ЭКЛЗ',
+    247: 'Сумма возвратов продаж в смене из ЭКЛЗ',
+    248: 'Сумма возвратов покупок в смене из ЭКЛЗ',
+})
+
+OPERATION_REGISTERS = _registers(0,
+    'Количество %(operation)s в %(group)d отдел', range(1, 17), ' в чеке')
+OPERATION_REGISTERS.update(_registers(64,
+    'Количество %(operation)s в %(group)d отдел', range(1, 17), ' за смену'))
+OPERATION_REGISTERS.update(_registers(144,
+    'Количество чеков %(operation)s', ('',), ''))
+OPERATION_REGISTERS.update(_registers(148,
+    'Номер чека %(operation)s', ('',), ''))
+OPERATION_REGISTERS.update({
+    152: 'Сквозной номер документа',
+    153: 'Количество внесений денежных сумм за смену',
+    154: 'Количество выплат денежных сумм за смену',
+    155: 'Количество внесений денежных сумм',
+    156: 'Количество выплат денежных сумм',
+})
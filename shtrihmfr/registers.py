@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+#
+#  Copyright 2013 Grigoriy Kramarenko <root@rosix.ru>
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+#  MA 02110-1301, USA.
+#
+#
+
+### Пакетное чтение регистров ###
+#
+# Денежные (1AH, 6 байт) и операционные (1BH, 2 байта) регистры
+# запрашиваются по одному, но их содержимое складывается подряд в
+# один буфер и разбирается за один проход: через NumPy, если он
+# установлен, иначе через Integer.unpack_many (одно большое целое или
+# один struct на весь буфер). Результат - вектор Registers с номерами
+# и названиями регистров.
+
+from __future__ import unicode_literals
+
+from .protocol import MONEY_REGISTERS, OPERATION_REGISTERS
+from .utils import Integer
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+__all__ = ('MONEY_REGISTER_SIZE', 'OPERATION_REGISTER_SIZE',
+    'decode_registers', 'Registers', 'money_registers',
+    'operation_registers')
+
+
+# Размер содержимого регистров в ответах 1AH и 1BH
+MONEY_REGISTER_SIZE     = 6
+OPERATION_REGISTER_SIZE = 2
+
+_INTEGERS = {}
+
+
+def decode_registers(buffer, size, count=None):
+    """ Разбирает count подряд идущих беззнаковых целых по size байт
+        (little-endian) из буфера. С NumPy возвращает numpy.ndarray
+        (uint64), иначе - список целых.
+    """
+    if count is None:
+        count = len(buffer) // size
+    if numpy is not None:
+        raw = numpy.frombuffer(buffer, dtype=numpy.uint8, count=count * size)
+        shifts  = numpy.arange(0, size * 8, 8, dtype=numpy.uint64)
+        weights = numpy.left_shift(numpy.uint64(1), shifts)
+        return raw.reshape(count, size).astype(numpy.uint64).dot(weights)
+    integer = _INTEGERS.get(size)
+    if integer is None:
+        integer = _INTEGERS[size] = Integer(size)
+    return integer.unpack_many(buffer, count)
+
+
+class Registers(object):
+    """ Вектор регистров ККТ.
+
+        values - содержимое регистров в порядке numbers (список или
+        numpy.ndarray), для денежных регистров - в копейках. По номеру
+        регистра (registers[241]) значение возвращается преобразованным
+        функцией convert (например, KKT.integer2money).
+    """
+    __slots__ = ('numbers', 'values', 'names', 'convert', '_index')
+
+    def __init__(self, numbers, values, names=None, convert=None):
+        self.numbers = tuple(numbers)
+        self.values  = values
+        self.names   = names or {}
+        self.convert = convert
+        self._index  = dict([ (n, i) for i, n in enumerate(self.numbers) ])
+
+    def __repr__(self):
+        return '<%s %d>' % (self.__class__.__name__, len(self.numbers))
+
+    def __len__(self):
+        return len(self.numbers)
+
+    def __iter__(self):
+        return iter(self.numbers)
+
+    def __contains__(self, number):
+        return number in self._index
+
+    def __getitem__(self, number):
+        value = int(self.values[self._index[number]])
+        if self.convert is not None:
+            return self.convert(value)
+        return value
+
+    def name(self, number):
+        """ Название регистра """
+        return self.names.get(number) or 'Регистр %d' % number
+
+    def items(self):
+        """ Список (номер, название, значение) """
+        return [ (number, self.name(number), self[number])
+                 for number in self.numbers ]
+
+    def to_dict(self):
+        """ Словарь {номер: значение} """
+        return dict([ (number, self[number]) for number in self.numbers ])
+
+
+def money_registers(numbers, buffer, convert=None):
+    """ Вектор денежных регистров из буфера с их содержимым """
+    values = decode_registers(buffer, MONEY_REGISTER_SIZE, len(numbers))
+    return Registers(numbers, values, MONEY_REGISTERS, convert)
+
+
+def operation_registers(numbers, buffer):
+    """ Вектор операционных регистров из буфера с их содержимым """
+    values = decode_registers(buffer, OPERATION_REGISTER_SIZE, len(numbers))
+    return Registers(numbers, values, OPERATION_REGISTERS)
@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+#
+#  Copyright 2013 Grigoriy Kramarenko <root@rosix.ru>
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+#  MA 02110-1301, USA.
+#
+#
+
+### Типы ответов команд ###
+#
+# Разобранный ответ - компактный объект с __slots__ вместо словаря:
+# поля доступны как атрибуты (state.kkt_mode) и, для совместимости,
+# как ключи (state['kkt_mode']). Метод to_dict() возвращает обычный
+# словарь.
+#
+# Поля, перечисленные в lazy, вычисляются лениво: в слоте хранится
+# _Lazy с функцией и исходными значениями, а при первом обращении к
+# полю - вычисленное значение. Создание _Lazy и первое обращение через
+# дескриптор сами стоят дороже даты или таблицы флагов, поэтому частые
+# ответы 10H и 11H разбираются сразу (см. decoders).
+
+from __future__ import unicode_literals
+
+
+__all__ = ('Response', 'response_type', 'ShortState', 'State', 'FPTotals',
+    'Document', 'Change', 'ExchangeParams', 'DeviceType')
+
+
+class _Lazy(object):
+    """ Отложенное значение поля """
+    __slots__ = ('func', 'args')
+
+    def __init__(self, func, *args):
+        self.func = func
+        self.args = args
+
+
+def lazy(func, *args):
+    """ Отложенное значение поля для конструктора ответа """
+    return _Lazy(func, *args)
+
+
+class LazyField(object):
+    """ Поле, вычисляемое при первом обращении. Значение хранится в
+        слоте с тем же именем и префиксом '_'.
+    """
+
+    def __init__(self, slot):
+        self.slot = slot
+
+    def __get__(self, obj, cls=None):
+        if obj is None:
+            return self
+        value = self.slot.__get__(obj, cls)
+        if value.__class__ is _Lazy:
+            value = value.func(*value.args)
+            self.slot.__set__(obj, value)
+        return value
+
+    def __set__(self, obj, value):
+        self.slot.__set__(obj, value)
+
+
+class Response(object):
+    """ Базовый класс ответа. Поля перечислены в _fields, значения
+        передаются в конструктор по порядку или по именам (конструктор
+        создаётся в response_type).
+    """
+    __slots__ = ()
+    _fields = ()
+
+    def to_dict(self):
+        """ Возвращает ответ в виде словаря """
+        return dict([ (name, getattr(self, name)) for name in self._fields ])
+
+    # Доступ как к словарю
+
+    def __getitem__(self, key):
+        if key in self._fields:
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if key not in self._fields:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __contains__(self, key):
+        return key in self._fields
+
+    def __iter__(self):
+        return iter(self._fields)
+
+    def __len__(self):
+        return len(self._fields)
+
+    def get(self, key, default=None):
+        if key in self._fields:
+            return getattr(self, key)
+        return default
+
+    def keys(self):
+        return list(self._fields)
+
+    def values(self):
+        return [ getattr(self, name) for name in self._fields ]
+
+    def items(self):
+        return [ (name, getattr(self, name)) for name in self._fields ]
+
+    def __eq__(self, other):
+        if isinstance(other, Response):
+            other = other.to_dict()
+        if isinstance(other, dict):
+            return self.to_dict() == other
+        return NotImplemented
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        if result is NotImplemented:
+            return result
+        return not result
+
+    __hash__ = None
+
+    def __repr__(self):
+        return '%s(%s)' % (self.__class__.__name__, ', '.join([
+            '%s=%r' % (name, getattr(self, name)) for name in self._fields ]))
+
+    def __reduce__(self):
+        return (self.__class__, tuple(self.values()))
+
+
+# Конструктор класса ответа: присваивание слотам без циклов и
+# дескрипторов, как в collections.namedtuple
+_INIT = """def __init__(self, {args}):
+    {body}
+"""
+
+
+def response_type(name, fields, lazy=(), doc=None):
+    """ Создаёт класс ответа с полями fields. Поля из lazy принимают
+        отложенные значения (см. lazy()) и вычисляются при первом
+        обращении.
+    """
+    fields = tuple(fields)
+    slots = tuple([ '_' + field if field in lazy else field
+                    for field in fields ])
+    if fields:
+        source = _INIT.format(args=', '.join(fields), body='\n    '.join([
+            'self.%s = %s' % (slot, field)
+            for slot, field in zip(slots, fields) ]))
+    else:
+        source = _INIT.format(args='', body='pass').replace('self, ', 'self')
+    namespace = {}
+    exec(source, namespace)
+    attrs = {'__slots__': slots, '_fields': fields, '__doc__': doc,
+             '__init__': namespace['__init__']}
+    cls = type(str(name), (Response,), attrs)
+    for field in lazy:
+        setattr(cls, field, LazyField(getattr(cls, '_' + field)))
+    return cls
+
+
+# Ответы команд, разбираемых вручную (см. decoders и KKT)
+
+ShortState = response_type('ShortState', (
+    'error', 'operator', 'kkt_flags', 'kkt_mode', 'kkt_submode',
+    'voltage_battery', 'voltage_power', 'fp_error', 'eklz_error',
+    'operations', 'reserve'),
+    doc=' Короткий запрос состояния ФР (10H) ')
+
+State = response_type('State', (
+    'error', 'operator', 'kkt_version', 'kkt_build', 'kkt_date', 'hall',
+    'document', 'kkt_flags', 'kkt_mode', 'kkt_submode', 'kkt_port',
+    'fp_version', 'fp_build', 'fp_date', 'date', 'time', 'fp_flags',
+    'serial_number', 'last_closed_session', 'fp_free_records',
+    'registration_count', 'registration_left', 'inn'),
+    doc=' Запрос состояния ФР (11H) ')
+
+FPTotals = response_type('FPTotals', (
+    'operator', 'sale', 'purchase', 'refuse_sale', 'refuse_purchase'),
+    doc=' Запрос суммы записей в ФП (62H) ')
+
+Document = response_type('Document', ('operator', 'document'),
+    doc=' Внесение и выплата (50H, 51H) ')
+
+Change = response_type('Change', ('operator', 'odd'),
+    doc=' Закрытие чека (77H, 85H): сдача ')
+
+ExchangeParams = response_type('ExchangeParams', ('bod', 'timeout'),
+    doc=' Чтение параметров обмена (15H) ')
+
+DeviceType = response_type('DeviceType', (
+    'device_type', 'device_subtype', 'protocol_version',
+    'protocol_subversion', 'device_model', 'device_language',
+    'device_name'), doc=' Получить тип устройства (FCH) ')
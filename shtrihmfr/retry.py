@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+#
+#  Copyright 2013 Grigoriy Kramarenko <root@rosix.ru>
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+#  MA 02110-1301, USA.
+#
+#
+
+### Политика повторов обмена ###
+#
+# Все циклы ожидания и повторов одного вызова ask (check_state,
+# check_STX, clear, read) используют общий объект Retry: один крайний
+# срок на весь вызов и один запас повторов. Вложенные циклы поэтому не
+# умножают друг друга, и худшее время вызова известно заранее: крайний
+# срок плюс тайм-аут одного чтения порта.
+#
+#     kkt = KKT(retry_policy=RetryPolicy(deadline=3, attempts=5))
+
+from __future__ import unicode_literals
+import random
+import time
+
+from .conf import (MAX_ATTEMPT, MIN_TIMEOUT, STX_TIMEOUT, RETRY_DEADLINE,
+                   RETRY_MAX_BACKOFF, RETRY_MULTIPLIER, RETRY_JITTER)
+
+
+__all__ = ('RetryPolicy', 'Retry')
+
+
+class RetryPolicy(object):
+    """ Параметры повторов обмена с ККТ.
+
+        deadline    - общий крайний срок вызова (сек.); None - время
+                      выполнения команды (см. BaseKKT.get_duration);
+        attempts    - запас повторов на вызов;
+        backoff     - пауза перед первым повтором (сек.), каждая
+                      следующая больше в multiplier раз, но не больше
+                      max_backoff;
+        jitter      - случайное отклонение паузы (доля), чтобы
+                      устройства на одном сервере не повторяли запросы
+                      одновременно.
+    """
+    deadline    = RETRY_DEADLINE
+    attempts    = MAX_ATTEMPT
+    backoff     = MIN_TIMEOUT
+    max_backoff = RETRY_MAX_BACKOFF
+    multiplier  = RETRY_MULTIPLIER
+    jitter      = RETRY_JITTER
+
+    def __init__(self, deadline=None, attempts=None, backoff=None,
+                 max_backoff=None, multiplier=None, jitter=None):
+        if deadline is not None:
+            self.deadline = deadline
+        if attempts is not None:
+            self.attempts = attempts
+        if backoff is not None:
+            self.backoff = backoff
+        if max_backoff is not None:
+            self.max_backoff = max_backoff
+        if multiplier is not None:
+            self.multiplier = multiplier
+        if jitter is not None:
+            self.jitter = jitter
+
+    def __repr__(self):
+        return '<%s deadline=%s attempts=%s>' % (self.__class__.__name__,
+            self.deadline, self.attempts)
+
+    def delay(self, attempt):
+        """ Пауза перед повтором номер attempt (с нуля) """
+        delay = min(self.backoff * self.multiplier ** attempt,
+                    self.max_backoff)
+        if self.jitter:
+            delay *= 1 + self.jitter * (2 * random.random() - 1)
+        return delay
+
+    def start(self, timeout=None):
+        """ Начинает вызов: возвращает Retry с крайним сроком deadline
+            или, если он не задан, timeout (по умолчанию STX_TIMEOUT)
+            секунд.
+        """
+        if self.deadline is not None:
+            timeout = self.deadline
+        elif timeout is None:
+            timeout = STX_TIMEOUT
+        return Retry(self, timeout)
+
+
+class Retry(object):
+    """ Состояние повторов одного вызова: крайний срок и остаток
+        запаса повторов.
+    """
+    __slots__ = ('policy', 'deadline', 'left', 'attempt')
+
+    def __init__(self, policy, timeout):
+        self.policy   = policy
+        self.deadline = time.time() + timeout
+        self.left     = policy.attempts
+        self.attempt  = 0
+
+    def __repr__(self):
+        return '<%s %.3f s, %d left>' % (self.__class__.__name__,
+            self.remaining(), self.left)
+
+    def remaining(self):
+        """ Время до крайнего срока (сек.), не меньше нуля """
+        return max(self.deadline - time.time(), 0)
+
+    def expired(self):
+        """ Признак наступления крайнего срока """
+        return time.time() >= self.deadline
+
+    def backoff(self):
+        """ Следующая пауза, не дольше остатка времени """
+        delay = self.policy.delay(self.attempt)
+        self.attempt += 1
+        return min(delay, self.remaining())
+
+    def take(self):
+        """ Расходует один повтор и возвращает паузу перед ним (сек.)
+            или None, если повторы кончились или наступил крайний срок.
+            Для асинхронного клиента, который выжидает паузу сам.
+        """
+        if self.left <= 0 or self.expired():
+            return None
+        self.left -= 1
+        return self.backoff()
+
+    def sleep(self):
+        """ Расходует один повтор и выжидает паузу перед ним.
+            Возвращает False, если повторы кончились или наступил
+            крайний срок - тогда повторять больше нельзя.
+        """
+        delay = self.take()
+        if delay is None:
+            return False
+        time.sleep(delay)
+        return not self.expired()
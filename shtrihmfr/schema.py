@@ -0,0 +1,598 @@
+# -*- coding: utf-8 -*-
+#
+#  Copyright 2013 Grigoriy Kramarenko <root@rosix.ru>
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+#  MA 02110-1301, USA.
+#
+#
+
+### Схема команд ККТ ###
+#
+# Для каждой команды описаны пароль, поля параметров и поля ответа
+# (без кода ошибки). При импорте схема компилируется: для запроса и
+# ответа каждой команды создаётся один struct.Struct и список
+# преобразователей полей, так что упаковка и разбор не зависят от
+# ручной нарезки строк.
+#
+# Пароль команды:
+#     'operator' - пароль оператора (KKT.password);
+#     'admin'    - пароль системного администратора (KKT.admin_password);
+#     'zero'     - пароль «0»;
+#     None       - без пароля, либо пароли передаются полями 'pwd'.
+#
+# Поле - кортеж (имя, тип) или (имя, тип, количество) для массива.
+# Типы полей:
+#     'u1'...'u8' - целое без знака длиной 1...8 байт;
+#     's2'        - целое со знаком длиной 2 байта;
+#     'm2'...'m8' - денежная величина (см. money2integer), в ответе float
+#                   или тип KKT.money_type;
+#     'sm2'       - денежная величина со знаком длиной 2 байта;
+#     'c5'        - количество (3 знака после запятой), в ответе как 'm';
+#     'date'      - дата ДД-ММ-ГГ (3 байта), datetime.date;
+#     'time'      - время ЧЧ-ММ-СС (3 байта), datetime.time;
+#     'hm'        - время ЧЧ-ММ (2 байта), datetime.time;
+#     'pwd'       - пароль (4 байта), см. password_prapare;
+#     'tN'        - текст в CODE_PAGE длиной N байт, дополняется нулями;
+#     'bN'        - байты длиной N;
+#     'fkkt'      - флаги ККТ (2 байта), в ответе список названий;
+#     'ffp'       - флаги ФП (1 байт), в ответе список состояний;
+#     'fibm'      - флаги состояния ФР IBM команды D0H (1 байт);
+#     'fibms'     - флаги состояния ФР IBM команды D1H (1 байт);
+#     't*', 'b*'  - текст или байты до конца сообщения (только последним).
+
+from __future__ import unicode_literals
+import datetime
+import struct
+
+from .conf import *
+from .decoders import kkt_flags, fp_flags, ibm_flags, ibm_short_flags
+from .protocol import KKT_COMMANDS
+from .responses import response_type, lazy
+from .utils import *
+
+
+__all__ = ('SCHEMA', 'COMMANDS', 'Command', 'Layout')
+
+
+OPERATOR   = [('operator', 'u1')]
+TAXES      = ('taxes', 'u1', 4)
+TEXT       = ('text', 't40')
+FUEL       = [('dispenser', 'u1'), ('hose', 'u1')]
+DOSE       = OPERATOR + [('dose', 'u4'), ('summa', 'm5')]
+KKM_TYPE   = [('kkm', 't16')]
+FP_RANGE   = [('first_date', 'date'), ('last_date', 'date'),
+              ('first_session', 'u2'), ('last_session', 'u2')]
+FISCAL     = [('registration', 'u1'), ('registration_left', 'u1'),
+              ('last_closed_session', 'u2'), ('date', 'date')]
+OPERATION  = [('count', 'c5'), ('price', 'm5'), ('department', 'u1'),
+              TAXES, TEXT]
+DISCOUNT   = [('summa', 'm5'), TAXES, TEXT]
+PAYMENTS   = [('cash', 'm5'), ('payment2', 'm5'), ('payment3', 'm5'),
+              ('payment4', 'm5')]
+DUPLICATES = [('document_type', 'u1'), ('duplicate_type', 'u1'),
+              ('duplicate_count', 'u1'), ('duplicate_offsets', 'u1', 5)]
+SESSIONS   = [('report_type', 'u1'), ('first_session', 'u2'),
+              ('last_session', 'u2')]
+DATES      = [('report_type', 'u1'), ('first_date', 'date'),
+              ('last_date', 'date')]
+
+# Код команды: (пароль, параметры, ответ)
+SCHEMA = {
+    0x01: ('admin', [('device', 'u1')], [('blocks', 'u2')]),
+    0x02: ('admin', [], [('device', 'u1'), ('block', 'u2'), ('data', 'b32')]),
+    0x03: ('admin', [], []),
+    0x0D: (None, [('old_password', 'pwd'), ('new_password', 'pwd'),
+                  ('rnm', 'u7'), ('inn', 'u6')], FISCAL),
+    0x0E: ('zero', [('serial_number', 'u7')], []),
+    0x0F: ('operator', [], [('serial_number', 'u7'), ('rnm', 'u7')]),
+
+    0x10: ('operator', [], OPERATOR + [
+        ('kkt_flags', 'fkkt'), ('kkt_mode', 'u1'), ('kkt_submode', 'u1'),
+        ('operations_low', 'u1'), ('voltage_battery', 'u1'),
+        ('voltage_power', 'u1'), ('fp_error', 'u1'), ('eklz_error', 'u1'),
+        ('operations_high', 'u1'), ('reserve', 'b3')]),
+    0x11: ('operator', [], OPERATOR + [
+        ('kkt_version', 'b2'), ('kkt_build', 'u2'), ('kkt_date', 'date'),
+        ('hall', 'u1'), ('document', 'u2'), ('kkt_flags', 'fkkt'),
+        ('kkt_mode', 'u1'), ('kkt_submode', 'u1'), ('kkt_port', 'u1'),
+        ('fp_version', 'b2'), ('fp_build', 'u2'), ('fp_date', 'date'),
+        ('date', 'date'), ('time', 'time'), ('fp_flags', 'ffp'),
+        ('serial_number', 'u4'), ('last_closed_session', 'u2'),
+        ('fp_free_records', 'u2'), ('registration_count', 'u1'),
+        ('registration_left', 'u1'), ('inn', 'u6')]),
+    0x12: ('operator', [('flags', 'u1'), ('text', 't20')], OPERATOR),
+    0x13: ('operator', [], OPERATOR),
+    0x14: ('admin', [('port', 'u1'), ('bod_code', 'u1'),
+                     ('timeout_code', 'u1')], []),
+    0x15: ('admin', [('port', 'u1')],
+                    [('bod_code', 'u1'), ('timeout_code', 'u1')]),
+    0x16: (None, [], []),
+    0x17: ('operator', [('flags', 'u1'), TEXT], OPERATOR),
+    0x18: ('operator', [('text', 't30'), ('number', 'u2')],
+                       OPERATOR + [('document', 'u2')]),
+    0x19: ('operator', [('period', 'u1')], OPERATOR),
+    0x1A: ('operator', [('register', 'u1')], OPERATOR + [('value', 'u6')]),
+    0x1B: ('operator', [('register', 'u1')], OPERATOR + [('value', 'u2')]),
+    0x1C: ('admin', [('license', 'u5')], []),
+    0x1D: ('admin', [], [('license', 'u5')]),
+    0x1E: ('admin', [('table', 'u1'), ('row', 'u2'), ('field', 'u1'),
+                     ('value', 'b*')], []),
+    0x1F: ('admin', [('table', 'u1'), ('row', 'u2'), ('field', 'u1')],
+                    [('value', 'b*')]),
+
+    0x20: ('admin', [('point', 'u1')], []),
+    0x21: ('admin', [('time', 'time')], []),
+    0x22: ('admin', [('date', 'date')], []),
+    0x23: ('admin', [('date', 'date')], []),
+    0x24: ('admin', [], []),
+    0x25: ('operator', [('cut', 'u1')], OPERATOR),
+    0x26: ('admin', [('font', 'u1')], [
+        ('print_width', 'u2'), ('char_width', 'u1'), ('char_height', 'u1'),
+        ('font_count', 'u1')]),
+    0x27: ('admin', [], []),
+    0x28: ('operator', [('drawer', 'u1')], OPERATOR),
+    0x29: ('operator', [('flags', 'u1'), ('row_count', 'u1')], OPERATOR),
+    0x2A: ('operator', [('direction', 'u1')], OPERATOR),
+    0x2B: ('operator', [], OPERATOR),
+    0x2C: ('admin', [], OPERATOR),
+    0x2D: ('admin', [('table', 'u1')], [
+        ('name', 't40'), ('row_count', 'u2'), ('field_count', 'u1')]),
+    0x2E: ('admin', [('table', 'u1'), ('field', 'u1')], [
+        ('name', 't40'), ('field_type', 'u1'), ('size', 'u1'),
+        ('limits', 'b*')]),
+    0x2F: ('operator', [('flags', 'u1'), ('font', 'u1'), TEXT], OPERATOR),
+
+    0x40: ('admin', [], OPERATOR),
+    0x41: ('admin', [], OPERATOR),
+    0x42: ('admin', [], OPERATOR),
+    0x43: ('admin', [], OPERATOR),
+
+    0x50: ('operator', [('summa', 'm5')], OPERATOR + [('document', 'u2')]),
+    0x51: ('operator', [('summa', 'm5')], OPERATOR + [('document', 'u2')]),
+    0x52: ('operator', [], OPERATOR),
+    0x53: ('operator', [('advertising', 'u1')], OPERATOR),
+    0x54: ('operator', [], OPERATOR),
+
+    0x60: ('zero', [('serial_number', 'u4')], []),
+    0x61: (None, [], []),
+    0x62: ('admin', [('after', 'u1')], OPERATOR + [
+        ('sale', 'm8'), ('purchase', 'm6'), ('refuse_sale', 'm6'),
+        ('refuse_purchase', 'm6')]),
+    0x63: ('admin', [], OPERATOR + [('record_type', 'u1'), ('date', 'date')]),
+    0x64: (None, [('tax_password', 'pwd')], FP_RANGE),
+    0x65: (None, [('old_password', 'pwd'), ('new_password', 'pwd'),
+                  ('rnm', 'u5'), ('inn', 'u6')], FISCAL),
+    0x66: (None, [('tax_password', 'pwd')] + DATES, FP_RANGE),
+    0x67: (None, [('tax_password', 'pwd')] + SESSIONS, FP_RANGE),
+    0x68: (None, [('tax_password', 'pwd')], []),
+    0x69: (None, [('tax_password', 'pwd'), ('registration', 'u1')], [
+        ('password', 'b4'), ('rnm', 'u5'), ('inn', 'u6'),
+        ('session', 'u2'), ('date', 'date')]),
+
+    0x70: ('operator', DUPLICATES + [
+        ('fonts', 'u1', 4), ('rows', 'u1', 4), ('offsets', 'u1', 5)],
+        OPERATOR + [('document', 'u2')]),
+    0x71: ('operator', DUPLICATES, OPERATOR + [('document', 'u2')]),
+    0x72: ('operator', [
+        ('count_format', 'u1'), ('line_count', 'u1'), ('rows', 'u1', 4),
+        ('fonts', 'u1', 6), ('widths', 'u1', 5), ('offsets', 'u1', 4),
+        ('first_line', 'u1')] + OPERATION, OPERATOR),
+    0x73: ('operator', [('first_line', 'u1')] + OPERATION, OPERATOR),
+    0x74: ('operator', [
+        ('line_count', 'u1'), ('rows', 'u1', 3), ('fonts', 'u1', 3),
+        ('widths', 'u1', 2), ('offsets', 'u1', 3), ('operation_type', 'u1'),
+        ('first_line', 'u1')] + DISCOUNT, OPERATOR),
+    0x75: ('operator', [('operation_type', 'u1'), ('first_line', 'u1')]
+                       + DISCOUNT, OPERATOR),
+    0x76: ('operator', [
+        ('line_count', 'u1'), ('total_line', 'u1'), ('rows', 'u1', 16),
+        ('fonts', 'u1', 33), ('widths', 'u1', 26), ('offsets', 'u1', 33),
+        ('first_line', 'u1')] + PAYMENTS + [
+        ('discount', 'm2'), TAXES, TEXT], OPERATOR + [('odd', 'm5')]),
+    0x77: ('operator', [('first_line', 'u1')] + PAYMENTS + [
+        ('discount', 'm2'), TAXES, TEXT], OPERATOR + [('odd', 'm5')]),
+    0x78: ('operator', [('width', 'u2'), ('length', 'u2'),
+                        ('orientation', 'u1'), ('intervals', 'u1', 199)],
+                       OPERATOR),
+    0x79: ('operator', [], OPERATOR),
+    0x7A: ('operator', [('line', 'u1'), ('text', 't*')], OPERATOR),
+    0x7B: ('operator', [('line', 'u1')], OPERATOR),
+    0x7C: ('operator', [], OPERATOR),
+    0x7D: ('operator', [('clear', 'u1'), ('print_type', 'u1')], OPERATOR),
+    0x7E: ('operator', [('width', 'u2'), ('length', 'u2'),
+                        ('orientation', 'u1'), ('interval', 'u1')], OPERATOR),
+
+    0x80: ('operator', OPERATION, OPERATOR),
+    0x81: ('operator', OPERATION, OPERATOR),
+    0x82: ('operator', OPERATION, OPERATOR),
+    0x83: ('operator', OPERATION, OPERATOR),
+    0x84: ('operator', OPERATION, OPERATOR),
+    0x85: ('operator', PAYMENTS + [('discount', 'sm2'), TAXES, TEXT],
+                       OPERATOR + [('odd', 'm5')]),
+    0x86: ('operator', DISCOUNT, OPERATOR),
+    0x87: ('operator', DISCOUNT, OPERATOR),
+    0x88: ('operator', [], OPERATOR),
+    0x89: ('operator', [], OPERATOR + [('summa', 'm5')]),
+    0x8A: ('operator', DISCOUNT, OPERATOR),
+    0x8B: ('operator', DISCOUNT, OPERATOR),
+    0x8C: ('operator', [], OPERATOR),
+    0x8D: ('operator', [('document_type', 'u1')], OPERATOR),
+
+    0x90: ('operator', FUEL + [('dose', 'u4'), ('department', 'u1'),
+                               ('cash', 'm5'), TAXES, TEXT], DOSE),
+    0x91: ('operator', FUEL + [('department', 'u1'), ('cash', 'm5'),
+                               TAXES, TEXT], DOSE),
+    0x92: ('operator', FUEL + [('department', 'u1'), TAXES, TEXT], DOSE),
+    0x93: ('operator', FUEL + [('dose', 'u4')], DOSE),
+    0x94: ('operator', FUEL + [('cash', 'm5')], DOSE),
+    0x95: ('operator', FUEL + [('department', 'u1'), TAXES, TEXT], OPERATOR),
+    0x96: ('operator', FUEL, OPERATOR),
+    0x97: ('operator', FUEL, OPERATOR),
+    0x98: ('operator', FUEL, OPERATOR),
+    0x99: ('operator', [], OPERATOR),
+    0x9A: ('operator', FUEL + [('slowdown', 'u3'), ('price', 'm3')],
+                       OPERATOR),
+    0x9B: ('operator', FUEL, OPERATOR + [('counter', 'u4')]),
+    0x9E: ('operator', FUEL, OPERATOR + [('dose', 'u4')]),
+    0x9F: ('operator', FUEL, OPERATOR + [
+        ('dose', 'u4'), ('target_dose', 'u4'), ('summa', 'm5'),
+        ('target_summa', 'm5'), ('slowdown', 'u3'), ('price', 'm3'),
+        ('status', 'u1'), ('flags', 'u1'), ('failure', 'u1')]),
+
+    0xA0: ('admin', [('report_type', 'u1'), ('department', 'u1'),
+                     ('first_date', 'date'), ('last_date', 'date')], []),
+    0xA1: ('admin', [('report_type', 'u1'), ('department', 'u1'),
+                     ('first_session', 'u2'), ('last_session', 'u2')], []),
+    0xA2: ('admin', DATES, []),
+    0xA3: ('admin', SESSIONS, []),
+    0xA4: ('admin', [('session', 'u2')], []),
+    0xA5: ('admin', [('kpk', 'u4')], []),
+    0xA6: ('admin', [('session', 'u2')], []),
+    0xA7: ('admin', [], []),
+    0xA8: ('admin', [], []),
+    0xA9: ('admin', [], []),
+    0xAA: ('admin', [], []),
+    0xAB: ('admin', [], [('eklz_number', 'u5')]),
+    0xAC: ('admin', [], []),
+    0xAD: ('admin', [], [
+        ('summa', 'm5'), ('date', 'date'), ('time', 'hm'), ('kpk', 'u4'),
+        ('eklz_number', 'u5'), ('flags', 'u1')]),
+    0xAE: ('admin', [], [
+        ('session', 'u2'), ('sale', 'm6'), ('purchase', 'm6'),
+        ('refuse_sale', 'm6'), ('refuse_purchase', 'm6')]),
+    0xAF: ('admin', [], []),
+
+    0xB0: ('operator', [], OPERATOR),
+    0xB1: ('admin', [], [('version', 't18')]),
+    0xB2: ('admin', [], []),
+    0xB3: ('admin', [], [('text', 't*')]),
+    0xB4: ('admin', [('session', 'u2')], KKM_TYPE),
+    0xB5: ('admin', [('kpk', 'u4')], KKM_TYPE),
+    0xB6: ('admin', [('report_type', 'u1'), ('department', 'u1'),
+                     ('first_date', 'date'), ('last_date', 'date')],
+                    KKM_TYPE),
+    0xB7: ('admin', [('report_type', 'u1'), ('department', 'u1'),
+                     ('first_session', 'u2'), ('last_session', 'u2')],
+                    KKM_TYPE),
+    0xB8: ('admin', DATES, KKM_TYPE),
+    0xB9: ('admin', SESSIONS, KKM_TYPE),
+    0xBA: ('admin', [('session', 'u2')], KKM_TYPE),
+    0xBB: ('admin', [], KKM_TYPE),
+    0xBC: ('admin', [('code', 'u1')], []),
+
+    0xC0: ('operator', [('line', 'u1'), ('data', 'b40')], OPERATOR),
+    0xC1: ('operator', [('first_line', 'u1'), ('last_line', 'u1')], OPERATOR),
+    0xC2: ('operator', [('barcode', 'u5')], OPERATOR),
+    0xC3: ('operator', [('first_line', 'u2'), ('last_line', 'u2')], OPERATOR),
+    0xC4: ('operator', [('line', 'u2'), ('data', 'b40')], OPERATOR),
+    0xC5: ('operator', [('repeat', 'u2'), ('data', 'b*')], OPERATOR),
+    0xC6: ('operator', [], OPERATOR),
+    0xC7: ('operator', [], OPERATOR),
+    0xC8: ('operator', [], [('line_count', 'u2'), ('printed_count', 'u2')]),
+    0xC9: ('operator', [('line', 'u2')], [('data', 'b*')]),
+    0xCA: ('operator', [], []),
+
+    0xD0: ('operator', [], OPERATOR + [
+        ('date', 'date'), ('time', 'time'), ('last_closed_session', 'u2'),
+        ('document', 'u4'), ('sale_count', 'u2'), ('purchase_count', 'u2'),
+        ('refuse_sale_count', 'u2'), ('refuse_purchase_count', 'u2'),
+        ('session_date', 'date'), ('session_time', 'time'), ('cash', 'm6'),
+        ('printer', 'b8'), ('flags', 'fibm')]),
+    0xD1: ('operator', [], OPERATOR + [('printer', 'b8'),
+                                       ('flags', 'fibms')]),
+
+    0xDD: ('operator', [('data_type', 'u1'), ('block', 'u1'),
+                        ('data', 'b64')], OPERATOR),
+    0xDE: ('operator', [('barcode_type', 'u1'), ('length', 'u2'),
+                        ('first_block', 'u1'), ('parameters', 'u1', 5),
+                        ('align', 'u1')], OPERATOR),
+
+    0xE0: ('operator', [], OPERATOR),
+    0xE1: ('operator', [], OPERATOR),
+    0xE2: ('operator', [], OPERATOR),
+    0xE3: ('operator', [], OPERATOR),
+    0xE4: ('operator', [('number', 'u1'), ('text', 't*')], OPERATOR),
+    0xE5: ('operator', [], OPERATOR + [
+        ('polling', 'u1'), ('poll1', 'u1'), ('poll2', 'u1')]),
+    0xE6: ('operator', [('register_set', 'u1')], OPERATOR + [
+        ('register_set', 'u1'), ('counts', 'u4', 24)]),
+    0xE7: ('admin', [], OPERATOR),
+    0xE8: (None, [('tax_password', 'pwd')], []),
+
+    0xF0: ('operator', [('position', 'u1')], OPERATOR),
+    0xF1: ('operator', [('grab', 'u1')], OPERATOR),
+    0xF3: (None, [('password', 'pwd'), ('new_password', 'pwd')], []),
+
+    0xFC: (None, [], [
+        ('device_type', 'u1'), ('device_subtype', 'u1'),
+        ('protocol_version', 'u1'), ('protocol_subversion', 'u1'),
+        ('device_model', 'u1'), ('device_language', 'u1'),
+        ('device_name', 't*')]),
+    0xFD: ('operator', [('port', 'u1'), ('data', 'b*')], OPERATOR),
+}
+
+
+### Преобразователи полей ###
+
+# Целые, для которых в struct есть готовый формат
+NATIVE = {'u1': 'B', 'u2': 'H', 'u4': 'I', 'u8': 'Q', 's2': 'h'}
+
+# Типы полей, разбираемых лениво (см. responses)
+LAZY = ('date', 'time', 'hm', 'fkkt', 'ffp', 'fibm', 'fibms')
+
+# Денежные величины со знаком, остальные не бывают отрицательными
+SIGNED = ('sm2',)
+
+# Флаги: (формат struct, разбор в список названий)
+FLAGS = {
+    'fkkt':  ('H', kkt_flags),
+    'ffp':   ('B', fp_flags),
+    'fibm':  ('B', ibm_flags),
+    'fibms': ('B', ibm_short_flags),
+}
+
+
+def _identity(value):
+    return value
+
+
+def _int_codec(size):
+    """ Упаковка и разбор целого без знака нестандартной длины """
+    codec = Integer(size)
+    return codec.pack, codec.unpack
+
+
+def _encode_date(value):
+    return (value.day, value.month, value.year % 100)
+
+
+def _decode_date(day, month, year):
+    try:
+        return datetime.date(1900 + year if year > 90 else 2000 + year,
+                             month, day)
+    except ValueError:
+        # Дата не задана (нули) или испорчена
+        return None
+
+
+def _encode_time(value):
+    return (value.hour, value.minute, value.second)
+
+
+def _decode_time(hour, minute, second=0):
+    try:
+        return datetime.time(hour, minute, second)
+    except ValueError:
+        return None
+
+
+def _encode_password(value):
+    if isinstance(value, bytes) and len(value) == 4:
+        return value
+    return password_prapare(value)
+
+
+def _encode_text(value):
+    return encode_text(value)
+
+
+def _text_encoder(width):
+    def encode(value):
+        return encode_text(value, width)
+    return encode
+
+
+def _decode_text(value):
+    return bytes(value).rstrip(b'\x00').decode(CODE_PAGE)
+
+
+def _encode_bytes(value):
+    return bytes(bytearray(value))
+
+
+def field_codec(kind):
+    """ Возвращает для типа поля (формат struct, число значений,
+        функция упаковки, функция разбора, десятичная кратность).
+
+        Кратность задана только для денежных величин и количеств:
+        их функции упаковки и разбора работают с целым числом, а
+        преобразование в деньги выполняет Layout.
+    """
+    if kind in NATIVE:
+        return NATIVE[kind], 1, _identity, _identity, None
+    if kind in FLAGS:
+        code, decode = FLAGS[kind]
+        return code, 1, _identity, decode, None
+    if kind[0] == 'u':
+        size = int(kind[1:])
+        return ('%ds' % size, 1) + _int_codec(size) + (None,)
+    if kind in ('m8', 'm4', 'm2'):
+        return {'m8': 'Q', 'm4': 'I', 'm2': 'H'}[kind], 1, \
+            _identity, _identity, 2
+    if kind == 'sm2':
+        return 'h', 1, _identity, _identity, 2
+    if kind[0] == 'm':
+        size = int(kind[1:])
+        return ('%ds' % size, 1) + _int_codec(size) + (2,)
+    if kind == 'c5':
+        return ('5s', 1) + _int_codec(5) + (3,)
+    if kind == 'date':
+        return '3B', 3, _encode_date, _decode_date, None
+    if kind == 'time':
+        return '3B', 3, _encode_time, _decode_time, None
+    if kind == 'hm':
+        return '2B', 2, lambda v: _encode_time(v)[:2], _decode_time, None
+    if kind == 'pwd':
+        return '4s', 1, _encode_password, _identity, None
+    if kind[0] == 't':
+        width = int(kind[1:])
+        return '%ds' % width, 1, _text_encoder(width), _decode_text, None
+    if kind[0] == 'b':
+        return '%ss' % kind[1:], 1, _encode_bytes, bytes, None
+    raise ValueError('Неизвестный тип поля: %s' % kind)
+
+
+class Layout(object):
+    """ Скомпилированное описание полей запроса или ответа """
+
+    def __init__(self, fields, type_name='Response'):
+        self.fields = tuple(fields)
+        self.names = []
+        self.tail = None
+        self._codecs = []
+        # Денежные поля со знаком (см. pack)
+        self._signed = set()
+        lazy_names = []
+        codes = ['<']
+        for field in self.fields:
+            name, kind = field[:2]
+            count = field[2] if len(field) > 2 else None
+            if kind.endswith('*'):
+                self.tail = (name, kind[0] == 't')
+                self.names.append(name)
+                continue
+            code, values, encode, decode, digits = field_codec(kind)
+            if kind in SIGNED:
+                self._signed.add(name)
+            is_lazy = count is None and kind in LAZY
+            if is_lazy:
+                lazy_names.append(name)
+            codes.append(code * (count or 1))
+            self._codecs.append((name, count, values, encode, decode,
+                                 digits, is_lazy))
+            self.names.append(name)
+        self.struct = struct.Struct(str(''.join(codes)))
+        self.size = self.struct.size
+        # Класс ответа с полями в порядке описания
+        self.result_type = response_type(type_name, self.names, lazy_names)
+
+    def pack(self, values, money=money2integer):
+        """ Упаковывает словарь значений в байты. Денежные величины и
+            количества переводятся в целые функцией money(значение,
+            кратность), при money=None они уже переданы целыми.
+            Отрицательные значения полей без знака - ValueError.
+        """
+        items = []
+        for name, count, size, encode, decode, digits, is_lazy in \
+                self._codecs:
+            value = values[name]
+            if count is None:
+                value = [value]
+            elif len(value) != count:
+                raise ValueError('Поле %s должно содержать %d значений' % (
+                    name, count))
+            for v in value:
+                if digits is not None:
+                    if money is not None:
+                        v = money(v, digits)
+                    if v < 0 and name not in self._signed:
+                        raise ValueError('Поле %s не может быть '
+                                         'отрицательным: %s' % (name, v))
+                v = encode(v)
+                if size == 1:
+                    items.append(v)
+                else:
+                    items.extend(v)
+        data = self.struct.pack(*items)
+        if self.tail:
+            name, is_text = self.tail
+            value = values.get(name) or b''
+            data += _encode_text(value) if is_text else _encode_bytes(value)
+        return data
+
+    def unpack(self, data, money=integer2money):
+        """ Разбирает ответ в объект result_type. Денежные величины и
+            количества переводятся из целых функцией money(целое,
+            кратность), даты, время и флаги разбираются лениво.
+        """
+        items = self.struct.unpack_from(data, 0)
+        result = []
+        i = 0
+        for name, count, size, encode, decode, digits, is_lazy in \
+                self._codecs:
+            if is_lazy:
+                result.append(lazy(decode, *items[i:i+size]))
+                i += size
+                continue
+            if count is None:
+                values = [decode(*items[i:i+size])]
+            else:
+                values = [ decode(*items[j:j+size])
+                           for j in range(i, i + count*size, size) ]
+            if digits is not None:
+                values = [ money(v, digits) for v in values ]
+            result.append(values[0] if count is None else values)
+            i += size * (count or 1)
+        if self.tail:
+            name, is_text = self.tail
+            tail = data[self.size:]
+            result.append(_decode_text(tail) if is_text else bytes(tail))
+        return self.result_type(*result)
+
+
+class Command(object):
+    """ Скомпилированная команда ККТ """
+
+    def __init__(self, code, password, request, response):
+        self.code     = code
+        self.name     = KKT_COMMANDS.get(code, '')
+        self.password = password
+        self.request  = Layout(request, 'X%02XRequest' % code)
+        self.response = Layout(response, 'X%02XResponse' % code)
+
+    def __repr__(self):
+        return '<Command %02XH>' % self.code
+
+    def pack(self, values, money=money2integer):
+        """ Упаковывает параметры команды (без пароля из KKT) """
+        return self.request.pack(values, money)
+
+    def unpack(self, data, money=integer2money):
+        """ Разбирает данные ответа (без кода ошибки) """
+        if len(data) < self.response.size:
+            raise ValueError('Длина ответа команды %02XH (%d) меньше '
+                             'ожидаемой (%d)' % (self.code, len(data),
+                                                 self.response.size))
+        return self.response.unpack(data, money)
+
+
+def compile_schema(schema):
+    """ Компилирует схему в словарь {код команды: Command} """
+    return dict([ (code, Command(code, *spec))
+                  for code, spec in schema.items() ])
+
+
+COMMANDS = compile_schema(SCHEMA)
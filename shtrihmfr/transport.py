@@ -0,0 +1,523 @@
+# -*- coding: utf-8 -*-
+#
+#  Copyright 2013 Grigoriy Kramarenko <root@rosix.ru>
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+#  MA 02110-1301, USA.
+#
+#
+
+### Транспорты для обмена с ККТ ###
+#
+# Транспорт отвечает только за передачу байтов. Формирование сообщений
+# (STX, длина, LRC) и квитирование (ENQ/ACK/NAK) остаются в BaseKKT и
+# работают одинаково поверх любого транспорта.
+#
+# Транспорт выбирается по адресу (port) устройства:
+#     /dev/ttyUSB0, COM1         - последовательный порт (также
+#                                  serial:///dev/ttyUSB0, serial://COM1);
+#     tcp://host:port            - TCP-сокет (также socket://);
+#     loop://                    - обмен в памяти.
+
+from __future__ import unicode_literals
+import select
+import socket
+import threading
+import time
+
+import serial
+
+from .conf import *
+from .utils import PY2
+
+if PY2:
+    from urlparse import urlparse
+else:
+    from urllib.parse import urlparse
+
+
+__all__ = ('Transport', 'serial_device', 'SerialTransport', 'ConnectionPool',
+    'POOL', 'TCPTransport', 'LoopbackTransport', 'TRANSPORTS', 'get_transport')
+
+
+class Transport(object):
+    """ Базовый транспорт.
+
+        Повторяет семантику serial.Serial: read(size) ждёт size байт
+        не дольше timeout и возвращает столько, сколько успело прийти.
+    """
+    timeout       = 0.7
+    write_timeout = 0.7
+
+    def __init__(self, url=None, timeout=None, write_timeout=None, **options):
+        self.url = url
+        if timeout is not None:
+            self.timeout = timeout
+        if write_timeout is not None:
+            self.write_timeout = write_timeout
+        self.options = options
+
+    def __repr__(self):
+        return '<%s %s>' % (self.__class__.__name__, self.url)
+
+    @property
+    def is_open(self):
+        """ Возвращает признак открытого соединения """
+        raise NotImplementedError
+
+    def open(self):
+        """ Открывает соединение """
+        raise NotImplementedError
+
+    def close(self):
+        """ Закрывает соединение """
+        raise NotImplementedError
+
+    def read(self, size=1):
+        """ Считывает до size байт """
+        raise NotImplementedError
+
+    def readinto(self, buffer):
+        """ Считывает данные в буфер, возвращает количество байт """
+        data = self.read(len(buffer))
+        count = len(data)
+        buffer[:count] = data
+        return count
+
+    def write(self, data):
+        """ Записывает данные """
+        raise NotImplementedError
+
+    def flush(self):
+        """ Дожидается отправки записанных данных """
+        return None
+
+    def reset_input_buffer(self):
+        """ Сбрасывает непрочитанные входящие данные """
+        while self.wait(0):
+            if not self.read(1):
+                break
+
+    def fileno(self):
+        """ Возвращает файловый дескриптор соединения """
+        raise IOError('Транспорт не имеет файлового дескриптора')
+
+    def wait(self, timeout):
+        """ Ожидает поступления данных не дольше timeout секунд.
+            Возвращает True, если данные можно считывать.
+        """
+        try:
+            fd = self.fileno()
+        except (AttributeError, ValueError, IOError, OSError):
+            # Без файлового дескриптора ожидание ляжет на тайм-аут
+            # самого чтения.
+            return True
+        readable, _, _ = select.select([fd], [], [], timeout)
+        return bool(readable)
+
+
+def serial_device(url):
+    """ Возвращает имя последовательного порта для адреса url: pyserial
+        не принимает схему serial://.
+    """
+    if url.lower().startswith('serial://'):
+        return url[len('serial://'):]
+    return url
+
+
+class SerialTransport(Transport):
+    """ Последовательный порт RS-232 (pyserial) """
+    baudrate = DEFAULT_BOD
+    parity   = serial.PARITY_NONE
+    stopbits = serial.STOPBITS_ONE
+
+    def __init__(self, url=DEFAULT_PORT, baudrate=None, parity=None,
+                 stopbits=None, **kwargs):
+        super(SerialTransport, self).__init__(url, **kwargs)
+        if baudrate is not None:
+            self.baudrate = baudrate
+        if parity is not None:
+            self.parity = parity
+        if stopbits is not None:
+            self.stopbits = stopbits
+        self.device = serial_device(url)
+        self._serial = None
+
+    @property
+    def is_open(self):
+        return self._serial is not None and self._serial.isOpen()
+
+    def open(self):
+        self._serial = serial.Serial(
+            self.device, self.baudrate,
+            parity=self.parity,
+            stopbits=self.stopbits,
+            timeout=self.timeout,
+            writeTimeout=self.write_timeout
+        )
+
+    def close(self):
+        if self._serial is not None:
+            try:
+                self._serial.close()
+            finally:
+                self._serial = None
+
+    def read(self, size=1):
+        return self._serial.read(size)
+
+    def readinto(self, buffer):
+        return self._serial.readinto(buffer)
+
+    def write(self, data):
+        return self._serial.write(data)
+
+    def flush(self):
+        return self._serial.flush()
+
+    def set_baudrate(self, baudrate):
+        """ Меняет скорость обмена открытого порта """
+        self.baudrate = baudrate
+        if self._serial is not None:
+            self._serial.baudrate = baudrate
+
+    def reset_input_buffer(self):
+        self._serial.reset_input_buffer()
+
+    def fileno(self):
+        return self._serial.fileno()
+
+
+class ConnectionPool(object):
+    """ Пул TCP-соединений с ККТ.
+
+        Для каждого адреса устройства хранит до max_idle открытых
+        соединений с TCP_NODELAY и SO_KEEPALIVE, так что закрытие
+        транспорта после команды не разрывает соединение, а следующая
+        команда не тратит время на его установку.
+
+        Неудачные попытки соединения с адресом откладывают следующую
+        попытку с удвоением паузы от backoff до max_backoff секунд;
+        до её истечения попытки сразу завершаются ошибкой.
+    """
+    max_idle    = 2
+    backoff     = TCP_BACKOFF
+    max_backoff = TCP_MAX_BACKOFF
+
+    def __init__(self, max_idle=None, backoff=None, max_backoff=None):
+        if max_idle is not None:
+            self.max_idle = max_idle
+        if backoff is not None:
+            self.backoff = backoff
+        if max_backoff is not None:
+            self.max_backoff = max_backoff
+        self._idle     = {}
+        self._failures = {}
+        self._retry_at = {}
+        self._lock     = threading.Lock()
+
+    def acquire(self, address, timeout=None):
+        """ Возвращает открытое соединение с адресом """
+        while True:
+            with self._lock:
+                idle = self._idle.get(address)
+                sock = idle.pop() if idle else None
+            if sock is None:
+                return self.connect(address, timeout)
+            if self.is_alive(sock):
+                return sock
+            sock.close()
+
+    def release(self, address, sock, broken=False):
+        """ Возвращает соединение в пул или закрывает его """
+        if not broken:
+            with self._lock:
+                idle = self._idle.setdefault(address, [])
+                if len(idle) < self.max_idle:
+                    idle.append(sock)
+                    return
+        sock.close()
+
+    def connect(self, address, timeout=None):
+        """ Устанавливает новое соединение с учётом паузы после ошибок """
+        now = time.time()
+        with self._lock:
+            retry_at = self._retry_at.get(address, 0)
+        if now < retry_at:
+            raise IOError('Повторное соединение с %s:%s возможно через %.1f сек.' % (
+                address[0], address[1], retry_at - now))
+        try:
+            sock = socket.create_connection(address, timeout)
+        except (IOError, OSError):
+            with self._lock:
+                failures = self._failures.get(address, 0) + 1
+                self._failures[address] = failures
+                delay = min(self.backoff * 2 ** (failures - 1), self.max_backoff)
+                self._retry_at[address] = time.time() + delay
+            raise
+        with self._lock:
+            self._failures.pop(address, None)
+            self._retry_at.pop(address, None)
+        self.setup(sock)
+        return sock
+
+    def setup(self, sock):
+        """ Настраивает сокет: без задержки Нагла и с keep-alive """
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        for name, value in (('TCP_KEEPIDLE', TCP_KEEPALIVE),
+                            ('TCP_KEEPINTVL', TCP_KEEPALIVE),
+                            ('TCP_KEEPCNT', 3)):
+            if hasattr(socket, name):
+                sock.setsockopt(socket.IPPROTO_TCP, getattr(socket, name), value)
+
+    def is_alive(self, sock):
+        """ Проверяет простаивавшее соединение: оно не должно быть
+            закрыто удалённой стороной или содержать непрочитанные
+            данные от прошлого обмена.
+        """
+        try:
+            readable, _, _ = select.select([sock], [], [], 0)
+        except (IOError, OSError, ValueError):
+            return False
+        return not readable
+
+    def clear(self, address=None):
+        """ Закрывает простаивающие соединения (все или с адресом) """
+        with self._lock:
+            if address is None:
+                pools = list(self._idle.values())
+                self._idle.clear()
+            else:
+                pools = [self._idle.pop(address, [])]
+        for idle in pools:
+            for sock in idle:
+                sock.close()
+
+
+# Общий пул соединений, используемый TCPTransport по-умолчанию
+POOL = ConnectionPool()
+
+
+class TCPTransport(Transport):
+    """ TCP-сокет: преобразователи RS-232/Ethernet и ККТ с сетевым
+        интерфейсом, передающие тот же протокол без изменений.
+
+        Соединения берутся из пула (по-умолчанию общего POOL) и при
+        закрытии транспорта возвращаются в него, если обмен прошёл без
+        ошибок ввода-вывода.
+
+        Соединение устанавливается не дольше connect_timeout секунд
+        (по умолчанию - тайм-аут чтения timeout).
+    """
+    default_port    = DEFAULT_TCP_PORT
+    connect_timeout = None
+
+    def __init__(self, url, pool=None, connect_timeout=None, **kwargs):
+        super(TCPTransport, self).__init__(url, **kwargs)
+        if connect_timeout is not None:
+            self.connect_timeout = connect_timeout
+        parsed = urlparse(url)
+        self.host = parsed.hostname
+        self.port = parsed.port or self.default_port
+        self.pool = POOL if pool is None else pool
+        self._socket = None
+        self._broken = False
+
+    @property
+    def address(self):
+        return (self.host, self.port)
+
+    @property
+    def is_open(self):
+        return self._socket is not None
+
+    def open(self):
+        timeout = self.connect_timeout
+        if timeout is None:
+            timeout = self.timeout
+        sock = self.pool.acquire(self.address, timeout)
+        sock.settimeout(self.timeout)
+        self._socket = sock
+        self._broken = False
+
+    def close(self):
+        if self._socket is not None:
+            try:
+                self.pool.release(self.address, self._socket, broken=self._broken)
+            finally:
+                self._socket = None
+
+    def read(self, size=1):
+        chunks = []
+        deadline = time.time() + self.timeout
+        try:
+            while size > 0:
+                remaining = deadline - time.time()
+                if remaining <= 0 or not self.wait(remaining):
+                    break
+                chunk = self._socket.recv(size)
+                if not chunk:
+                    raise IOError('Соединение закрыто удалённой стороной')
+                chunks.append(chunk)
+                size -= len(chunk)
+        except (IOError, OSError):
+            self._broken = True
+            raise
+        if size > 0 and chunks:
+            # Ответ пришёл не полностью, хвост может остаться в сокете.
+            # Пустое чтение (ККТ ещё не ответила на ENQ) сокет не портит.
+            self._broken = True
+        return b''.join(chunks)
+
+    def readinto(self, buffer):
+        view = memoryview(buffer)
+        size = len(view)
+        count = 0
+        deadline = time.time() + self.timeout
+        try:
+            while count < size:
+                remaining = deadline - time.time()
+                if remaining <= 0 or not self.wait(remaining):
+                    break
+                received = self._socket.recv_into(view[count:])
+                if not received:
+                    raise IOError('Соединение закрыто удалённой стороной')
+                count += received
+        except (IOError, OSError):
+            self._broken = True
+            raise
+        if 0 < count < size:
+            # Ответ пришёл не полностью, хвост может остаться в сокете
+            self._broken = True
+        return count
+
+    def write(self, data):
+        self._socket.settimeout(self.write_timeout)
+        try:
+            self._socket.sendall(data)
+        except (IOError, OSError):
+            self._broken = True
+            raise
+        finally:
+            self._socket.settimeout(self.timeout)
+        return len(data)
+
+    def fileno(self):
+        return self._socket.fileno()
+
+
+class LoopbackTransport(Transport):
+    """ Обмен в памяти, без оборудования.
+
+        Записанные байты передаются обработчику handler(data), а то,
+        что он вернул, становится доступно для чтения. Без обработчика
+        записанное возвращается обратно (эхо). Данные также можно
+        подать в транспорт из другого потока методом feed().
+    """
+
+    def __init__(self, url='loop://', handler=None, **kwargs):
+        super(LoopbackTransport, self).__init__(url, **kwargs)
+        self.handler = handler
+        self._buffer = bytearray()
+        self._ready = threading.Condition()
+        self._open = False
+
+    @property
+    def is_open(self):
+        return self._open
+
+    def open(self):
+        self._open = True
+
+    def close(self):
+        self._open = False
+
+    def feed(self, data):
+        """ Добавляет данные для чтения """
+        if not data:
+            return
+        with self._ready:
+            self._buffer.extend(data)
+            self._ready.notify_all()
+
+    def reset_input_buffer(self):
+        with self._ready:
+            del self._buffer[:]
+
+    def wait(self, timeout):
+        deadline = time.time() + timeout
+        with self._ready:
+            while not self._buffer:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return False
+                self._ready.wait(remaining)
+            return True
+
+    def read(self, size=1):
+        deadline = time.time() + self.timeout
+        with self._ready:
+            while len(self._buffer) < size:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                self._ready.wait(remaining)
+            data = bytes(self._buffer[:size])
+            del self._buffer[:size]
+        return data
+
+    def write(self, data):
+        if self.handler is None:
+            self.feed(data)
+        else:
+            self.feed(self.handler(bytes(data)))
+        return len(data)
+
+
+# Параметры, которые имеют смысл только для последовательного порта
+SERIAL_OPTIONS = ('baudrate', 'parity', 'stopbits')
+
+# Соответствие схемы адреса и класса транспорта
+TRANSPORTS = {
+    'serial': SerialTransport,
+    'tcp':    TCPTransport,
+    'socket': TCPTransport,
+    'loop':   LoopbackTransport,
+}
+
+
+def get_transport(url, transport=None, **options):
+    """ Возвращает транспорт для адреса url.
+
+        Класс транспорта можно указать явно, иначе он определяется по
+        схеме адреса (см. TRANSPORTS). Адрес без схемы считается
+        последовательным портом. Параметры порта (SERIAL_OPTIONS)
+        передаются только транспортам последовательного порта.
+    """
+    if transport is None:
+        scheme = ''
+        if '://' in url:
+            scheme = url.split('://', 1)[0].lower()
+        transport = TRANSPORTS.get(scheme or 'serial')
+        if transport is None:
+            msg = 'Неизвестный транспорт: %s' % url
+            if PY2:
+                msg = msg.encode('utf-8')
+            raise ValueError(msg)
+    if not issubclass(transport, SerialTransport):
+        options = dict([ (k, v) for k, v in options.items()
+                         if k not in SERIAL_OPTIONS ])
+    return transport(url, **options)
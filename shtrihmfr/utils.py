@@ -20,24 +20,50 @@
 #  
 
 from __future__ import unicode_literals
+from decimal import Decimal, ROUND_HALF_UP
+import binascii
+import itertools
+import math
+import operator
 import struct
 import sys
+import threading
 
+from .conf import CODE_PAGE, TEXT_CACHE_SIZE, TEXT_FALLBACK
 
-__all__ = ('PY2', 'int2', 'int4', 'int5', 'int6', 'int7', 'int8',
-    'money2integer', 'integer2money', 'count2integer',
-    'get_control_summ','string2bits', 'bits2string',
-    'digits2string', 'password_prapare')
+
+__all__ = ('PY2', 'int2byte', 'int2', 'int4', 'int5', 'int6', 'int7', 'int8',
+    'Integer', 'uint1', 'uint2', 'uint3', 'uint4', 'uint5', 'uint6', 'uint7',
+    'uint8', 'sint1', 'sint2', 'sint3', 'sint4', 'sint5', 'sint6', 'sint7',
+    'sint8',
+    'money2integer', 'integer2money', 'integer2decimal', 'count2integer',
+    'MONEY_TYPES',
+    'lrc', 'get_control_summ','string2bits', 'bits2string',
+    'TextCache', 'text_cache', 'encode_text',
+    'digits2string', 'password_prapare', 'timeout2code', 'code2timeout')
 
 
 PY2 = sys.version_info[0] == 2
 
+# Целые типы (в Python 2 есть ещё long)
+INTEGER_TYPES = (int, long) if PY2 else (int,)
+
+# Байт (bytes длиной 1) из целого 0...255 одинаково в Python 2 и 3
+int2byte = struct.Struct(b'B').pack
+
 
 class Struct(struct.Struct):
-    """ Преобразователь """
+    """ Преобразователь (прежний, оставлен для совместимости).
+        Для целых фиксированной длины используйте Integer.
+    """
     def __init__(self, *args, **kwargs):
         self.length = kwargs.pop('length', None)
         super(Struct, self).__init__(*args, **kwargs)
+        # В Python 3.7+ format - строка, ранее - байты
+        fmt = self.format
+        if not isinstance(fmt, str):
+            fmt = fmt.decode('ascii')
+        self.is_integer = fmt in ('h','i','I','l','L','q','Q')
 
     def unpack(self, value):
         value = self.pre_value(value)
@@ -49,11 +75,13 @@ class Struct(struct.Struct):
 
     def pre_value(self, value):
         """ Обрезает или добавляет нулевые байты """
+        if isinstance(value, memoryview):
+            value = value.tobytes()
         if self.size:
-            if self.format in (b'h',b'i',b'I',b'l',b'L',b'q',b'Q'):
+            if self.is_integer:
                 _len = len(value)
                 if _len < self.size:
-                    value = value.ljust(self.size, chr(0x0))
+                    value = value.ljust(self.size, b'\x00')
                 elif _len > self.size:
                     value = value[:self.size]
         return value
@@ -61,58 +89,345 @@ class Struct(struct.Struct):
     def post_value(self, value):
         """ Обрезает или добавляет нулевые байты """
         if self.length:
-            if self.format in (b'h',b'i',b'I',b'l',b'L',b'q',b'Q'):
+            if self.is_integer:
                 _len = len(value)
                 if _len < self.length:
-                    value = value.ljust(self.length, chr(0x0))
+                    value = value.ljust(self.length, b'\x00')
                 elif _len > self.length:
                     value = value[:self.length]
         return value
 
-# Объекты класса Struct
-# Формат short по длинне 2 байта
-int2 = Struct(b'h', length=2)
-# Формат int по длинне 3 байта
-int3 = Struct(b'i', length=3)
-# Формат int == long по длинне 4 байта
-int4 = Struct(b'i', length=4)
-# Формат "long long" для 5-ти байтовых чисел
-int5 = Struct(b'q', length=5)
-# Формат "long long" для 6-ти байтовых чисел
-int6 = Struct(b'q', length=6)
-# Формат "long long" для 7-ти байтовых чисел
-int7 = Struct(b'q', length=7)
-# Формат "long long" для 8-ти байтовых чисел
-int8 = Struct(b'q', length=8)
+# Разложение целого длиной 1...8 байт на целые форматы struct
+# (little-endian), от младших байтов к старшим
+_PARTS = {1: 'B', 2: 'H', 3: 'HB', 4: 'I', 5: 'IB', 6: 'IH', 7: 'IHB', 8: 'Q'}
+_NATIVE_SIGNED = {1: 'b', 2: 'h', 4: 'i', 8: 'q'}
+_PART_BITS = {'B': 8, 'H': 16, 'I': 32, 'Q': 64}
+
+
+class Integer(object):
+    """ Целое little-endian фиксированной длины 1...8 байт со знаком
+        или без. Упаковка и разбор выполняются одной операцией:
+        int.to_bytes/int.from_bytes в Python 3, одним struct в
+        Python 2, без дополнения и обрезки промежуточных строк.
+
+        Для разбора подряд идущих полей одной длины служат
+        unpack_from() и unpack_many().
+    """
+    __slots__ = ('size', 'signed', 'bits', 'native', '_struct', '_shifts',
+                 '_masks', '_many')
+
+    def __init__(self, size, signed=False):
+        if size not in _PARTS:
+            raise ValueError('Длина целого должна быть от 1 до 8 байт')
+        self.size   = size
+        self.signed = signed
+        self.bits   = size * 8
+        # Для длин 1, 2, 4 и 8 байт в struct есть готовый формат
+        self.native = size in _NATIVE_SIGNED
+        parts = _PARTS[size]
+        if self.native and signed:
+            parts = _NATIVE_SIGNED[size]
+        self._struct = struct.Struct(str('<' + parts))
+        shifts, shift = [], 0
+        for part in _PARTS[size]:
+            shifts.append(shift)
+            shift += _PART_BITS[part]
+        self._shifts = tuple(shifts)
+        self._masks = tuple([ (shift, (1 << _PART_BITS[part]) - 1)
+                              for part, shift in zip(_PARTS[size], shifts) ])
+        self._many = {}
+
+    def __repr__(self):
+        return '<Integer %s%d>' % ('s' if self.signed else 'u', self.size)
+
+    def _join(self, parts):
+        """ Собирает целое из частей, распакованных struct """
+        value = 0
+        for part, shift in zip(parts, self._shifts):
+            value |= part << shift
+        if self.signed and value >> (self.bits - 1):
+            value -= 1 << self.bits
+        return value
+
+    def _split(self, value):
+        """ Раскладывает целое на части для struct """
+        if self.signed:
+            low, high = -(1 << (self.bits - 1)), 1 << (self.bits - 1)
+        else:
+            low, high = 0, 1 << self.bits
+        if not low <= value < high:
+            raise OverflowError('Число %s не помещается в %d байт' % (
+                value, self.size))
+        if value < 0:
+            value += 1 << self.bits
+        return [ value >> shift & mask for shift, mask in self._masks ]
+
+    if PY2:
+        def pack(self, value):
+            """ Упаковывает целое в байты """
+            if self.native:
+                return self._struct.pack(value)
+            return self._struct.pack(*self._split(value))
+
+        def unpack(self, value):
+            """ Разбирает байты в целое. Лишние байты отбрасываются,
+                недостающие старшие считаются нулевыми.
+            """
+            if len(value) < self.size:
+                value = bytes(value).ljust(self.size, b'\x00')
+            return self.unpack_from(value)
+    else:
+        def pack(self, value):
+            """ Упаковывает целое в байты """
+            return value.to_bytes(self.size, 'little', signed=self.signed)
+
+        def unpack(self, value):
+            """ Разбирает байты в целое. Лишние байты отбрасываются,
+                недостающие старшие считаются нулевыми.
+            """
+            length = len(value)
+            if length > self.size:
+                value = value[:self.size]
+            elif length < self.size and self.signed:
+                value = bytes(value).ljust(self.size, b'\x00')
+            return int.from_bytes(value, 'little', signed=self.signed)
+
+    def unpack_from(self, buffer, offset=0):
+        """ Разбирает целое из буфера по смещению """
+        if self.native:
+            return self._struct.unpack_from(buffer, offset)[0]
+        return self._join(self._struct.unpack_from(buffer, offset))
+
+    def unpack_many(self, buffer, count=None, offset=0):
+        """ Разбирает count подряд идущих целых (по умолчанию - до
+            конца буфера) за один проход.
+        """
+        if count is None:
+            count = (len(buffer) - offset) // self.size
+        if not self.native and not PY2:
+            # Весь участок - одно большое целое, поля выделяются сдвигом
+            end = offset + count * self.size
+            if end > len(buffer):
+                raise struct.error('Буфер короче %d байт' % end)
+            bits, mask = self.bits, (1 << self.bits) - 1
+            run = int.from_bytes(buffer[offset:end], 'little')
+            result = [ run >> shift & mask
+                       for shift in range(0, count * bits, bits) ]
+            if self.signed:
+                sign = 1 << (bits - 1)
+                result = [ v - (v & sign) * 2 for v in result ]
+            return result
+        many = self._many.get(count)
+        if many is None:
+            fmt = self._struct.format
+            if not isinstance(fmt, str):
+                fmt = fmt.decode('ascii')
+            many = self._many[count] = struct.Struct(
+                str('<' + fmt[1:] * count))
+        items = many.unpack_from(buffer, offset)
+        if self.native:
+            return list(items)
+        step = len(self._shifts)
+        return [ self._join(items[i:i+step])
+                 for i in range(0, len(items), step) ]
+
+    def pack_many(self, values):
+        """ Упаковывает последовательность целых в байты """
+        return b''.join([ self.pack(value) for value in values ])
+
+
+# Целые без знака и со знаком длиной 1...8 байт
+uint1, uint2, uint3, uint4, uint5, uint6, uint7, uint8 = [
+    Integer(size) for size in range(1, 9) ]
+sint1, sint2, sint3, sint4, sint5, sint6, sint7, sint8 = [
+    Integer(size, signed=True) for size in range(1, 9) ]
+
+# Прежние имена: 2, 4 и 8 байт - со знаком, 3, 5, 6 и 7 - без знака
+int2 = sint2
+int3 = uint3
+int4 = sint4
+int5 = uint5
+int6 = uint6
+int7 = uint7
+int8 = sint8
+
+
+# Биты каждого байта, начиная со старшего
+BITS = tuple([ tuple([ byte >> i & 1 for i in range(7, -1, -1) ])
+               for byte in range(256) ])
 
 
 def string2bits(string):
     """ Convert string to bit array """
     result = []
-    for char in string:
-        bits = bin(ord(char))[2:]
-        bits = '00000000'[len(bits):] + bits
-        result.extend([int(b) for b in bits])
+    for byte in bytearray(string):
+        result.extend(BITS[byte])
     return result
 
 
 def bits2string(bits):
     """ Convert bit array to string """
-    chars = []
-    for b in range(len(bits) / 8):
-        byte = bits[b*8:(b+1)*8]
-        chars.append(chr(int(''.join([str(bit) for bit in byte]), 2)))
-    return ''.join(chars).encode('utf-8')
+    chars = bytearray()
+    for b in range(0, len(bits) - 7, 8):
+        byte = 0
+        for bit in bits[b:b+8]:
+            byte = byte << 1 | int(bit)
+        chars.append(byte)
+    return bytes(chars)
+
+
+def _lru_cache(maxsize):
+    """ Ограниченный LRU-кэш для Python 2, где нет functools.lru_cache.
+        Интерфейс (cache_info, cache_clear) тот же.
+
+        Попадание стоит двух обращений к словарю: вместо перестановки
+        элементов запоминается номер последнего обращения, а при
+        переполнении одним проходом вытесняется четверть самых давно
+        использованных значений.
+    """
+    def decorator(func):
+        cache = {}
+        used = {}
+        ticks = itertools.count()
+        lock = threading.Lock()
+        stats = [0, 0] # попадания, промахи
+
+        def evict():
+            with lock:
+                if len(cache) < maxsize:
+                    return
+                items = sorted(used.items(), key=operator.itemgetter(1))
+                for key, tick in items[:maxsize // 4 + 1]:
+                    cache.pop(key, None)
+                    used.pop(key, None)
+
+        def wrapper(*key):
+            try:
+                value = cache[key]
+            except KeyError:
+                stats[1] += 1
+                value = func(*key)
+                if len(cache) >= maxsize:
+                    evict()
+                cache[key] = value
+            else:
+                stats[0] += 1
+            used[key] = next(ticks)
+            return value
+
+        def cache_info():
+            return stats[0], stats[1], maxsize, len(cache)
+
+        def cache_clear():
+            with lock:
+                cache.clear()
+                used.clear()
+                stats[:] = [0, 0]
+
+        wrapper.cache_info = cache_info
+        wrapper.cache_clear = cache_clear
+        return wrapper
+    return decorator
+
+
+try:
+    from functools import lru_cache
+except ImportError:
+    lru_cache = _lru_cache
+
+
+class TextCache(object):
+    """ Ограниченный LRU-кэш закодированного текста.
+
+        По паре (текст, ширина) хранит строку байт в кодировке
+        encoding, обрезанную или дополненную нулями до ширины (ширина
+        None - как есть). Символы, отсутствующие в кодировке,
+        заменяются на fallback, а не вызывают ошибку. Счётчики hits и
+        misses показывают эффективность кэша.
+    """
+
+    def __init__(self, maxsize=TEXT_CACHE_SIZE, encoding=CODE_PAGE,
+                 fallback=TEXT_FALLBACK):
+        self.maxsize  = maxsize
+        self.encoding = encoding
+        self.fallback = fallback.encode(encoding)
+        self.encode   = lru_cache(maxsize)(self._encode)
+
+    def __len__(self):
+        return self.encode.cache_info()[3]
+
+    @property
+    def hits(self):
+        return self.encode.cache_info()[0]
+
+    @property
+    def misses(self):
+        return self.encode.cache_info()[1]
+
+    def info(self):
+        """ Возвращает статистику кэша """
+        hits, misses, maxsize, size = self.encode.cache_info()
+        return {'hits': hits, 'misses': misses, 'size': size,
+                'maxsize': maxsize}
+
+    def clear(self):
+        """ Очищает кэш и счётчики """
+        self.encode.cache_clear()
+
+    def _encode(self, text, width=None):
+        """ Возвращает текст в кодировке устройства, обрезанный или
+            дополненный нулями до ширины width. Вызывается через кэш
+            как encode(text, width).
+        """
+        try:
+            value = text.encode(self.encoding)
+        except UnicodeEncodeError:
+            chars = []
+            for char in text:
+                try:
+                    chars.append(char.encode(self.encoding))
+                except UnicodeEncodeError:
+                    chars.append(self.fallback)
+            value = b''.join(chars)
+        if width is not None:
+            value = value[:width].ljust(width, b'\x00')
+        return value
+
+
+# Общий кэш текста устройств
+text_cache = TextCache()
+
+
+def encode_text(text, width=None):
+    """ Кодирует текст для ККТ через общий кэш (см. TextCache.encode) """
+    return text_cache.encode(text, width)
 
 
 def money2integer(money, digits=2):
     """
-    Преобразует decimal или float значения в целое число, согласно
-    установленной десятичной кратности.
+    Преобразует целое, decimal или float значения в целое число,
+    согласно установленной десятичной кратности. Округление
+    производится один раз, математически (половина - вверх).
+
+    Целые и Decimal переводятся точно, без преобразования во float.
 
     Например, money2integer(2.3456, digits=3) вернёт  2346
     """
-    return int(round(round(float(money), digits) * 10**digits))
+    if money.__class__ in INTEGER_TYPES:
+        return money * 10**digits
+    if money.__class__ is not Decimal:
+        money = float(money)
+        scaled = money * 10**digits
+        integer = math.floor(scaled + 0.5)
+        # Погрешность float важна только вблизи половины
+        error = scaled + 0.5 - integer
+        tolerance = abs(scaled) * 1e-12 + 1e-9
+        if tolerance < error < 1 - tolerance:
+            return int(integer)
+        # Кратчайшее десятичное представление float совпадает с
+        # введённым числом, по нему и округляем
+        money = Decimal(repr(money))
+    return int(money.scaleb(digits).to_integral_value(ROUND_HALF_UP))
 
 
 def integer2money(integer, digits=2):
@@ -125,6 +440,44 @@ def integer2money(integer, digits=2):
     return round(float(integer) / 10**digits, digits)
 
 
+def integer2decimal(integer, digits=2):
+    """
+    Преобразует целое число в Decimal без потери точности, согласно
+    установленной десятичной кратности.
+
+    Например, integer2decimal(2346, digits=3) вернёт  Decimal('2.346')
+    """
+    return Decimal(integer).scaleb(-digits)
+
+
+def integer2integer(integer, digits=2):
+    """
+    Возвращает целое число в минимальных единицах (копейках) как есть.
+    Используется для денежного типа int.
+    """
+    return integer
+
+
+def units2integer(money, digits=2):
+    """
+    Для денежного типа int: целые значения уже заданы в минимальных
+    единицах (копейках) и передаются как есть, остальные
+    преобразуются через money2integer.
+    """
+    if money.__class__ in INTEGER_TYPES:
+        return money
+    return money2integer(money, digits)
+
+
+# Преобразователи для типов денежных величин KKT.money_type:
+# {тип: (в целое для ККТ, из целого от ККТ)}
+MONEY_TYPES = {
+    float:   (money2integer, integer2money),
+    Decimal: (money2integer, integer2decimal),
+    int:     (units2integer, integer2integer),
+}
+
+
 def count2integer(count, coefficient=1, digits=3):
     """
     Преобразует количество согласно заданного коэффициента
@@ -132,21 +485,81 @@ def count2integer(count, coefficient=1, digits=3):
     return money2integer(count, digits=digits) * coefficient
 
 
+# Длина данных, начиная с которой LRC считается свёрткой целого
+LRC_BULK_SIZE = 48
+
+if PY2:
+    def _bytes2int(data):
+        return int(binascii.hexlify(data), 16)
+else:
+    def _bytes2int(data):
+        return int.from_bytes(data, 'big')
+
+
+def lrc(data, summ=0):
+    """
+    Подсчет LRC (XOR всех байтов) буфера bytes, bytearray или
+    memoryview. Для подсчёта по частям передаётся LRC предыдущих частей
+    в summ.
+
+    Длинный буфер переводится в одно целое, которое сворачивается
+    пополам сдвигом и XOR, пока не останется один байт: log2(длина)
+    операций над целым вместо цикла по байтам.
+    """
+    size = len(data)
+    if size < LRC_BULK_SIZE:
+        if not isinstance(data, bytearray):
+            data = bytearray(data)
+        for byte in data:
+            summ ^= byte
+        return summ
+    value = _bytes2int(data)
+    # Ближайшая сверху степень двойки длины в битах
+    bits = 8 << (size - 1).bit_length()
+    while bits > 8:
+        bits >>= 1
+        value ^= value >> bits
+    return summ ^ value & 0xFF
+
+
 def get_control_summ(string):
     """
     Подсчет CRC
     """
-    result = 0
-    for s in string:
-        result = result ^ ord(s)
-    return chr(result)
+    return int2byte(lrc(string))
 
 
 def digits2string(digits):
     """
     Преобразует список из целых или шестнадцатеричных значений в строку
     """
-    return ''.join([ chr(x) for x in digits ]).encode('utf-8')
+    return bytes(bytearray(digits))
+
+
+def timeout2code(timeout):
+    """
+    Преобразует тайм-аут приёма байта в секундах в код для команды 14H.
+    Шкала нелинейная: коды 0...150 - по 1 мс, 151...249 - по 150 мс
+    (от 300 мс), 250...255 - по 15 сек (от 30 сек). Значение
+    округляется вверх до ближайшего представимого.
+    """
+    ms = int(math.ceil(timeout * 1000))
+    if ms <= 150:
+        return max(ms, 0)
+    if ms <= 15000:
+        return max(149 + int(math.ceil(ms / 150.0)), 151)
+    return min(max(248 + int(math.ceil(ms / 15000.0)), 250), 255)
+
+
+def code2timeout(code):
+    """
+    Преобразует код тайм-аута приёма байта из команды 15H в секунды.
+    """
+    if code <= 150:
+        return code / 1000.0
+    if code <= 249:
+        return (code - 149) * 0.15
+    return (code - 248) * 15.0
 
 
 def password_prapare(password):
@@ -0,0 +1,458 @@
+# -*- coding: utf-8 -*-
+#
+#  Copyright 2013 Grigoriy Kramarenko <root@rosix.ru>
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+#  MA 02110-1301, USA.
+#
+#
+
+### Обработчик команд одного устройства ###
+#
+# Экземпляр KKT нельзя использовать из нескольких потоков: байты
+# запросов и ответов перемешаются в одном порту. DeviceWorker владеет
+# экземпляром в отдельном потоке и выполняет команды по очереди из
+# ограниченной очереди. Вызывающий получает Future, в который попадает
+# результат команды или её исключение (KktError и прочие).
+#
+#     worker = DeviceWorker(KKT(port='/dev/ttyS0')).start()
+#     state = worker.x10().result()
+#     worker.submit('x17', 'Строка').result(timeout=5)
+#     worker.stop()
+#
+# Команды выполняются по приоритету: операции чека раньше действий
+# кассира, те - раньше фоновых запросов состояния, а выгрузка отчётов
+# и регистров - в последнюю очередь (см. protocol.KKT_PRIORITIES).
+#
+# Время ожидания команды в очереди записывается в future.queue_delay и
+# учитывается в статистике stats(), в том числе по классам приоритета.
+#
+# Функция из нескольких команд (например, чек целиком: 8DH, 80H, 85H)
+# может быть прервана более срочными командами между обменами. Если
+# это недопустимо, пометьте её non_preemptible:
+#
+#     @non_preemptible
+#     def sale(kkt, price, text):
+#         kkt.x8D(0)
+#         kkt.x80(1, price, text)
+#         return kkt.x85(cash=price)
+#
+#     worker.schedule(PRIORITY_OPERATOR, sale, 10, 'Товар').result()
+
+from __future__ import unicode_literals
+import itertools
+import re
+import threading
+import time
+import traceback
+
+from .conf import WORKER_QUEUE_SIZE, WORKER_PUT_TIMEOUT
+from .kkt import KktError
+from .protocol import (KKT_PRIORITIES, DEFAULT_PRIORITY, PRIORITY_NAMES,
+                       PRIORITY_REPORT)
+from .utils import PY2
+
+if PY2:
+    import Queue as queue
+else:
+    import queue
+
+try:
+    from concurrent.futures import Future
+except ImportError:
+    Future = None
+
+
+__all__ = ('Future', 'QueueFullError', 'DeviceWorker', 'non_preemptible')
+
+
+if Future is None:
+
+    class Future(object):
+        """ Результат команды, выполняемой в другом потоке (замена
+            concurrent.futures.Future для Python 2 без пакета futures).
+        """
+
+        def __init__(self):
+            self._done      = threading.Event()
+            self._lock      = threading.Lock()
+            self._state     = 'pending'
+            self._result    = None
+            self._exception = None
+            self._callbacks = []
+
+        def cancel(self):
+            with self._lock:
+                if self._state != 'pending':
+                    return self._state == 'cancelled'
+                self._state = 'cancelled'
+            self._finish()
+            return True
+
+        def cancelled(self):
+            return self._state == 'cancelled'
+
+        def running(self):
+            return self._state == 'running'
+
+        def done(self):
+            return self._done.is_set()
+
+        def set_running_or_notify_cancel(self):
+            with self._lock:
+                if self._state == 'cancelled':
+                    return False
+                self._state = 'running'
+            return True
+
+        def set_result(self, result):
+            self._result = result
+            self._state = 'finished'
+            self._finish()
+
+        def set_exception(self, exception):
+            self._exception = exception
+            self._state = 'finished'
+            self._finish()
+
+        def _finish(self):
+            with self._lock:
+                self._done.set()
+                callbacks, self._callbacks = self._callbacks, []
+            for callback in callbacks:
+                self._invoke(callback)
+
+        def _invoke(self, callback):
+            # Ошибка обработчика не должна останавливать поток ККТ
+            try:
+                callback(self)
+            except Exception:
+                traceback.print_exc()
+
+        def add_done_callback(self, callback):
+            with self._lock:
+                if not self._done.is_set():
+                    self._callbacks.append(callback)
+                    return
+            self._invoke(callback)
+
+        def exception(self, timeout=None):
+            if not self._done.wait(timeout):
+                raise KktError('Время ожидания результата истекло')
+            if self._state == 'cancelled':
+                raise KktError('Команда отменена')
+            return self._exception
+
+        def result(self, timeout=None):
+            exception = self.exception(timeout)
+            if exception is not None:
+                raise exception
+            return self._result
+
+
+class QueueFullError(KktError):
+    """ Очередь команд устройства переполнена """
+    pass
+
+
+# Признак остановки обработчика в очереди: выполняется после всех
+# поставленных до него команд. Если очередь заполнена, признак не
+# ставится: обработчик остановится, опустошив её (см. stop)
+_STOP = object()
+_STOP_PRIORITY = 1 << 30
+
+# Приоритет выполняемой невытесняемой функции: выше любого в очереди
+_ATOMIC_PRIORITY = -(1 << 30)
+
+# Имена методов KKT вида xNN...
+_COMMAND = re.compile(r'^x([0-9A-F]{2})')
+
+
+def non_preemptible(func):
+    """ Помечает функцию func(kkt, ...) для submit и schedule как
+        невытесняемую: пока она выполняется, обработчик не выполняет
+        другие команды, даже более срочные (см. DeviceWorker.preempt).
+        Возвращает ту же функцию, поэтому годится как декоратор.
+    """
+    func.preemptible = False
+    return func
+
+
+class DeviceWorker(object):
+    """ Поток, владеющий соединением с ККТ.
+
+        Команды из очереди (не более maxsize) выполняются по одной в
+        порядке приоритета (см. protocol.KKT_PRIORITIES), при равном
+        приоритете - в порядке поступления. Порт держится открытым
+        (сессия KKT) всё время работы. Если очередь заполнена, submit
+        ждёт не дольше put_timeout секунд и выбрасывает QueueFullError.
+
+        Вытеснение происходит только между обменами с ККТ: перед
+        отправкой каждого сообщения (BaseKKT.ask) обработчик выполняет
+        ждущие команды более высокого приоритета. Так продажа не ждёт
+        окончания чтения всех регистров или отчёта ЭКЛЗ. Функции,
+        помеченные non_preemptible, выполняются без вытеснения.
+
+        Методы KKT доступны у обработчика под теми же именами и
+        возвращают Future: worker.x11().result().
+    """
+    maxsize     = WORKER_QUEUE_SIZE
+    put_timeout = WORKER_PUT_TIMEOUT
+
+    # Приоритеты методов, не соответствующих одной команде
+    priorities = {
+        'money_registers':     PRIORITY_REPORT,
+        'operation_registers': PRIORITY_REPORT,
+    }
+
+    def __init__(self, kkt, maxsize=None, put_timeout=None, name=None):
+        if maxsize is not None:
+            self.maxsize = maxsize
+        if put_timeout is not None:
+            self.put_timeout = put_timeout
+        self.kkt    = kkt
+        self.name   = name or 'kkt-worker-%s' % kkt.port
+        self.queue  = queue.PriorityQueue(self.maxsize)
+        self._lock  = threading.Lock()
+        self._order = itertools.count()
+        self._thread  = None
+        self._stopped = False
+        # Приоритет выполняемой команды
+        self._current = _STOP_PRIORITY
+        self.reset_stats()
+
+    def __repr__(self):
+        return '<%s %s>' % (self.__class__.__name__, self.name)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def __getattr__(self, name):
+        # Команды KKT: worker.x10(...) -> submit('x10', ...)
+        kkt = self.__dict__.get('kkt')
+        if name.startswith('_') or not callable(getattr(kkt, name, None)):
+            raise AttributeError(name)
+        def method(*args, **kwargs):
+            return self.submit(name, *args, **kwargs)
+        method.__name__ = str(name)
+        return method
+
+    @property
+    def is_alive(self):
+        """ Возвращает признак работающего потока """
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """ Запускает поток обработчика """
+        with self._lock:
+            if self.is_alive:
+                return self
+            self._stopped = False
+            thread = threading.Thread(target=self._run, name=self.name)
+            thread.daemon = True
+            self._thread = thread
+        thread.start()
+        return self
+
+    def stop(self, wait=True, timeout=None):
+        """ Останавливает обработчик после выполнения уже поставленных
+            в очередь команд. Новые команды не принимаются. Не ждёт
+            места в очереди; при wait ждёт окончания потока не дольше
+            timeout секунд.
+        """
+        with self._lock:
+            thread = self._thread
+            if self._stopped or thread is None:
+                return
+            self._stopped = True
+        try:
+            # Пустая очередь будит ждущий поток
+            self.queue.put_nowait((_STOP_PRIORITY, next(self._order), _STOP))
+        except queue.Full:
+            pass
+        if wait and thread is not threading.current_thread():
+            thread.join(timeout)
+
+    def priority(self, method):
+        """ Приоритет метода KKT (имя или функция): из priorities, по
+            коду команды из KKT_PRIORITIES или DEFAULT_PRIORITY.
+        """
+        name = method if not callable(method) else \
+            getattr(method, '__name__', '')
+        if name in self.priorities:
+            return self.priorities[name]
+        match = _COMMAND.match(name)
+        if match:
+            return KKT_PRIORITIES.get(int(match.group(1), 16),
+                                      DEFAULT_PRIORITY)
+        return DEFAULT_PRIORITY
+
+    def submit(self, method, *args, **kwargs):
+        """ Ставит в очередь вызов метода KKT (по имени) или функции
+            func(kkt, *args, **kwargs) с приоритетом метода (см.
+            priority). Возвращает Future.
+        """
+        return self.schedule(self.priority(method), method, *args, **kwargs)
+
+    def schedule(self, priority, method, *args, **kwargs):
+        """ Ставит в очередь вызов с заданным приоритетом (меньше -
+            раньше, см. PRIORITY_*). Возвращает Future.
+        """
+        if self._stopped or not self.is_alive:
+            raise KktError('Обработчик команд %s не запущен' % self.name)
+        if not callable(method):
+            method = getattr(self.kkt.__class__, method)
+        future = Future()
+        item = (future, method, args, kwargs, time.time())
+        with self._lock:
+            self._depth[priority] = self._depth.get(priority, 0) + 1
+        try:
+            self.queue.put((priority, next(self._order), item),
+                           timeout=self.put_timeout)
+        except queue.Full:
+            with self._lock:
+                self._depth[priority] -= 1
+            raise QueueFullError('Очередь команд %s переполнена (%d)' % (
+                self.name, self.maxsize))
+        with self._lock:
+            self._submitted += 1
+        return future
+
+    def call(self, method, *args, **kwargs):
+        """ Выполняет команду и ждёт её результата """
+        return self.submit(method, *args, **kwargs).result()
+
+    def preempt(self):
+        """ Выполняет ждущие в очереди команды более высокого
+            приоритета, чем выполняемая. Вызывается из потока
+            обработчика между обменами с ККТ до сборки сообщения
+            (см. BaseKKT.preempt).
+        """
+        if threading.current_thread() is not self._thread:
+            return
+        queue_ = self.queue
+        while True:
+            with queue_.mutex:
+                heap = queue_.queue
+                if not heap or heap[0][0] >= self._current:
+                    return
+            priority, order, item = queue_.get_nowait()
+            self._execute(priority, item)
+
+    def _run(self):
+        kkt = self.kkt
+        kkt.worker = self
+        kkt.open_session()
+        try:
+            while not (self._stopped and self.queue.empty()):
+                priority, order, item = self.queue.get()
+                if item is _STOP:
+                    break
+                self._execute(priority, item)
+        finally:
+            kkt.worker = None
+            try:
+                kkt.close_session()
+            except Exception:
+                pass
+
+    def _execute(self, priority, item):
+        future, method, args, kwargs, queued = item
+        with self._lock:
+            self._depth[priority] -= 1
+        if not future.set_running_or_notify_cancel():
+            return
+        started = time.time()
+        future.queue_delay = delay = started - queued
+        current = priority
+        if not getattr(method, 'preemptible', True):
+            current = _ATOMIC_PRIORITY
+        previous, self._current = self._current, current
+        try:
+            result = method(self.kkt, *args, **kwargs)
+        except Exception as e:
+            failed = True
+            future.set_exception(e)
+        else:
+            failed = False
+            future.set_result(result)
+        finally:
+            self._current = previous
+        self._account(priority, delay, time.time() - started, failed)
+
+    def _account(self, priority, delay, duration, failed):
+        with self._lock:
+            self._completed += 1
+            if failed:
+                self._failed += 1
+            self._wait_total += delay
+            if delay > self._wait_max:
+                self._wait_max = delay
+            self._busy_total += duration
+            stats = self._classes.get(priority)
+            if stats is None:
+                stats = self._classes[priority] = [0, 0.0, 0.0]
+            stats[0] += 1
+            stats[1] += delay
+            if delay > stats[2]:
+                stats[2] = delay
+
+    def reset_stats(self):
+        """ Сбрасывает статистику (кроме текущей длины очереди) """
+        with self._lock:
+            self._submitted  = 0
+            self._completed  = 0
+            self._failed     = 0
+            self._wait_total = 0.0
+            self._wait_max   = 0.0
+            self._busy_total = 0.0
+            # {приоритет: [выполнено, суммарное и максимальное ожидание]}
+            self._classes = {}
+            if not hasattr(self, '_depth'):
+                # {приоритет: команд в очереди}
+                self._depth = {}
+
+    def stats(self):
+        """ Статистика: поставлено, выполнено и завершено ошибкой
+            команд, текущая длина очереди, среднее и максимальное время
+            ожидания в очереди и суммарное время выполнения (сек.).
+            В classes - длина очереди, количество выполненных команд и
+            время ожидания по классам приоритета (PRIORITY_NAMES).
+        """
+        with self._lock:
+            completed = self._completed
+            classes = {}
+            for priority, name in PRIORITY_NAMES.items():
+                count, total, maximum = self._classes.get(priority,
+                                                          (0, 0.0, 0.0))
+                classes[name] = {
+                    'queued':    self._depth.get(priority, 0),
+                    'completed': count,
+                    'wait_avg':  total / count if count else 0.0,
+                    'wait_max':  maximum,
+                }
+            return {
+                'submitted': self._submitted,
+                'completed': completed,
+                'failed':    self._failed,
+                'queued':    sum(self._depth.values()),
+                'wait_avg':  self._wait_total / completed if completed else 0.0,
+                'wait_max':  self._wait_max,
+                'busy':      self._busy_total,
+                'classes':   classes,
+            }
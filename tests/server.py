@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+#
+#  Copyright 2013 Grigoriy Kramarenko <root@rosix.ru>
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+#  MA 02110-1301, USA.
+#
+#
+
+### Сетевая ККТ для тестов ###
+#
+# Локальный TCP-сервер, который передаёт принятые байты обработчику
+# (по-умолчанию новому Emulator на каждое соединение) и отправляет его
+# ответ обратно - как преобразователь RS-232/Ethernet с ККТ.
+
+from __future__ import unicode_literals
+import socket
+import threading
+
+from shtrihmfr.emulator import Emulator
+
+
+class EmulatorServer(object):
+    """ TCP-сервер на 127.0.0.1 и свободном порту.
+
+        handler_factory() возвращает обработчик соединения: функцию,
+        принимающую байты и возвращающую байты ответа.
+    """
+
+    def __init__(self, handler_factory=Emulator):
+        self.handler_factory = handler_factory
+        self.connections = 0
+        self._sockets = []
+        self._listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._listener.bind(('127.0.0.1', 0))
+        self._listener.listen(8)
+        self.port = self._listener.getsockname()[1]
+        self.url = 'tcp://127.0.0.1:%d' % self.port
+        self._thread = threading.Thread(target=self.serve)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def serve(self):
+        while True:
+            try:
+                sock, _ = self._listener.accept()
+            except (IOError, OSError):
+                return
+            self.connections += 1
+            self._sockets.append(sock)
+            thread = threading.Thread(target=self.handle,
+                                      args=(sock, self.handler_factory()))
+            thread.daemon = True
+            thread.start()
+
+    def handle(self, sock, handler):
+        try:
+            while True:
+                data = sock.recv(1024)
+                if not data:
+                    break
+                answer = handler(data)
+                if answer:
+                    sock.sendall(answer)
+        except (IOError, OSError):
+            pass
+        finally:
+            sock.close()
+
+    def stop(self):
+        self._listener.close()
+        for sock in self._sockets:
+            try:
+                sock.close()
+            except (IOError, OSError):
+                pass
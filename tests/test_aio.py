@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+import sys
+import time
+import unittest
+
+from shtrihmfr.kkt import KKT, KktError
+from shtrihmfr.retry import RetryPolicy
+
+from .server import EmulatorServer
+from .test_emulator import CorruptAnswer
+from .test_recovery import FaultyEmulator
+from .test_session import SlowEmulator
+
+if sys.version_info >= (3, 5):
+    import asyncio
+    from shtrihmfr.aio import AsyncKKT
+
+
+@unittest.skipIf(sys.version_info < (3, 5), 'AsyncKKT требует Python 3.5+')
+class AsyncKKTTest(unittest.TestCase):
+    """ Команды, собирающие сообщение из шаблона (BaseKKT.template) """
+
+    def setUp(self):
+        self.emulator = FaultyEmulator()
+        self.server = EmulatorServer(lambda: self.emulator)
+        self.loop = asyncio.new_event_loop()
+        self.kkt = AsyncKKT(port=self.server.url)
+
+    def tearDown(self):
+        self.wait(self.kkt.disconnect())
+        self.loop.close()
+        self.server.stop()
+
+    def wait(self, coroutine):
+        return self.loop.run_until_complete(coroutine)
+
+    def test_x10(self):
+        self.assertEqual(self.wait(self.kkt.x10()).kkt_mode, 4)
+
+    def test_x17(self):
+        self.assertEqual(self.wait(self.kkt.x17('Строка')), 1)
+
+    def test_sale(self):
+        self.wait(self.kkt.x80(2, 10.5, 'Товар'))
+        self.assertEqual(self.emulator.receipt_total, 2100)
+        self.wait(self.kkt.x89())
+        change = self.wait(self.kkt.x85(cash=25))
+        self.assertEqual(change.odd, 4.0)
+
+    def test_registers(self):
+        self.emulator.registers[241] = 12345
+        registers = self.wait(self.kkt.call(KKT.money_registers, [240, 241]))
+        self.assertEqual(registers[241], 123.45)
+        self.assertEqual(registers[240], 0)
+
+    def test_call_once(self):
+        calls = []
+        def method(kkt, numbers):
+            calls.append(numbers)
+            return KKT.money_registers(kkt, numbers)
+        self.emulator.log = []
+        self.wait(self.kkt.call(method, range(16)))
+        # Команда выполнена один раз, запросы к ККТ не повторялись
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(self.emulator.log, [0x1A] * 16)
+
+    def test_templates(self):
+        # Шаблоны собираются один раз на клиента
+        self.wait(self.kkt.x10())
+        templates = dict(self.kkt._templates)
+        self.wait(self.kkt.x10())
+        self.wait(self.kkt.money_registers([240, 241]))
+        self.assertIs(self.kkt._templates[(0x10, b'', 0)],
+                      templates[(0x10, b'', 0)])
+
+    def test_no_threads(self):
+        # Команды выполняются в цикле событий, без исполнителя
+        class NoExecutor(object):
+            def submit(self, *args, **kwargs):
+                raise AssertionError('Команда заняла поток исполнителя')
+        self.kkt.executor = NoExecutor()
+        self.assertEqual(self.wait(self.kkt.x10()).kkt_mode, 4)
+        self.wait(self.kkt.x80(1, 10, 'Товар'))
+        self.assertEqual(self.wait(self.kkt.x85(cash=20)).odd, 10.0)
+        self.assertEqual(self.wait(self.kkt.x17_loop('x' * 40)), 1)
+
+
+@unittest.skipIf(sys.version_info < (3, 5), 'AsyncKKT требует Python 3.5+')
+class AsyncFleetTest(unittest.TestCase):
+    """ Много устройств в одном цикле событий """
+
+    def test_parallel(self):
+        count, delay = 40, 0.3
+        servers = [ EmulatorServer(SlowEmulator) for i in range(count) ]
+        for server in servers:
+            self.addCleanup(server.stop)
+        clients = [ AsyncKKT(port=server.url) for server in servers ]
+        loop = asyncio.new_event_loop()
+        self.addCleanup(loop.close)
+        SlowEmulator.delay, default = delay, SlowEmulator.delay
+        self.addCleanup(setattr, SlowEmulator, 'delay', default)
+
+        async def each(name):
+            return await asyncio.gather(*[ getattr(kkt, name)()
+                                           for kkt in clients ])
+
+        loop.run_until_complete(each('connect'))
+        started = time.time()
+        states = loop.run_until_complete(each('x10'))
+        elapsed = time.time() - started
+        loop.run_until_complete(each('disconnect'))
+        self.assertEqual([ state.kkt_mode for state in states ], [4] * count)
+        # Все устройства отвечают одновременно, а не по числу потоков
+        self.assertLess(elapsed, delay * 2)
+
+    def test_corrupt_answer(self):
+        handler = CorruptAnswer()
+        server = EmulatorServer(lambda: handler)
+        self.addCleanup(server.stop)
+        loop = asyncio.new_event_loop()
+        self.addCleanup(loop.close)
+        kkt = AsyncKKT(port=server.url)
+        self.assertEqual(loop.run_until_complete(kkt.x10()).kkt_mode, 4)
+        loop.run_until_complete(kkt.disconnect())
+        self.assertTrue(handler.corrupted)
+        # Ответ запрошен повторно через ENQ после NAK
+        received = bytes(handler.received)
+        self.assertIn(b'\x15', received)
+        self.assertIn(b'\x05', received[received.index(b'\x15'):])
+
+    def test_lock_in_loop(self):
+        # Клиент создан вне цикла, блокировка - в цикле первой команды
+        with EmulatorServer() as server:
+            kkt = AsyncKKT(port=server.url)
+            self.assertIsNone(kkt._lock)
+            loop = asyncio.new_event_loop()
+            self.addCleanup(loop.close)
+            self.assertEqual(loop.run_until_complete(kkt.x10()).kkt_mode, 4)
+            self.assertIsNotNone(kkt._lock)
+            loop.run_until_complete(kkt.disconnect())
+
+
+@unittest.skipIf(sys.version_info < (3, 5), 'AsyncKKT требует Python 3.5+')
+class AsyncRecoveryTest(unittest.TestCase):
+    """ Восстановление после ошибок ККТ, как в BaseKKT.ask """
+
+    def setUp(self):
+        self.emulator = FaultyEmulator()
+        self.server = EmulatorServer(lambda: self.emulator)
+        self.loop = asyncio.new_event_loop()
+        self.kkt = AsyncKKT(port=self.server.url, retry_policy=RetryPolicy(
+            deadline=2, attempts=3, backoff=0.01))
+
+    def tearDown(self):
+        self.loop.run_until_complete(self.kkt.disconnect())
+        self.loop.close()
+        self.server.stop()
+
+    def wait(self, coroutine):
+        return self.loop.run_until_complete(coroutine)
+
+    def test_disabled_by_default(self):
+        self.emulator.failing, self.emulator.failures = 0x10, 1
+        self.assertRaises(KktError, self.wait, self.kkt.x10())
+        self.assertEqual(self.emulator.log, [0x10])
+
+    def test_retry(self):
+        self.kkt.auto_recover = True
+        self.emulator.failing, self.emulator.failures = 0x10, 2
+        self.assertEqual(self.wait(self.kkt.x10()).kkt_mode, 4)
+        self.assertEqual(self.emulator.log, [0x10, 0x10, 0x10])
+        self.assertEqual(self.kkt.recoveries, 2)
+
+    def test_retry_budget(self):
+        self.kkt.auto_recover = True
+        self.emulator.failing, self.emulator.failures = 0x10, 100
+        self.assertRaises(KktError, self.wait, self.kkt.x10())
+        self.assertEqual(len(self.emulator.log), 4)
+
+    def test_continue_print(self):
+        self.kkt.auto_recover = True
+        self.emulator.error, self.emulator.failures = 0x58, 1
+        self.assertEqual(self.wait(self.kkt.x17('Строка')), 1)
+        self.assertEqual(self.emulator.log, [0x17, 0xB0, 0x17])
+
+
+if __name__ == '__main__':
+    unittest.main()
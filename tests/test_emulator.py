@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+import time
+import unittest
+
+from shtrihmfr.emulator import Emulator, ENQ, STX, ACK, NAK
+from shtrihmfr.kkt import KKT, KktError, ConnectionError
+from shtrihmfr.transport import LoopbackTransport
+from shtrihmfr.utils import lrc
+
+
+def frame(command, params=b'\x1e\x00\x00\x00'):
+    content = bytearray((len(params) + 1, command)) + bytearray(params)
+    return bytes(bytearray((STX,)) + content + bytearray((lrc(content),)))
+
+
+class CorruptAnswer(object):
+    """ Обработчик, искажающий контрольную сумму первого ответа """
+
+    def __init__(self):
+        self.emulator = Emulator()
+        self.corrupted = False
+        self.received = bytearray()
+
+    def __call__(self, data):
+        self.received += bytearray(data)
+        answer = bytearray(self.emulator(data))
+        if not self.corrupted and len(answer) > 2:
+            answer[-1] ^= 0xFF
+            self.corrupted = True
+        return bytes(answer)
+
+
+class LostAnswer(CorruptAnswer):
+    """ Обработчик, у которого после искажённого ответа ККТ теряет его
+        и на ENQ сообщает об ожидании команды
+    """
+
+    def __call__(self, data):
+        if self.corrupted and bytearray(data) == bytearray((ENQ,)):
+            self.emulator._pending = None
+        return super(LostAnswer, self).__call__(data)
+
+
+class EmulatorProtocolTest(unittest.TestCase):
+
+    def test_enq(self):
+        emulator = Emulator()
+        self.assertEqual(emulator(bytearray((ENQ,))), bytearray((NAK,)))
+        answer = emulator(frame(0x10))
+        self.assertEqual(bytearray(answer)[0], ACK)
+        pending = answer[1:]
+        # Неподтверждённый ответ повторяется после ACK
+        self.assertEqual(emulator(bytearray((ENQ,))),
+                         bytearray((ACK,)) + bytearray(pending))
+        emulator(bytearray((ACK,)))
+        self.assertEqual(emulator(bytearray((ENQ,))), bytearray((NAK,)))
+
+    def test_nak(self):
+        emulator = Emulator()
+        pending = emulator(frame(0x10))[1:]
+        # После NAK ответ не повторяется, ККТ ждёт ENQ
+        self.assertEqual(emulator(bytearray((NAK,))), b'')
+        self.assertEqual(emulator(bytearray((ENQ,))),
+                         bytearray((ACK,)) + bytearray(pending))
+
+    def test_empty_frame(self):
+        emulator = Emulator()
+        # STX, нулевая длина и LRC - без кода команды
+        self.assertEqual(emulator(b'\x02\x00\x00'), bytearray((NAK,)))
+        self.assertIsNone(emulator._pending)
+        self.assertEqual(bytearray(emulator(frame(0x10)))[0], ACK)
+
+
+class DriverRecoveryTest(unittest.TestCase):
+
+    def test_nak_resend(self):
+        handler = CorruptAnswer()
+        kkt = KKT(transport=LoopbackTransport(handler=handler))
+        self.assertEqual(kkt.x10()['kkt_mode'], 4)
+        self.assertTrue(handler.corrupted)
+        self.assertIsNone(handler.emulator._pending)
+        # Повтор ответа запрошен через ENQ после NAK
+        self.assertIn(bytearray((NAK, ENQ)), handler.received)
+
+    def test_nak_lost_answer(self):
+        handler = LostAnswer()
+        kkt = KKT(transport=LoopbackTransport(handler=handler))
+        started = time.time()
+        try:
+            kkt.x10()
+        except ConnectionError:
+            self.fail('Искажённый ответ принят за отсутствие связи')
+        except KktError as e:
+            self.assertIn('Контрольная сумма', '%s' % e)
+        else:
+            self.fail('Искажённый ответ принят')
+        self.assertLess(time.time() - started, 0.5)
+
+    def test_clear_pending_answer(self):
+        emulator = Emulator()
+        transport = LoopbackTransport(handler=emulator)
+        kkt = KKT(transport=transport)
+        kkt.connect()
+        # Ответ остался в ККТ неподтверждённым
+        emulator(frame(0x10))
+        self.assertIsNotNone(emulator._pending)
+        self.assertTrue(kkt.clear())
+        self.assertIsNone(emulator._pending)
+        self.assertEqual(kkt.x11()['serial_number'], 12345678)
+
+
+
+class EmulatorCommandsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.emulator = Emulator()
+        self.kkt = KKT(transport=LoopbackTransport(handler=self.emulator))
+
+    def test_payload_sizes(self):
+        self.assertEqual(self.kkt.xE7(), 30)
+        # Ответ короче 16 байт схема не разберёт
+        self.assertEqual(self.kkt.xBA(1), Emulator.device_name)
+        self.assertEqual(self.kkt.xCA(), 0)
+
+    def test_document_header(self):
+        operator = self.emulator.operator(self.kkt.password)
+        self.assertEqual(self.kkt.x18('Накладная', 7), operator)
+        self.assertEqual(self.emulator.document, 1)
+        self.assertRaises(KktError, self.kkt.x18, 'x' * 31)
+
+    def test_errors_keep_state(self):
+        # Отдел вне диапазона: чек не открывается
+        self.assertRaises(KktError, self.kkt.x80, 1, 10, 'Товар', 17)
+        self.assertEqual(self.emulator.mode, 4)
+        self.kkt.x80(1, 10, 'Товар')
+        self.emulator.operations = 0xFFFF
+        try:
+            self.kkt.x80(1, 10, 'Товар')
+        except KktError as e:
+            self.assertEqual(e.value, 0x94)
+        else:
+            self.fail('Ошибка 94H не выброшена')
+        self.assertEqual(self.emulator.operations, 0xFFFF)
+        self.assertEqual(self.emulator.receipt_total, 1000)
+
+    def test_cash_out_keeps_state(self):
+        # Не хватает наличности: смена не открывается
+        self.assertRaises(KktError, self.kkt.x51, 10)
+        self.assertEqual(self.emulator.mode, 4)
+        self.assertEqual(self.emulator.session, 0)
+        self.kkt.x50(10)
+        self.assertEqual(self.emulator.mode, 2)
+        self.assertEqual(self.emulator.cash, 1000)
+
+    def test_registers(self):
+        # Пакетное чтение совпадает с чтением регистров по одному
+        for number in range(256):
+            self.emulator.registers[number] = number * 0x10203 + 1
+            self.emulator.registers[0x100 + number] = number * 0x101
+        self.emulator.registers[255] = (1 << 48) - 1
+        money = self.kkt.money_registers()
+        operations = self.kkt.operation_registers()
+        self.assertEqual(len(money), 256)
+        self.assertEqual(len(operations), 256)
+        for number in range(256):
+            self.assertEqual(money[number], self.kkt.x1A(number))
+            self.assertEqual(operations[number], self.kkt.x1B(number))
+        self.assertEqual(money.values[255], (1 << 48) - 1)
+        self.assertEqual(operations[255], 0xFFFF)
+        self.assertEqual(money.name(241), 'Накопление наличности в кассе')
+        self.assertEqual(money.name(121),
+                         'Накопление приходов в 1 отдел за смену')
+        self.assertEqual(operations.name(152), 'Сквозной номер документа')
+        self.assertEqual(operations.name(200), 'Регистр 200')
+
+
+if __name__ == '__main__':
+    unittest.main()
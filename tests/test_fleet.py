@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+import socket
+import unittest
+
+from shtrihmfr.emulator import Emulator
+from shtrihmfr.fleet import Fleet, Device
+from shtrihmfr.kkt import KktError, ConnectionError
+
+from .server import EmulatorServer
+
+
+def closed_url():
+    """ Адрес порта, на котором никто не слушает """
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return 'tcp://127.0.0.1:%d' % port
+
+
+class NumberedEmulator(Emulator):
+    """ Эмулятор со своим заводским номером """
+
+    def __init__(self, serial_number, **kwargs):
+        super(NumberedEmulator, self).__init__(**kwargs)
+        self.serial_number = serial_number
+
+
+class FleetTest(unittest.TestCase):
+
+    def setUp(self):
+        self.servers = []
+        for number in (1001, 1002):
+            server = EmulatorServer(
+                lambda number=number: NumberedEmulator(number))
+            self.addCleanup(server.stop)
+            self.servers.append(server)
+        self.missing = closed_url()
+        self.ports = [ server.url for server in self.servers ]
+        self.fleet = Fleet(self.ports + [self.missing], timeout=0.2).start()
+        self.addCleanup(self.fleet.stop)
+
+    def test_run(self):
+        result = self.fleet.run('x10')
+        self.assertEqual(sorted(result), sorted(self.ports))
+        for port in self.ports:
+            self.assertEqual(result[port].kkt_mode, 4)
+        # Недоступное устройство не мешает остальным
+        self.assertFalse(result.ok)
+        self.assertEqual(list(result.errors), [self.missing])
+        self.assertIsInstance(result.errors[self.missing], ConnectionError)
+        self.assertRaises(ConnectionError, result.__getitem__, self.missing)
+        # Команды KKT доступны у группы под теми же именами
+        self.assertEqual(sorted(self.fleet.x10()), sorted(self.ports))
+
+    def test_errors(self):
+        # Ошибка одного устройства собирается отдельно
+        failing = self.ports[0]
+        def check(kkt):
+            if kkt.port == failing:
+                raise KktError('Сбой')
+            return kkt.x10().kkt_mode
+        result = self.fleet.run(check)
+        self.assertEqual(result.results, {self.ports[1]: 4})
+        self.assertEqual(sorted(result.errors), sorted([failing, self.missing]))
+        self.assertEqual(str(result.errors[failing]), 'Сбой')
+
+    def test_identify(self):
+        result = self.fleet.identify()
+        self.assertEqual(list(result.errors), [self.missing])
+        self.assertEqual(result[self.ports[0]],
+                         Device(self.ports[0], 1001, Emulator.device_name))
+        # Неответившее устройство исключается из группы
+        self.assertEqual(list(self.fleet), sorted(self.ports))
+        self.assertEqual(len(self.fleet), 2)
+        self.assertTrue(self.fleet.run('x10').ok)
+
+    def test_find(self):
+        self.assertIsNone(self.fleet.find(1001))
+        self.fleet.identify(remove=False)
+        self.assertEqual(self.fleet.find(1001), self.ports[0])
+        self.assertEqual(self.fleet.find(1002), self.ports[1])
+        self.assertIsNone(self.fleet.find(9999))
+        self.assertEqual(len(self.fleet), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+import struct
+import unittest
+
+from shtrihmfr.utils import Integer
+
+
+def boundaries(integer):
+    """ Граничные значения целого и соседние с ними """
+    if integer.signed:
+        low, high = -(1 << (integer.bits - 1)), (1 << (integer.bits - 1)) - 1
+    else:
+        low, high = 0, (1 << integer.bits) - 1
+    values = set([low, low + 1, high - 1, high, 0, 1])
+    if integer.signed:
+        values.update([-1, -2])
+    return low, high, sorted(values)
+
+
+class IntegerTest(unittest.TestCase):
+
+    def integers(self):
+        for size in range(1, 9):
+            for signed in (False, True):
+                yield Integer(size, signed)
+
+    def test_round_trip(self):
+        for integer in self.integers():
+            low, high, values = boundaries(integer)
+            data = integer.pack_many(values)
+            self.assertEqual(len(data), integer.size * len(values))
+            self.assertEqual(integer.unpack_many(data), values, integer)
+            for i, value in enumerate(values):
+                self.assertEqual(integer.unpack_from(data, i * integer.size),
+                                 value, integer)
+                self.assertEqual(integer.unpack(integer.pack(value)), value)
+
+    def test_struct_parts(self):
+        # Путь Python 2: части для struct собираются обратно в то же целое
+        for integer in self.integers():
+            for value in boundaries(integer)[2]:
+                if integer.native:
+                    data = integer._struct.pack(value)
+                else:
+                    data = integer._struct.pack(*integer._split(value))
+                self.assertEqual(data, integer.pack(value), integer)
+                if not integer.native:
+                    self.assertEqual(integer._join(
+                        integer._struct.unpack(data)), value, integer)
+
+    def test_byte_order(self):
+        self.assertEqual(Integer(3).pack(0x030201), b'\x01\x02\x03')
+        self.assertEqual(Integer(5, True).pack(-2), b'\xfe\xff\xff\xff\xff')
+        data = b'\xff' * 6 + b'\x01' + b'\x00' * 5
+        self.assertEqual(Integer(6).unpack_many(data), [(1 << 48) - 1, 1])
+
+    def test_overflow(self):
+        for integer in self.integers():
+            low, high, values = boundaries(integer)
+            self.assertRaises(OverflowError, integer.pack, high + 1)
+            self.assertRaises(OverflowError, integer.pack, low - 1)
+            self.assertRaises(OverflowError, integer.pack_many,
+                              [0, high + 1])
+            if not integer.native:
+                self.assertRaises(OverflowError, integer._split, high + 1)
+                self.assertRaises(OverflowError, integer._split, low - 1)
+
+    def test_many(self):
+        integer = Integer(3, True)
+        values = [-1, 0, 0x7FFFFF, -0x800000]
+        data = b'\xaa' + integer.pack_many(values)
+        self.assertEqual(integer.unpack_many(data, offset=1), values)
+        self.assertEqual(integer.unpack_many(data, 2, offset=4), values[1:3])
+        self.assertEqual(integer.unpack_many(b''), [])
+        self.assertRaises(struct.error, integer.unpack_many, data, 5)
+        self.assertRaises(ValueError, Integer, 9)
+        self.assertRaises(ValueError, Integer, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
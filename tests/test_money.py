@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+import unittest
+from decimal import Decimal
+
+from shtrihmfr.emulator import Emulator
+from shtrihmfr.kkt import KKT
+from shtrihmfr.transport import LoopbackTransport
+from shtrihmfr.utils import (money2integer, integer2money, integer2decimal,
+                             MONEY_TYPES)
+
+
+class MoneyTest(unittest.TestCase):
+
+    def test_half_up(self):
+        # Половина копейки округляется вверх, без двойного округления
+        for money, integer in ((1.005, 101), (2.675, 268), (0.125, 13),
+                               (0.005, 1), (1.0049999, 100), (2.5, 250),
+                               (-1.005, -101), (-1.234, -123)):
+            self.assertEqual(money2integer(money), integer, money)
+
+    def test_decimal(self):
+        for money, integer in (('1.005', 101), ('2.675', 268),
+                               ('0.004', 0), ('0.005', 1),
+                               ('-0.005', -1), ('12345678.99', 1234567899)):
+            self.assertEqual(money2integer(Decimal(money)), integer, money)
+
+    def test_digits(self):
+        self.assertEqual(money2integer(2.3456, 3), 2346)
+        self.assertEqual(money2integer(1.0005, 3), 1001)
+        self.assertEqual(money2integer(Decimal('1.0005'), 3), 1001)
+        self.assertEqual(money2integer(3, 3), 3000)
+        self.assertEqual(integer2money(2346, 3), 2.346)
+        self.assertEqual(integer2decimal(2346, 3), Decimal('2.346'))
+
+    def test_round_trip(self):
+        values = {
+            float:   [1.0, 0.01, 12.34, 99.99, 1.1, 123456.78],
+            Decimal: [Decimal('1'), Decimal('0.01'), Decimal('12.34'),
+                      Decimal('99.99'), Decimal('123456.78')],
+            int:     [0, 1, 1234, 9999, 12345678],
+        }
+        for money_type, (to_integer, to_money) in MONEY_TYPES.items():
+            kkt = KKT(money_type=money_type)
+            for value in values[money_type]:
+                result = kkt.integer2money(kkt.money2integer(value))
+                self.assertEqual(result, value)
+                self.assertIs(result.__class__, money_type)
+            # Целые копейки переводятся туда и обратно без потерь
+            for integer in range(0, 100000, 7):
+                self.assertEqual(to_integer(to_money(integer, 2), 2), integer)
+
+    def test_money_type_inputs(self):
+        # Типы, отличные от money_type, тоже переводятся точно
+        self.assertEqual(KKT().money2integer(Decimal('1.005')), 101)
+        self.assertEqual(KKT().money2integer(5), 500)
+        kkt = KKT(money_type=int)
+        self.assertEqual(kkt.money2integer(1234), 1234)
+        self.assertEqual(kkt.money2integer(12.345), 1235)
+        self.assertEqual(kkt.money2integer(Decimal('12.345')), 1235)
+        kkt = KKT(money_type=Decimal)
+        self.assertEqual(kkt.money2integer(1.005), 101)
+
+    def test_device(self):
+        emulator = Emulator()
+        kkt = KKT(transport=LoopbackTransport(handler=emulator),
+                  money_type=Decimal)
+        kkt.x80(Decimal('2'), Decimal('10.505'), 'Товар')
+        self.assertEqual(emulator.receipt_total, 2102)
+        odd = kkt.x85(cash=Decimal('25'))['odd']
+        self.assertEqual(odd, Decimal('3.98'))
+        self.assertIs(odd.__class__, Decimal)
+
+
+if __name__ == '__main__':
+    unittest.main()
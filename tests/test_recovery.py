@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+import unittest
+
+from shtrihmfr.emulator import Emulator
+from shtrihmfr.kkt import KKT, KktError
+from shtrihmfr.protocol import (BUG_ACTIONS, ACTION_ABORT, ACTION_RETRY,
+                                ACTION_CONTINUE)
+from shtrihmfr.retry import RetryPolicy
+from shtrihmfr.transport import LoopbackTransport
+
+
+class FaultyEmulator(Emulator):
+    """ Эмулятор, отвечающий на команду failing ошибкой error failures
+        раз. При error 58H команды, кроме B0H, отклоняются, пока не
+        будет выполнено продолжение печати.
+    """
+    failing  = None
+    error    = 0x50
+    failures = 0
+
+    def __init__(self, **kwargs):
+        super(FaultyEmulator, self).__init__(**kwargs)
+        self.log = []
+
+    def execute(self, command, params):
+        self.log.append(command)
+        if self.error == 0x58 and self.failures:
+            if command == 0xB0:
+                self.failures = 0
+            else:
+                return 0x58, bytearray()
+        elif command == self.failing and self.failures:
+            self.failures -= 1
+            return self.error, bytearray()
+        return Emulator.execute(self, command, params)
+
+
+class RecoveryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.emulator = FaultyEmulator()
+        self.kkt = KKT(transport=LoopbackTransport(handler=self.emulator),
+                       retry_policy=RetryPolicy(deadline=2, backoff=0.01))
+
+    def fail_with(self, error, command=0x10, failures=1):
+        self.emulator.error = error
+        self.emulator.failing = command
+        self.emulator.failures = failures
+
+    def test_classification(self):
+        self.assertEqual(BUG_ACTIONS[0x50][1], ACTION_RETRY)
+        self.assertEqual(BUG_ACTIONS[0x58][1], ACTION_CONTINUE)
+        for code in (0x06, 0x67, 0x6A, 0x80, 0x81, 0x82, 0x83, 0x93, 0xA0):
+            self.assertEqual(BUG_ACTIONS[code][1], ACTION_ABORT)
+        # Классы ошибок не подменяют времена выполнения команд печати
+        self.assertEqual(BUG_ACTIONS[0x58][0], 'print')
+        self.assertEqual(KKT().get_duration(0x17), (0.3, 10))
+
+    def test_disabled_by_default(self):
+        self.fail_with(0x50)
+        try:
+            self.kkt.x10()
+        except KktError as e:
+            self.assertEqual(e.action, ACTION_RETRY)
+            self.assertTrue(e.retryable)
+        else:
+            self.fail('Ошибка 50H не выброшена')
+        self.assertEqual(self.emulator.log, [0x10])
+
+    def test_retry(self):
+        self.kkt.auto_recover = True
+        self.fail_with(0x50, failures=2)
+        self.assertEqual(self.kkt.x10()['kkt_mode'], 4)
+        self.assertEqual(self.emulator.log, [0x10, 0x10, 0x10])
+        self.assertEqual(self.kkt.recoveries, 2)
+
+    def test_retry_budget(self):
+        self.kkt.auto_recover = True
+        self.kkt.retry_policy = RetryPolicy(deadline=2, attempts=3,
+                                            backoff=0.01)
+        self.fail_with(0x50, failures=100)
+        self.assertRaises(KktError, self.kkt.x10)
+        self.assertEqual(len(self.emulator.log), 4)
+
+    def test_continue_print(self):
+        self.kkt.auto_recover = True
+        self.fail_with(0x58)
+        self.assertEqual(self.kkt.x17('Строка'), 1)
+        self.assertEqual(self.emulator.log, [0x17, 0xB0, 0x17])
+
+    def test_fiscal_link_error(self):
+        self.kkt.auto_recover = True
+        self.fail_with(0x67, command=0x80)
+        try:
+            self.kkt.x80(1, 10, 'Товар')
+        except KktError as e:
+            self.assertEqual(e.action, ACTION_ABORT)
+            self.assertFalse(e.retryable)
+        else:
+            self.fail('Ошибка 67H не выброшена')
+        # Продажа не отправлена повторно
+        self.assertEqual(self.emulator.log, [0x80])
+
+
+if __name__ == '__main__':
+    unittest.main()
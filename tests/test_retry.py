@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+import time
+import unittest
+
+from shtrihmfr.retry import RetryPolicy
+
+
+class RetryPolicyTest(unittest.TestCase):
+
+    def test_delay(self):
+        policy = RetryPolicy(backoff=0.01, multiplier=2, max_backoff=0.05,
+                             jitter=0)
+        self.assertEqual([ policy.delay(i) for i in range(4) ],
+                         [0.01, 0.02, 0.04, 0.05])
+        policy.jitter = 0.5
+        for i in range(100):
+            self.assertTrue(0.005 <= policy.delay(0) <= 0.015)
+
+    def test_start(self):
+        # Без своего крайнего срока берётся время выполнения команды
+        retry = RetryPolicy(deadline=None).start(5)
+        self.assertTrue(4.5 < retry.remaining() <= 5)
+        retry = RetryPolicy(deadline=1).start(5)
+        self.assertTrue(retry.remaining() <= 1)
+
+    def test_budget(self):
+        # Запас повторов кончился раньше крайнего срока
+        retry = RetryPolicy(deadline=10, attempts=3, backoff=0.001,
+                            multiplier=2, jitter=0).start()
+        self.assertEqual([ retry.take() for i in range(3) ],
+                         [0.001, 0.002, 0.004])
+        self.assertEqual(retry.left, 0)
+        self.assertIsNone(retry.take())
+        self.assertFalse(retry.sleep())
+        self.assertFalse(retry.expired())
+
+    def test_deadline(self):
+        # Крайний срок обрывает повторы, хотя запас не израсходован
+        retry = RetryPolicy(deadline=0.1, attempts=100, backoff=0.03,
+                            multiplier=1, jitter=0).start()
+        started = time.time()
+        count = 1
+        while retry.sleep():
+            count += 1
+        self.assertTrue(0.09 <= time.time() - started < 0.3)
+        self.assertTrue(count <= 4)
+        self.assertTrue(retry.left > 90)
+        self.assertTrue(retry.expired())
+        self.assertIsNone(retry.take())
+
+    def test_backoff_until_deadline(self):
+        # Пауза не дольше остатка времени до крайнего срока
+        retry = RetryPolicy(deadline=0.05, backoff=10, jitter=0).start()
+        self.assertTrue(retry.take() <= 0.05)
+        started = time.time()
+        self.assertFalse(retry.sleep())
+        self.assertTrue(time.time() - started < 0.1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+import datetime
+import struct
+import unittest
+
+from shtrihmfr.decoders import decode_x11
+from shtrihmfr.emulator import Emulator
+from shtrihmfr.kkt import KKT, KktError
+from shtrihmfr.schema import COMMANDS
+from shtrihmfr.transport import LoopbackTransport
+from shtrihmfr.utils import CODE_PAGE
+
+
+class SchemaEmulator(Emulator):
+    """ Эмулятор, который запоминает параметры команд и отвечает
+        заданными данными answers {код: данные}.
+    """
+
+    def __init__(self, **kwargs):
+        super(SchemaEmulator, self).__init__(**kwargs)
+        self.answers = {}
+        self.requests = {}
+
+    def execute(self, command, params):
+        self.requests[command] = bytes(params)
+        if command in self.answers:
+            return 0, bytearray(self.answers[command])
+        return Emulator.execute(self, command, params)
+
+
+class SchemaTest(unittest.TestCase):
+
+    def setUp(self):
+        self.emulator = SchemaEmulator()
+        self.kkt = KKT(transport=LoopbackTransport(handler=self.emulator))
+
+    def answer(self, command, data):
+        self.emulator.answers[command] = data
+
+    def request(self, command):
+        """ Параметры команды без пароля """
+        return self.emulator.requests[command][4:]
+
+    # Ответы эмулятора
+
+    def test_state(self):
+        # Схема и decode_x11 разбирают один ответ одинаково
+        state = self.kkt.x11()
+        result = self.kkt.execute(0x11)
+        for name in ('operator', 'kkt_build', 'kkt_date', 'document',
+                     'kkt_flags', 'kkt_mode', 'fp_flags', 'serial_number',
+                     'last_closed_session', 'inn', 'date'):
+            self.assertEqual(result[name], state[name], name)
+        self.assertEqual(result.serial_number, Emulator.serial_number)
+
+    def test_money(self):
+        self.emulator.registers[241] = 12345
+        self.assertEqual(self.kkt.execute(0x1A, register=241).value, 12345)
+        self.assertEqual(self.kkt.execute(0x50, summa=12.34).document, 1)
+        self.assertEqual(self.emulator.cash, 1234)
+        self.assertEqual(self.request(0x50), b'\xd2\x04\x00\x00\x00')
+
+    def test_fp_totals(self):
+        self.emulator.sales = 100500
+        self.assertEqual(self.kkt.execute(0x62, after=0).sale, 1005.0)
+        self.assertEqual(self.request(0x62), b'\x00')
+        self.assertEqual(self.kkt.x62().sale, 1005.0)
+
+    def test_text(self):
+        self.assertEqual(self.kkt.execute(0xB1).version, 'ЭКЛЗ 0.1')
+        self.assertEqual(self.kkt.execute(0xBA, session=1).kkm,
+                         Emulator.device_name)
+        self.assertEqual(self.kkt.execute(0xFC).device_name,
+                         Emulator.device_name)
+        self.assertEqual(self.kkt.execute(0xAB).eklz_number,
+                         Emulator.serial_number)
+
+    def test_operator(self):
+        # Ответ только с номером оператора возвращается числом
+        self.assertEqual(self.kkt.execute(0xE7), 30)
+        self.assertEqual(self.kkt.execute(0x13),
+                         self.emulator.operator(self.kkt.password))
+
+    # Упаковка параметров
+
+    def test_request_dates(self):
+        self.answer(0x66, bytearray(10))
+        self.kkt.x66(1234, 1, datetime.date(2012, 5, 28),
+                     datetime.date(2013, 1, 2))
+        self.assertEqual(self.emulator.requests[0x66],
+                         struct.pack('<IB', 1234, 1)
+                         + b'\x1c\x05\x0c\x02\x01\x0d')
+
+    def test_request_integers(self):
+        self.answer(0x9A, bytearray((30,)))
+        self.assertEqual(self.kkt.x9A(1, 2, 0x030201, 12.34), 30)
+        self.assertEqual(self.request(0x9A),
+                         b'\x01\x02\x01\x02\x03\xd2\x04\x00')
+
+    def test_request_arrays(self):
+        self.answer(0x73, bytearray((30,)))
+        self.kkt.x73(1, 1.5, 10, 2, [1, 2, 3, 4], 'Товар')
+        data = self.request(0x73)
+        self.assertEqual(len(data), COMMANDS[0x73].request.size)
+        self.assertEqual(data[:13], b'\x01\xdc\x05\x00\x00\x00'
+                                    b'\xe8\x03\x00\x00\x00\x02\x01')
+        self.assertEqual(data[15:17], b'\x04\xd2')
+        # Массив неверной длины отклоняется до отправки
+        self.emulator.requests.clear()
+        self.assertRaises(KktError, self.kkt.x73, 1, 1, 1, 1, [1, 2])
+        self.assertNotIn(0x73, self.emulator.requests)
+
+    def test_request_text(self):
+        self.kkt.x18('Накладная', 0x0102)
+        data = self.request(0x18)
+        self.assertEqual(data[:30], 'Накладная'.encode(CODE_PAGE).ljust(
+            30, b'\x00'))
+        self.assertEqual(data[30:], b'\x02\x01')
+
+    def test_request_tail(self):
+        self.answer(0x7A, bytearray((30,)))
+        self.kkt.x7A(3, 'Строка')
+        self.assertEqual(self.request(0x7A),
+                         b'\x03' + 'Строка'.encode(CODE_PAGE))
+        self.answer(0xC5, bytearray((30,)))
+        self.kkt.xC5(2, b'\x01\x02')
+        self.assertEqual(self.request(0xC5), b'\x02\x00\x01\x02')
+
+    def test_request_operations(self):
+        # Старые команды упаковываются той же схемой
+        self.kkt.x8D(0)
+        self.kkt.x80(1.5, 10, 'Товар', 2, [1, 0, 0, 0])
+        data = self.request(0x80)
+        self.assertEqual(len(data), COMMANDS[0x80].request.size)
+        self.assertEqual(data[:15], b'\xdc\x05\x00\x00\x00'
+                                    b'\xe8\x03\x00\x00\x00\x02\x01\x00\x00\x00')
+        self.assertEqual(self.kkt.x85(cash=20).odd, 5.0)
+        self.assertEqual(self.request(0x85)[:5], b'\xd0\x07\x00\x00\x00')
+        self.kkt.x17('Строка')
+        self.assertEqual(self.request(0x17)[:1], b'\x02')
+        self.assertEqual(len(self.request(0x17)), 41)
+
+    def test_request_settings(self):
+        self.kkt.x22(2013, 5, 28)
+        self.assertEqual(self.request(0x22), b'\x1c\x05\x0d')
+        self.kkt.x21(12, 30, 5)
+        self.assertEqual(self.request(0x21), b'\x0c\x1e\x05')
+        self.assertRaises(KktError, self.kkt.x22, 2013, 2, 30)
+        self.kkt.x1E(1, 2, 3, b'\x04')
+        self.assertEqual(self.request(0x1E), b'\x01\x02\x00\x03\x04')
+        self.kkt.x29(receipt_tape=True, row_count=3)
+        self.assertEqual(self.request(0x29), b'\x02\x03')
+        self.answer(0xA4, bytearray())
+        self.assertTrue(self.kkt.xA4(258))
+        self.assertEqual(self.request(0xA4), b'\x02\x01')
+        self.assertNotIn(0xBA, self.emulator.requests)
+
+    def test_negative_money(self):
+        # Отрицательная сумма - ошибка параметров, а не OverflowError
+        self.assertRaises(KktError, self.kkt.x50, -1)
+        self.assertRaises(KktError, self.kkt.execute, 0x50, summa=-1)
+        self.assertRaises(KktError, self.kkt.x80, -1, 10)
+        self.assertNotIn(0x50, self.emulator.requests)
+        self.assertNotIn(0x80, self.emulator.requests)
+        # Скидка 85H со знаком: отрицательная - надбавка
+        self.kkt.x8D(0)
+        self.kkt.x80(1, 10)
+        self.kkt.x85(cash=20, discount=-1)
+        self.assertEqual(self.request(0x85)[20:22], b'\x9c\xff')
+
+    # Размер ответа
+
+    def test_answer_size(self):
+        size = COMMANDS[0xE6].response.size
+        counts = list(range(24))
+        data = bytearray((30, 1)) + struct.pack('<24I', *counts)
+        self.assertEqual(len(data), size)
+        self.answer(0xE6, data)
+        self.assertEqual(self.kkt.xE6(1).counts, counts)
+        # Лишние байты ответа не мешают разбору
+        self.answer(0xE6, data + b'\x00\x00')
+        self.assertEqual(self.kkt.xE6(1).counts, counts)
+        # Короткий ответ - ошибка ККТ, а не исключение struct
+        self.answer(0xE6, data[:-1])
+        self.assertRaises(KktError, self.kkt.xE6, 1)
+
+    def test_empty_tail(self):
+        self.answer(0xFC, bytearray((0, 0, 1, 0, 0, 0)))
+        self.assertEqual(self.kkt.execute(0xFC).device_name, '')
+        self.answer(0xFC, bytearray(5))
+        self.assertRaises(KktError, self.kkt.execute, 0xFC)
+
+    def test_short_state(self):
+        self.answer(0x11, bytearray(10))
+        self.assertRaises(KktError, self.kkt.x11)
+        self.assertRaises(KktError, self.kkt.execute, 0x11)
+
+    # Нулевая дата
+
+    def test_zero_date(self):
+        self.answer(0x63, bytearray((30, 1, 0, 0, 0)))
+        result = self.kkt.x63()
+        self.assertEqual(result.record_type, 1)
+        self.assertIsNone(result.date)
+
+        data = self.emulator.x11(0x11, b'\x1e\x00\x00\x00')[1]
+        # Текущие дата и время ККТ не заданы
+        data[23:29] = bytearray(6)
+        self.answer(0x11, data)
+        self.assertIsNone(self.kkt.execute(0x11).date)
+        self.assertIsNone(self.kkt.x11().date)
+        self.assertIsNone(decode_x11(data).date)
+        self.assertEqual(decode_x11(data).time, datetime.time(0, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+import time
+import unittest
+
+from shtrihmfr.emulator import Emulator
+from shtrihmfr.kkt import KKT
+from shtrihmfr.transport import LoopbackTransport
+
+
+class CountingTransport(LoopbackTransport):
+    """ Транспорт в памяти, считающий открытия порта """
+    opened = 0
+
+    def open(self):
+        self.opened += 1
+        super(CountingTransport, self).open()
+
+
+class SlowEmulator(Emulator):
+    """ Эмулятор, выполняющий каждую команду delay секунд """
+    delay = 0.5
+
+    def execute(self, command, params):
+        time.sleep(self.delay)
+        return Emulator.execute(self, command, params)
+
+
+class SessionTest(unittest.TestCase):
+
+    def setUp(self):
+        self.transport = CountingTransport(handler=SlowEmulator())
+        self.kkt = KKT(transport=self.transport, idle_timeout=0.3)
+
+    def test_long_command(self):
+        # Команда дольше idle_timeout не переоткрывает порт во время обмена
+        with self.kkt:
+            self.assertEqual(self.kkt.x10()['kkt_mode'], 4)
+            self.assertEqual(self.transport.opened, 1)
+            self.assertTrue(self.kkt.is_connected)
+
+    def test_idle_reopen(self):
+        with self.kkt:
+            self.kkt.x10()
+            time.sleep(0.4)
+            self.kkt.x10()
+            self.assertEqual(self.transport.opened, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+import os
+import unittest
+
+from shtrihmfr.emulator import PtyEmulator
+from shtrihmfr.kkt import KKT
+
+
+class StuckEmulator(PtyEmulator):
+    """ Эмулятор, который подтверждает смену скорости, но остаётся на
+        прежней
+    """
+
+    def x14(self, command, params):
+        error, data = PtyEmulator.x14(self, command, params)
+        self._new_baudrate = self.baudrate
+        return error, data
+
+
+class RejectingEmulator(PtyEmulator):
+    """ Эмулятор, не поддерживающий запрошенную скорость """
+
+    def x14(self, command, params):
+        return 0x33, bytearray()
+
+
+@unittest.skipUnless(hasattr(os, 'openpty'), 'Псевдотерминал только на POSIX')
+class NegotiateTest(unittest.TestCase):
+
+    def start(self, emulator_class, **kwargs):
+        self.emulator = emulator_class(baudrate=4800).start()
+        self.addCleanup(self.emulator.stop)
+        self.kkt = KKT(port=self.emulator.port, bod=4800, timeout=0.2,
+                       auto_bod=True, **kwargs)
+        self.addCleanup(self.kkt.disconnect)
+        self.probes = 0
+        probe = self.kkt.probe
+        def counting_probe():
+            self.probes += 1
+            return probe()
+        self.kkt.probe = counting_probe
+
+    def test_upgrade(self):
+        self.start(PtyEmulator, max_bod=115200)
+        self.assertEqual(self.kkt.x10()['kkt_mode'], 4)
+        self.assertEqual(self.emulator.baudrate, 115200)
+        self.assertEqual(self.kkt.bod, 115200)
+        self.assertEqual(self.kkt.negotiated_bod, 115200)
+        self.assertEqual(self.kkt.x15().bod, 115200)
+        # Порт закрывается после команды, но скорость не подбирается
+        # заново
+        probes = self.probes
+        self.kkt.x10()
+        self.assertEqual(self.probes, probes)
+
+    def test_max_bod(self):
+        self.start(PtyEmulator, max_bod=19200)
+        self.kkt.x10()
+        self.assertEqual(self.emulator.baudrate, 19200)
+        self.assertEqual(self.kkt.bod, 19200)
+
+    def test_fallback(self):
+        # ККТ не перешла на новую скорость: подбирается прежняя
+        self.start(StuckEmulator, max_bod=115200)
+        self.assertEqual(self.kkt.x10()['kkt_mode'], 4)
+        self.assertEqual(self.emulator.baudrate, 4800)
+        self.assertEqual(self.kkt.negotiated_bod, 4800)
+
+    def test_rejected(self):
+        self.start(RejectingEmulator, max_bod=115200)
+        self.assertEqual(self.kkt.x10()['kkt_mode'], 4)
+        self.assertEqual(self.kkt.bod, 4800)
+        self.assertEqual(self.emulator.baudrate, 4800)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+import unittest
+
+from shtrihmfr import utils
+from shtrihmfr.utils import TextCache, CODE_PAGE, _lru_cache
+
+
+class TextCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = TextCache(maxsize=8)
+
+    def test_encode(self):
+        self.assertEqual(self.cache.encode('Товар'), 'Товар'.encode(CODE_PAGE))
+        self.assertEqual(self.cache.encode('Товар', 8),
+                         'Товар'.encode(CODE_PAGE) + b'\x00\x00\x00')
+        self.assertEqual(self.cache.encode('Товар', 3),
+                         'Тов'.encode(CODE_PAGE))
+        # Символ вне кодировки заменяется, а не вызывает ошибку
+        self.assertEqual(self.cache.encode('A☃B'),
+                         b'A' + self.cache.fallback + b'B')
+
+    def test_hits(self):
+        first = self.cache.encode('Строка', 40)
+        self.assertEqual((self.cache.hits, self.cache.misses), (0, 1))
+        self.assertIs(self.cache.encode('Строка', 40), first)
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+        # Другая ширина - другой элемент кэша
+        self.cache.encode('Строка', 20)
+        self.assertEqual(self.cache.info(), {'hits': 1, 'misses': 2,
+                                             'size': 2, 'maxsize': 8})
+        self.cache.clear()
+        self.assertEqual(len(self.cache), 0)
+        self.assertEqual((self.cache.hits, self.cache.misses), (0, 0))
+
+    def test_maxsize(self):
+        for i in range(100):
+            self.cache.encode('Строка %d' % i, 40)
+        self.assertLessEqual(len(self.cache), 8)
+        self.assertEqual(self.cache.misses, 100)
+
+
+class FallbackCacheTest(TextCacheTest):
+    """ Тот же кэш на _lru_cache (Python 2) """
+
+    def setUp(self):
+        self.addCleanup(setattr, utils, 'lru_cache', utils.lru_cache)
+        utils.lru_cache = _lru_cache
+        self.cache = TextCache(maxsize=8)
+
+
+class LruCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.calls = []
+        def square(value):
+            self.calls.append(value)
+            return value * value
+        self.square = _lru_cache(4)(square)
+
+    def test_hits(self):
+        self.assertEqual(self.square(3), 9)
+        self.assertEqual(self.square(3), 9)
+        self.assertEqual(self.calls, [3])
+        self.assertEqual(self.square.cache_info(), (1, 1, 4, 1))
+        self.square.cache_clear()
+        self.assertEqual(self.square.cache_info(), (0, 0, 4, 0))
+        self.square(3)
+        self.assertEqual(self.calls, [3, 3])
+
+    def test_evict_oldest(self):
+        for value in range(4):
+            self.square(value)
+        # 0 использован последним и переживает вытеснение
+        self.square(0)
+        self.square(4)
+        self.assertLessEqual(self.square.cache_info()[3], 4)
+        del self.calls[:]
+        self.square(0)
+        self.square(4)
+        self.assertEqual(self.calls, [])
+        self.square(1)
+        self.assertEqual(self.calls, [1])
+
+
+if __name__ == '__main__':
+    unittest.main()
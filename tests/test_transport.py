@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+import os
+import socket
+import time
+import unittest
+
+from shtrihmfr.emulator import PtyEmulator
+from shtrihmfr.kkt import KKT
+from shtrihmfr.transport import (ConnectionPool, TCPTransport,
+                                 SerialTransport, get_transport)
+
+from .server import EmulatorServer
+
+
+def free_port():
+    """ Порт, на котором никто не слушает """
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+class TCPTransportTest(unittest.TestCase):
+
+    def setUp(self):
+        self.pool = ConnectionPool(backoff=0.2, max_backoff=0.4)
+
+    def tearDown(self):
+        self.pool.clear()
+
+    def test_pooled_connection(self):
+        with EmulatorServer() as server:
+            transport = TCPTransport(server.url, pool=self.pool)
+            kkt = KKT(transport=transport)
+            for i in range(3):
+                self.assertEqual(kkt.x10()['kkt_mode'], 4)
+                self.assertFalse(kkt.is_connected)
+            # Все команды прошли по одному соединению из пула
+            self.assertEqual(server.connections, 1)
+            self.assertEqual(len(self.pool._idle[transport.address]), 1)
+
+    def test_reconnect_backoff(self):
+        port = free_port()
+        transport = TCPTransport('tcp://127.0.0.1:%d' % port, pool=self.pool)
+        self.assertRaises(IOError, transport.open)
+        # До истечения паузы попытка завершается ошибкой сразу
+        try:
+            transport.open()
+        except IOError as e:
+            self.assertIn('Повторное соединение', e.args[0])
+        else:
+            self.fail('Соединение установлено во время паузы')
+        # Вторая неудача удваивает паузу
+        time.sleep(0.25)
+        self.assertRaises(IOError, transport.open)
+        self.assertEqual(self.pool._failures[transport.address], 2)
+        delay = self.pool._retry_at[transport.address] - time.time()
+        self.assertTrue(0.2 < delay <= 0.4)
+
+        listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        listener.bind(('127.0.0.1', port))
+        listener.listen(1)
+        try:
+            time.sleep(0.45)
+            transport.open()
+            self.assertTrue(transport.is_open)
+            self.assertNotIn(transport.address, self.pool._failures)
+            transport.close()
+        finally:
+            listener.close()
+
+    def test_short_read_breaks_connection(self):
+        def handler_factory():
+            # Отвечает только на первый запрос и не полностью
+            return lambda data: b'\x02\x05'
+        with EmulatorServer(handler_factory) as server:
+            transport = TCPTransport(server.url, pool=self.pool, timeout=0.1)
+            transport.open()
+            transport.write(b'\x05')
+            self.assertEqual(transport.read(5), b'\x02\x05')
+            transport.close()
+            # Соединение с недочитанным ответом в пул не возвращается
+            self.assertFalse(self.pool._idle.get(transport.address))
+
+            transport.open()
+            transport.write(b'\x05')
+            self.assertEqual(transport.read(2), b'\x02\x05')
+            transport.close()
+            self.assertEqual(len(self.pool._idle[transport.address]), 1)
+            self.assertEqual(server.connections, 2)
+
+    def test_empty_read_keeps_connection(self):
+        def handler_factory():
+            # ККТ молчит: ENQ остаётся без ответа
+            return lambda data: b''
+        with EmulatorServer(handler_factory) as server:
+            transport = TCPTransport(server.url, pool=self.pool, timeout=0.1)
+            transport.open()
+            transport.write(b'\x05')
+            self.assertEqual(transport.read(1), b'')
+            self.assertEqual(transport.readinto(bytearray(2)), 0)
+            transport.close()
+            self.assertEqual(len(self.pool._idle[transport.address]), 1)
+
+    def test_options(self):
+        transport = get_transport('tcp://127.0.0.1:1', baudrate=4800,
+                                  parity='N', stopbits=1, timeout=0.3)
+        self.assertEqual(transport.options, {})
+        self.assertEqual(transport.timeout, 0.3)
+
+    def test_connect_timeout(self):
+        timeouts = []
+        def acquire(address, timeout=None):
+            timeouts.append(timeout)
+            raise IOError('Нет соединения')
+        self.pool.acquire = acquire
+        transport = TCPTransport('tcp://127.0.0.1:1', pool=self.pool,
+                                 timeout=0.3, write_timeout=5)
+        self.assertRaises(IOError, transport.open)
+        transport.connect_timeout = 2
+        self.assertRaises(IOError, transport.open)
+        self.assertEqual(timeouts, [0.3, 2])
+
+
+@unittest.skipUnless(hasattr(os, 'openpty'), 'Псевдотерминал только на POSIX')
+class SerialTransportTest(unittest.TestCase):
+
+    def setUp(self):
+        self.emulator = PtyEmulator().start()
+
+    def tearDown(self):
+        self.emulator.stop()
+
+    def test_serial_url(self):
+        url = 'serial://%s' % self.emulator.port
+        transport = get_transport(url)
+        self.assertIsInstance(transport, SerialTransport)
+        self.assertEqual(transport.device, self.emulator.port)
+        kkt = KKT(port=url)
+        self.assertEqual(kkt.x10()['kkt_mode'], 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+import threading
+import time
+import unittest
+
+from shtrihmfr.emulator import Emulator
+from shtrihmfr.kkt import KKT
+from shtrihmfr.protocol import (PRIORITY_RECEIPT, PRIORITY_OPERATOR,
+                                PRIORITY_REPORT)
+from shtrihmfr.transport import LoopbackTransport
+from shtrihmfr.worker import DeviceWorker, non_preemptible
+
+
+class SlowEmulator(Emulator):
+    """ Эмулятор, тратящий на каждую команду command_time секунд """
+    command_time = 0.002
+
+    def execute(self, command, params):
+        time.sleep(self.command_time)
+        return Emulator.execute(self, command, params)
+
+
+class PreemptTest(unittest.TestCase):
+
+    def setUp(self):
+        self.emulator = SlowEmulator()
+        for number in range(256):
+            self.emulator.registers[number] = number * 100
+        kkt = KKT(transport=LoopbackTransport(handler=self.emulator))
+        self.worker = DeviceWorker(kkt).start()
+
+    def tearDown(self):
+        self.worker.stop()
+
+    def wait_running(self, future):
+        while not future.running() and not future.done():
+            time.sleep(0.001)
+
+    def test_sale_preempts_bulk_read(self):
+        bulk = self.worker.schedule(PRIORITY_REPORT, 'money_registers')
+        self.wait_running(bulk)
+        sale = self.worker.schedule(PRIORITY_RECEIPT, 'x80', 1, 10, 'Товар')
+        single = self.worker.schedule(PRIORITY_OPERATOR, 'money_registers',
+                                      [241])
+        sale.result(5)
+        self.assertFalse(bulk.done())
+        self.assertEqual(single.result(5)[241], 241)
+        self.assertFalse(bulk.done())
+
+        registers = bulk.result(10)
+        # Срочные команды с тем же шаблоном сообщения не подменили
+        # номера регистров пакетного чтения
+        self.assertEqual(registers.to_dict(),
+                         dict([ (n, float(n)) for n in range(256) ]))
+        self.assertEqual(self.emulator.receipt_total, 1000)
+
+    def test_non_preemptible(self):
+        order = []
+        scheduled = threading.Event()
+
+        @non_preemptible
+        def sequence(kkt):
+            kkt.x10()
+            scheduled.wait(5)
+            # Продажа уже в очереди, но не вытесняет эти команды
+            registers = kkt.money_registers(range(8))
+            order.append('sequence')
+            return registers
+
+        future = self.worker.schedule(PRIORITY_OPERATOR, sequence)
+        self.wait_running(future)
+        sale = self.worker.schedule(PRIORITY_RECEIPT, 'x80', 1, 10, 'Товар')
+        sale.add_done_callback(lambda future: order.append('sale'))
+        scheduled.set()
+        self.assertEqual(future.result(5)[7], 7)
+        sale.result(5)
+        self.assertEqual(order, ['sequence', 'sale'])
+
+
+class StopTest(unittest.TestCase):
+
+    def test_full_queue(self):
+        # Остановка не ждёт места в заполненной очереди
+        kkt = KKT(transport=LoopbackTransport(handler=Emulator()))
+        worker = DeviceWorker(kkt, maxsize=1).start()
+        release = threading.Event()
+        busy = worker.submit(lambda kkt: release.wait(5))
+        while not busy.running():
+            time.sleep(0.001)
+        queued = worker.submit('x10')
+        self.assertTrue(worker.queue.full())
+        started = time.time()
+        worker.stop(wait=False)
+        self.assertLess(time.time() - started, 0.5)
+        # Поставленные команды выполняются, затем поток завершается
+        release.set()
+        self.assertEqual(queued.result(5)['kkt_mode'], 4)
+        worker._thread.join(5)
+        self.assertFalse(worker.is_alive)
+
+
+if __name__ == '__main__':
+    unittest.main()